@@ -1,17 +1,50 @@
 """
 API路由定义
 """
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import AsyncIterator, Optional
 from app.models.schemas import (
     EmailValidationRequest,
     EmailValidationResult,
     BatchValidationRequest,
     BatchValidationResult,
+    BatchStreamItem,
+    BatchStreamSummary,
     ValidationLevel,
+    JobCreateRequest,
+    JobInfo,
+    JobResultsPage,
     HealthResponse,
+    StatsResponse,
+    CacheStats,
+    SingleFlightStats,
+    PoolStats,
+    RateLimitStats,
+    ResultCacheStats,
+    DisposableIndexStats,
+    RetryStats,
+    MXBreakerResponse,
+    MXFactsResponse,
+    ProviderProfileInfo,
+    ProviderListResponse,
 )
 from app.core.validator import EmailValidator
+from app.core.dns import DNSValidator
+from app.core.disposable import DisposableDetector
+from app.core.smtp import SMTPValidator
+from app.core.jobs import job_manager
+from app.core.providers import ProviderRegistry
+from app.core.result_cache import ResultCache
+from app.core.retry import retry_scheduler
+from app.core.metrics import (
+    registry,
+    CACHE_ENTRIES,
+    CACHE_HIT_RATIO,
+    SMTP_BREAKERS,
+    SMTP_POOL_CONNECTIONS,
+)
 from app import __version__
 
 
@@ -32,6 +65,138 @@ async def health_check():
     )
 
 
+@router.get("/stats", response_model=StatsResponse, tags=["系统"])
+async def get_stats():
+    """
+    运行统计接口
+
+    返回DNS缓存、catch-all缓存、持久化结果缓存的命中情况、并发请求合并次数、SMTP连接池和限速状态，
+    一次性邮箱域名索引的规模和内存占用，以及灰名单重试队列。
+    catch-all 缓存的命中数即为省去的额外 RCPT 探测次数。
+    """
+    return StatsResponse(
+        caches=[
+            CacheStats(**DNSValidator.cache_stats()),
+            CacheStats(**SMTPValidator.cache_stats()),
+        ],
+        single_flight=[
+            SingleFlightStats(**DNSValidator.coalescing_stats()),
+            SingleFlightStats(**SMTPValidator.coalescing_stats()),
+        ],
+        smtp_pool=PoolStats(**SMTPValidator.pool_stats()),
+        rate_limits=RateLimitStats(**SMTPValidator.rate_limit_stats()),
+        result_cache=ResultCacheStats(**await asyncio.to_thread(ResultCache.stats)),
+        disposable_index=DisposableIndexStats(**DisposableDetector.index_stats()),
+        retries=RetryStats(**retry_scheduler.stats())
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse, tags=["系统"])
+async def get_metrics():
+    """
+    Prometheus 指标接口
+
+    以 Prometheus 文本格式导出：各验证阶段耗时直方图、验证次数、
+    按MX主机统计的SMTP响应码、正在进行的验证和DNS查询数、缓存命中率、SMTP连接池和熔断器状态。
+    """
+    for stats in (DNSValidator.cache_stats(), SMTPValidator.cache_stats()):
+        CACHE_HIT_RATIO.set(stats["hit_ratio"], cache=stats["name"])
+        CACHE_ENTRIES.set(stats["size"], cache=stats["name"])
+    result_cache = await asyncio.to_thread(ResultCache.stats)
+    CACHE_HIT_RATIO.set(result_cache["hit_ratio"], cache="result")
+    CACHE_ENTRIES.set(result_cache["entries"], cache="result")
+
+    pool = SMTPValidator.pool_stats()
+    SMTP_POOL_CONNECTIONS.set(pool["in_use"], state="in_use")
+    SMTP_POOL_CONNECTIONS.set(pool["idle"], state="idle")
+
+    breakers = SMTPValidator.breaker_stats()
+    SMTP_BREAKERS.set(breakers["open"], state="open")
+    SMTP_BREAKERS.set(breakers["half_open"], state="half_open")
+
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@router.get("/smtp/breakers", response_model=MXBreakerResponse, tags=["系统"])
+async def get_mx_breakers():
+    """
+    MX熔断器状态
+
+    列出存在连接失败记录的MX主机：连续失败达到阈值后熔断 (open)，冷却期内
+    该主机上的地址直接返回不可达；冷却结束后进入 half_open，只放行一次探测连接。
+    """
+    return MXBreakerResponse(**SMTPValidator.breaker_stats())
+
+
+@router.delete("/smtp/breakers/{host}", response_model=MXBreakerResponse, tags=["系统"])
+async def reset_mx_breaker(host: str):
+    """
+    手动重置MX主机的熔断状态
+
+    例如确认出站25端口已放通后，无需等待冷却即可恢复连接
+    """
+    if not SMTPValidator.reset_breaker(host):
+        raise HTTPException(status_code=404, detail="该MX主机没有熔断记录")
+    return MXBreakerResponse(**SMTPValidator.breaker_stats())
+
+
+@router.get("/smtp/mx", response_model=MXFactsResponse, tags=["系统"])
+async def get_mx_facts():
+    """
+    MX主机特征
+
+    列出新建连接时记录的各MX主机的可达性、欢迎语和ESMTP扩展（是否支持 STARTTLS）。
+    托管在同一组MX上的域名共享这些特征，TTL 内不重复获取。
+    """
+    return MXFactsResponse(**SMTPValidator.mx_facts_stats())
+
+
+def _provider_list() -> ProviderListResponse:
+    stats = ProviderRegistry.stats()
+    return ProviderListResponse(
+        enabled=stats["enabled"],
+        path=stats["path"],
+        version=stats["version"],
+        providers=[
+            ProviderProfileInfo(
+                name=profile.name,
+                domains=list(profile.domains),
+                mx_hosts=list(profile.mx_hosts),
+                rcpt_verification=profile.rcpt_verification,
+                catch_all=profile.catch_all,
+            )
+            for profile in ProviderRegistry.profiles()
+        ]
+    )
+
+
+@router.get("/providers", response_model=ProviderListResponse, tags=["系统"])
+async def list_providers():
+    """
+    内置提供商配置
+
+    列出已知提供商的静态MX主机和行为特征：这些域名在DNS级别直接使用静态MX表，
+    RCPT 验证无意义的提供商跳过SMTP探测，catch-all 行为已知时不再探测
+    """
+    return _provider_list()
+
+
+@router.post("/providers/reload", response_model=ProviderListResponse, tags=["系统"])
+async def reload_providers():
+    """
+    重新加载提供商配置
+
+    从数据文件（PROVIDER_PROFILES_PATH）重新读取，文件无效时保留当前配置
+    """
+    try:
+        ProviderRegistry.reload()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _provider_list()
+
+
 @router.post("/validate", response_model=EmailValidationResult, tags=["验证"])
 async def validate_email(request: EmailValidationRequest):
     """
@@ -68,6 +233,10 @@ async def validate_email_get(
         ge=1,
         le=30,
         description="超时时间（秒）"
+    ),
+    include_timings: bool = Query(
+        default=False,
+        description="是否返回各阶段耗时"
     )
 ):
     """
@@ -78,7 +247,8 @@ async def validate_email_get(
     request = EmailValidationRequest(
         email=email,
         level=level,
-        timeout=timeout
+        timeout=timeout,
+        include_timings=include_timings
     )
     try:
         result = await EmailValidator.validate(request)
@@ -103,13 +273,50 @@ async def validate_emails_batch(request: BatchValidationRequest):
         result = await EmailValidator.validate_batch(
             emails=request.emails,
             level=request.level,
-            timeout=request.timeout
+            timeout=request.timeout,
+            include_timings=request.include_timings
         )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量验证失败: {str(e)}")
 
 
+@router.post("/validate/batch/stream", tags=["验证"])
+async def validate_emails_batch_stream(request: BatchValidationRequest):
+    """
+    流式批量验证邮箱地址
+
+    以 NDJSON (application/x-ndjson) 格式返回，每个邮箱验证完成后立即输出一行：
+    ```json
+    {"type": "result", "index": 0, "result": {...}}
+    ```
+    结果按完成顺序输出，通过 index 对应请求中的位置。最后一行为汇总：
+    ```json
+    {"type": "summary", "total": 2, "valid_count": 1, "invalid_count": 1}
+    ```
+    """
+    async def generate() -> AsyncIterator[str]:
+        total = len(request.emails)
+        valid_count = 0
+        async for index, result in EmailValidator.iter_batch(
+            emails=request.emails,
+            level=request.level,
+            timeout=request.timeout,
+            include_timings=request.include_timings
+        ):
+            if result.valid:
+                valid_count += 1
+            yield BatchStreamItem(index=index, result=result).model_dump_json() + "\n"
+
+        yield BatchStreamSummary(
+            total=total,
+            valid_count=valid_count,
+            invalid_count=total - valid_count
+        ).model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.get("/check/{email}", tags=["快捷验证"])
 async def quick_check(email: str):
     """
@@ -142,3 +349,71 @@ async def quick_check(email: str):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"验证失败: {str(e)}")
+
+
+@router.post("/jobs", response_model=JobInfo, status_code=202, tags=["批量任务"])
+async def create_job(request: JobCreateRequest):
+    """
+    提交批量验证任务
+
+    适用于数万到数十万地址的列表清洗。任务在后台分片执行，
+    返回任务ID后通过 `/jobs/{job_id}` 查询进度，通过 `/jobs/{job_id}/results` 分页获取结果。
+    服务重启后未完成的任务会从已完成的位置继续。
+    """
+    try:
+        return await job_manager.submit(
+            emails=request.emails,
+            level=request.level,
+            timeout=request.timeout
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"任务提交失败: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo, tags=["批量任务"])
+async def get_job(job_id: str):
+    """
+    查询批量任务状态和进度
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@router.get("/jobs/{job_id}/results", response_model=JobResultsPage, tags=["批量任务"])
+async def get_job_results(
+    job_id: str,
+    offset: int = Query(default=0, ge=0, description="起始序号"),
+    limit: int = Query(default=100, ge=1, le=1000, description="每页数量")
+):
+    """
+    分页获取批量任务结果
+
+    结果按提交顺序排列，任务运行中也可获取已完成的部分
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    results = await job_manager.results(job_id, offset, limit)
+    return JobResultsPage(
+        job_id=job_id,
+        offset=offset,
+        limit=limit,
+        total=job.total,
+        processed=job.processed,
+        results=results
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=JobInfo, tags=["批量任务"])
+async def cancel_job(job_id: str):
+    """
+    取消批量任务
+
+    已完成的结果保留，可继续分页获取
+    """
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
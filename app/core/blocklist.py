@@ -0,0 +1,300 @@
+"""
+外部名单
+一次性邮箱域名、免费邮箱提供商、角色账户前缀等名单可以放在外部文本文件中，
+编译成紧凑的二进制索引后以只读方式内存映射（同一台机器上的多个工作进程共享同一份页缓存），
+源文件变化时在后台重新编译并原子替换，查询不会等待重新加载
+"""
+import array
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def key_hash(key: str) -> int:
+    """名单条目的64位哈希（与进程无关，编译和查询时一致）"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CompiledBlocklist:
+    """
+    内存映射的已编译名单
+
+    文件格式：
+        头部   magic(4) 版本(2) 字节序(2) 条目数(4) 源文件修改时间(8) 源文件大小(8)
+        哈希   条目数个 uint64，升序排列
+        偏移   条目数+1 个 uint32，指向字符串表
+        字符串表  各条目的值（UTF-8，集合类名单为空）
+
+    查询时对哈希数组二分查找，不把名单读入进程内存。
+    64位哈希的碰撞概率可以忽略，不保存键本身
+    """
+
+    MAGIC = b"EVBL"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHIQQ")
+    LITTLE_ENDIAN = 1 if sys.byteorder == "little" else 0
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, byteorder, count, mtime, size = self.HEADER.unpack_from(self._mmap, 0)
+            if magic != self.MAGIC or version != self.VERSION or byteorder != self.LITTLE_ENDIAN:
+                raise ValueError(f"{path} 不是当前版本的名单索引")
+            view = memoryview(self._mmap)
+            start = self.HEADER.size
+            self._hashes = view[start:start + 8 * count].cast("Q")
+            start += 8 * count
+            self._offsets = view[start:start + 4 * (count + 1)].cast("I")
+            start += 4 * (count + 1)
+            self._strings = view[start:]
+            if len(self._hashes) != count or len(self._offsets) != count + 1:
+                raise ValueError(f"{path} 已损坏")
+        except (ValueError, TypeError, struct.error):
+            self._mmap.close()
+            raise
+        self.path = path
+        self.count = count
+        # 编译时源文件的 (修改时间, 大小)，用于判断是否需要重新编译
+        self.source_stamp = (mtime, size)
+
+    @classmethod
+    def build(
+        cls,
+        entries: Iterable[tuple[str, str]],
+        path: str,
+        source_stamp: tuple[int, int] = (0, 0)
+    ) -> int:
+        """
+        编译名单并原子写入（先写临时文件再 os.replace）
+
+        Args:
+            entries: (键, 值) 序列，重复的键保留第一个
+            path: 输出文件
+            source_stamp: 源文件的 (修改时间, 大小)
+
+        Returns:
+            int: 写入的条目数
+        """
+        table: dict[int, bytes] = {}
+        for key, value in entries:
+            table.setdefault(key_hash(key), value.encode("utf-8"))
+        hashes = sorted(table)
+
+        offsets = array.array("I", [0])
+        strings = bytearray()
+        for h in hashes:
+            strings += table[h]
+            offsets.append(len(strings))
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(cls.HEADER.pack(
+                cls.MAGIC, cls.VERSION, cls.LITTLE_ENDIAN, len(hashes), *source_stamp
+            ))
+            f.write(array.array("Q", hashes).tobytes())
+            f.write(offsets.tobytes())
+            f.write(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return len(hashes)
+
+    def get(self, key: str) -> Optional[str]:
+        """查找条目的值，不存在时返回 None（集合类名单的值为空字符串）"""
+        h = key_hash(key)
+        i = bisect_left(self._hashes, h)
+        if i < self.count and self._hashes[i] == h:
+            return bytes(self._strings[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._mmap)
+
+
+class Blocklist:
+    """一个外部名单：文本源文件及其编译后的内存映射索引"""
+
+    def __init__(self, name: str, source: str, compiled: str, mapping: bool = False):
+        """
+        Args:
+            name: 名单名称
+            source: 源文件，每行一个条目，# 之后为注释；
+                mapping 为 True 时每行为“键,值”
+            compiled: 编译后的索引文件
+            mapping: 是否为键值名单
+        """
+        self.name = name
+        self.source = source
+        self.compiled = compiled
+        self.mapping = mapping
+        self.loaded_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._index: Optional[CompiledBlocklist] = None
+        self._identity: Optional[tuple] = None
+
+    def _parse(self) -> Iterable[tuple[str, str]]:
+        with open(self.source, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                if self.mapping:
+                    key, _, value = line.partition(",")
+                    yield key.strip().lower(), value.strip()
+                else:
+                    yield line.lower(), ""
+
+    def refresh(self) -> bool:
+        """
+        源文件变化时重新编译，索引文件被替换时重新映射
+
+        其他工作进程已经编译好的索引直接复用；新索引打开成功后才替换旧索引，
+        编译或打开失败时保留旧索引并记录错误
+
+        Returns:
+            bool: 是否换用了新的索引
+        """
+        try:
+            stat = os.stat(self.source)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            index, identity = self._open_compiled()
+            if index is None or index.source_stamp != stamp:
+                CompiledBlocklist.build(self._parse(), self.compiled, stamp)
+                index, identity = self._open_compiled()
+            if index is self._index:
+                return False
+            # 旧索引不主动关闭，没有引用后随对象一起释放
+            self._index = index
+            self._identity = identity
+            self.loaded_at = time.time()
+            self.error = None
+            return True
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            self.error = str(e)
+            return False
+
+    def _open_compiled(self) -> tuple[Optional[CompiledBlocklist], Optional[tuple]]:
+        """打开索引文件；文件未变化时返回当前索引，不存在或无效时返回 None"""
+        try:
+            stat = os.stat(self.compiled)
+        except FileNotFoundError:
+            return None, None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._identity:
+            return self._index, identity
+        try:
+            return CompiledBlocklist(self.compiled), identity
+        except (ValueError, struct.error):
+            # 截断或损坏的索引文件（例如写入中途进程退出）按不存在处理，重新编译
+            return None, None
+
+    def get(self, key: str) -> Optional[str]:
+        index = self._index
+        return index.get(key) if index is not None else None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            "name": self.name,
+            "source": self.source,
+            "entries": len(index) if index is not None else 0,
+            "size_bytes": index.size_bytes if index is not None else 0,
+            "loaded_at": self.loaded_at,
+            "error": self.error,
+        }
+
+
+class BlocklistManager:
+    """管理外部名单，并在后台定期检查源文件变化"""
+
+    # 编译后的索引目录（同一台机器上的工作进程共享）
+    DIRECTORY = os.environ.get("BLOCKLIST_DIR", "data/blocklists")
+
+    # 检查源文件变化的间隔（秒）
+    RELOAD_INTERVAL = float(os.environ.get("BLOCKLIST_RELOAD_INTERVAL", "30"))
+
+    def __init__(self):
+        self._lists: dict[str, Blocklist] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    def register(self, name: str, source: str, mapping: bool = False) -> Blocklist:
+        """
+        注册外部名单并立即加载
+
+        Args:
+            name: 名单名称（同时作为索引文件名）
+            source: 源文件路径
+            mapping: 是否为键值名单
+
+        Returns:
+            Blocklist: 名单对象
+        """
+        # 索引文件名包含源文件路径的摘要，不同源文件的同名名单互不覆盖
+        digest = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:8]
+        blocklist = Blocklist(
+            name, source, os.path.join(self.DIRECTORY, f"{name}-{digest}.bin"), mapping=mapping
+        )
+        blocklist.refresh()
+        self._lists[name] = blocklist
+        return blocklist
+
+    def unregister(self, name: str) -> None:
+        self._lists.pop(name, None)
+
+    def get(self, name: str) -> Optional[Blocklist]:
+        return self._lists.get(name)
+
+    def refresh(self) -> list[str]:
+        """检查所有名单，返回换用了新索引的名单名称"""
+        return [name for name, blocklist in list(self._lists.items()) if blocklist.refresh()]
+
+    async def start(self) -> None:
+        """启动后台检查"""
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_loop())
+
+    async def stop(self) -> None:
+        """停止后台检查"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _watch_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.RELOAD_INTERVAL)
+            # 编译在线程中进行，事件循环继续处理请求
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:
+                # 单次检查失败不能结束后台任务，下一个周期继续检查
+                logger.exception("检查外部名单失败")
+
+    def stats(self) -> list[dict]:
+        return [blocklist.stats() for blocklist in self._lists.values()]
+
+
+blocklists = BlocklistManager()
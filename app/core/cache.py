@@ -0,0 +1,160 @@
+"""
+进程内缓存
+提供带TTL过期和LRU淘汰的缓存，以及并发请求合并（single-flight），
+供DNS、SMTP等验证器共享使用
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    """带TTL的LRU缓存"""
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        default_ttl: float = 300.0,
+        name: str = "",
+        timer: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            maxsize: 最大条目数，超出后淘汰最久未使用的条目
+            default_ttl: 默认过期时间（秒）
+            name: 缓存名称（用于统计输出）
+            timer: 时钟函数，默认使用单调时钟
+        """
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.name = name
+        self._timer = timer
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，不存在或已过期时返回 default"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._timer():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """写入缓存值"""
+        if ttl is None:
+            ttl = self.default_ttl
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+
+        self._data[key] = (self._timer() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """删除缓存条目"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空缓存并重置统计"""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self._timer()
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    请求合并（single-flight）
+
+    相同键的并发调用只执行一次，其余调用者等待同一个结果。
+    执行在独立的任务中进行，发起者被取消不会影响其他等待者。
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行或加入一次调用
+
+        Args:
+            key: 合并键
+            fn: 无参协程工厂，仅在没有进行中的同键调用时执行
+
+        Returns:
+            调用结果（异常同样会传播给所有等待者）
+        """
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        task = loop.create_task(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        return await asyncio.shield(task)
+
+    def _on_done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都被取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        """合并统计信息"""
+        return {
+            "name": self.name,
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "shared": self.shared,
+        }
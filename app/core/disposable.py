@@ -2,8 +2,11 @@
 一次性邮箱检测器
 检测临时邮箱、一次性邮箱、角色账户等
 """
+import os
 from typing import Set, Optional
 from app.models.schemas import DeepAnalysisResult
+from app.core.matchers import DomainSuffixTrie, KeywordMatcher, RoleMatcher
+from app.core.blocklist import Blocklist, blocklists
 
 
 class DisposableDetector:
@@ -45,6 +48,27 @@ class DisposableDetector:
         "wegwerfmail.net", "wegwerfmail.org",
     }
 
+    # 一次性邮箱域名常见的关键词
+    DISPOSABLE_KEYWORDS: list[str] = [
+        "temp", "tmp", "disposable", "throwaway",
+        "trash", "spam", "fake", "guerrilla",
+        "mailinator", "10minute", "minute"
+    ]
+
+    # 外部名单文件（# 之后为注释），作为内置名单的补充，编译为内存映射索引并在文件变化时自动重新加载
+    # 一次性邮箱域名: 每行一个域名
+    BLOCKLIST_PATH = os.environ.get("DISPOSABLE_BLOCKLIST_PATH", "")
+    # 免费邮箱提供商: 每行“域名,提供商名称”
+    FREE_PROVIDERS_PATH = os.environ.get("FREE_PROVIDERS_PATH", "")
+    # 角色账户前缀: 每行一个前缀
+    ROLE_PREFIXES_PATH = os.environ.get("ROLE_PREFIXES_PATH", "")
+
+    # 启动时构建的查询索引：内置域名的后缀树、关键词自动机、角色前缀树和外部名单
+    _domain_index: Optional[DomainSuffixTrie] = None
+    _keyword_matcher: Optional[KeywordMatcher] = None
+    _role_matcher: Optional[RoleMatcher] = None
+    _external: dict[str, Blocklist] = {}
+
     # 常见的免费邮箱提供商
     FREE_PROVIDERS: dict[str, str] = {
         # 全球主流
@@ -94,6 +118,7 @@ class DisposableDetector:
     }
 
     # 角色账户前缀（通常是通用账户，不是个人账户）
+    # 同时匹配数字后缀 (support2) 和分隔符变体 (support-team, info.cn, sales_2)
     ROLE_PREFIXES: Set[str] = {
         "admin", "administrator", "webmaster", "hostmaster",
         "postmaster", "root", "abuse", "noc", "security",
@@ -137,7 +162,7 @@ class DisposableDetector:
             suggestions.append("此邮箱为一次性/临时邮箱，可能很快失效")
 
         # 检测免费邮箱提供商
-        provider = cls.FREE_PROVIDERS.get(domain)
+        provider = cls.get_provider_name(domain)
         if provider:
             result.is_free_provider = True
             result.provider_name = provider
@@ -159,47 +184,104 @@ class DisposableDetector:
         result.suggestions = suggestions
         return result
 
+    @classmethod
+    def build_index(cls) -> dict:
+        """
+        构建内置一次性邮箱域名的后缀树、关键词自动机和角色前缀树，并注册外部名单
+
+        新索引构建完成后才替换旧索引，查询不会看到构建到一半的状态
+
+        Returns:
+            dict: 索引统计信息
+        """
+        index = DomainSuffixTrie(cls.DISPOSABLE_DOMAINS)
+        matcher = KeywordMatcher(cls.DISPOSABLE_KEYWORDS)
+        roles = RoleMatcher(cls.ROLE_PREFIXES)
+
+        external: dict[str, Blocklist] = {}
+        for name, path, mapping in (
+            ("disposable_domains", cls.BLOCKLIST_PATH, False),
+            ("free_providers", cls.FREE_PROVIDERS_PATH, True),
+            ("role_prefixes", cls.ROLE_PREFIXES_PATH, False),
+        ):
+            if path:
+                external[name] = blocklists.register(name, path, mapping=mapping)
+            else:
+                blocklists.unregister(name)
+
+        cls._domain_index = index
+        cls._keyword_matcher = matcher
+        cls._role_matcher = roles
+        cls._external = external
+        return cls.index_stats()
+
+    @classmethod
+    def _ensure_index(cls) -> None:
+        """首次使用时构建索引（服务启动时已在 lifespan 中构建）"""
+        if cls._domain_index is None:
+            cls.build_index()
+
+    @classmethod
+    def index_stats(cls) -> dict:
+        """索引规模和估算的内存占用（外部名单为内存映射文件的大小）"""
+        cls._ensure_index()
+        domains = cls._domain_index.stats()
+        keywords = cls._keyword_matcher.stats()
+        roles = cls._role_matcher.stats()
+        return {
+            "domains": domains["entries"],
+            "domain_nodes": domains["nodes"],
+            "keywords": keywords["keywords"],
+            "keyword_states": keywords["states"],
+            "role_prefixes": roles["entries"],
+            "role_nodes": roles["nodes"],
+            "memory_bytes": (
+                domains["memory_bytes"] + keywords["memory_bytes"] + roles["memory_bytes"]
+            ),
+            "blocklists": [blocklist.stats() for blocklist in cls._external.values()],
+        }
+
     @classmethod
     def _is_disposable(cls, domain: str) -> bool:
         """检测是否为一次性邮箱域名"""
+        cls._ensure_index()
         domain = domain.lower()
 
-        # 直接匹配
-        if domain in cls.DISPOSABLE_DOMAINS:
+        # 域名本身或任一上级域名在名单中
+        if cls._domain_index.match(domain) is not None:
             return True
 
-        # 检查子域名
-        parts = domain.split(".")
-        for i in range(len(parts) - 1):
-            parent_domain = ".".join(parts[i:])
-            if parent_domain in cls.DISPOSABLE_DOMAINS:
-                return True
+        external = cls._external.get("disposable_domains")
+        if external is not None:
+            suffix = domain
+            while "." in suffix:
+                if suffix in external:
+                    return True
+                suffix = suffix.split(".", 1)[1]
 
         # 检查常见的一次性邮箱特征
-        disposable_keywords = [
-            "temp", "tmp", "disposable", "throwaway",
-            "trash", "spam", "fake", "guerrilla",
-            "mailinator", "10minute", "minute"
-        ]
-        for keyword in disposable_keywords:
-            if keyword in domain:
-                return True
-
-        return False
+        return cls._keyword_matcher.search(domain) is not None
 
     @classmethod
     def _is_role_account(cls, local_part: str) -> bool:
         """检测是否为角色账户"""
         local_part = local_part.lower()
+        cls._ensure_index()
 
-        # 精确匹配
-        if local_part in cls.ROLE_PREFIXES:
+        # 精确匹配、数字后缀和分隔符变体，一次扫描完成
+        if cls._role_matcher.match(local_part) is not None:
             return True
 
-        # 带数字后缀的匹配 (如 admin1, support2)
-        for prefix in cls.ROLE_PREFIXES:
-            if local_part.startswith(prefix) and local_part[len(prefix):].isdigit():
+        # 外部名单按哈希查找，逐个尝试数字后缀和分隔符之前的部分
+        external = cls._external.get("role_prefixes")
+        if external is not None:
+            stem = local_part.rstrip("0123456789")
+            if local_part in external or (stem and stem in external):
                 return True
+            for i, char in enumerate(local_part):
+                if (char in RoleMatcher.SEPARATORS and local_part[:i] in external
+                        and cls._role_matcher.suffix_allowed(local_part[i:])):
+                    return True
 
         return False
 
@@ -257,4 +339,13 @@ class DisposableDetector:
     @classmethod
     def get_provider_name(cls, domain: str) -> Optional[str]:
         """获取邮箱提供商名称"""
-        return cls.FREE_PROVIDERS.get(domain.lower())
+        domain = domain.lower()
+        name = cls.FREE_PROVIDERS.get(domain)
+        cls._ensure_index()
+        external = cls._external.get("free_providers")
+        if name is None and external is not None:
+            name = external.get(domain)
+            # 外部名单未填写名称时使用域名
+            if name == "":
+                name = domain
+        return name
@@ -3,10 +3,16 @@ DNS/MX记录验证器
 验证域名是否存在且配置了邮件服务器
 """
 import asyncio
-from typing import List, Tuple
+import ipaddress
+import os
+from typing import List, Optional, Tuple
+import dns.rdatatype
 import dns.resolver
 import dns.asyncresolver
 from app.models.schemas import DNSResult
+from app.core.cache import SingleFlight, TTLCache
+from app.core.metrics import IN_FLIGHT, stage
+from app.core.providers import ProviderProfile
 
 
 class DNSValidator:
@@ -15,29 +21,121 @@ class DNSValidator:
     # DNS查询超时时间
     DEFAULT_TIMEOUT = 5.0
 
+    # 自定义DNS服务器（逗号分隔），为空时使用系统配置
+    NAMESERVERS: list[str] = [
+        ns.strip() for ns in os.environ.get("DNS_NAMESERVERS", "").split(",") if ns.strip()
+    ]
+    NAMESERVER_PORT = int(os.environ.get("DNS_NAMESERVER_PORT", "53"))
+
+    # 缓存配置：正向结果遵循记录TTL并限制在 [MIN_TTL, MAX_TTL] 内，
+    # NXDOMAIN/NoAnswer 使用较短的 NEGATIVE_TTL
+    CACHE_MAX_SIZE = 10000
+    MIN_TTL = 30
+    MAX_TTL = 3600
+    NEGATIVE_TTL = 60
+
+    # 预先解析IP地址的MX主机数（按优先级取前几个）
+    MX_ADDRESS_HOSTS = int(os.environ.get("DNS_MX_ADDRESS_HOSTS", "3"))
+
+    # 进程内共享的查询缓存，键为 (domain, rdtype)
+    _cache = TTLCache(maxsize=CACHE_MAX_SIZE, name="dns")
+    _resolver: Optional[dns.asyncresolver.Resolver] = None
+
+    # 同一域名的并发验证合并为一次查询
+    _flight = SingleFlight(name="dns")
+
     @classmethod
-    async def validate(cls, domain: str, timeout: float = DEFAULT_TIMEOUT) -> DNSResult:
+    async def validate(
+        cls,
+        domain: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        resolve_mx_addresses: bool = False,
+        profile: Optional[ProviderProfile] = None
+    ) -> DNSResult:
         """
         验证域名的DNS记录
 
         Args:
             domain: 域名
             timeout: 超时时间（秒）
+            resolve_mx_addresses: 是否同时解析前几个MX主机的IP地址（需要SMTP验证时开启）
+            profile: 验证流程选用的提供商配置，提供时直接使用其静态MX表，不查询MX记录
 
         Returns:
             DNSResult: DNS验证结果
         """
+        # 已知提供商直接使用静态MX表，不查询MX记录
+        if profile is not None:
+            result = DNSResult(has_mx=True, mx_records=list(profile.mx_hosts), from_profile=True)
+        else:
+            # 超时时间不同的调用不合并，避免较长超时的调用拿到较短超时的失败结果
+            result = await cls._flight.do(
+                (domain, timeout), lambda: cls._validate(domain, timeout)
+            )
+            # 并发调用者共享同一个结果对象，返回副本避免相互影响
+            result = result.model_copy(deep=True)
+
+        if resolve_mx_addresses and result.mx_records:
+            result.mx_addresses = await cls.resolve_addresses(
+                result.mx_records[:cls.MX_ADDRESS_HOSTS], timeout
+            )
+        return result
+
+    @classmethod
+    async def resolve_addresses(
+        cls,
+        hosts: List[str],
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> dict[str, list[str]]:
+        """
+        并行解析多个主机的 AAAA/A 记录（带缓存）
+
+        MX查询应答附加段中的地址已经写入缓存，这种情况下不再发出查询。
+        IP地址形式的主机直接返回自身，解析失败或没有地址的主机不出现在结果中
+
+        Args:
+            hosts: 主机列表
+            timeout: 超时时间（秒）
+
+        Returns:
+            dict: 主机 -> IP地址列表（IPv6在前）
+        """
+        resolver = cls._get_resolver()
+        lookups = []
+        for host in hosts:
+            try:
+                ipaddress.ip_address(host)
+            except ValueError:
+                lookups.extend(
+                    cls._resolve(resolver, host, rdtype, timeout) for rdtype in ("AAAA", "A")
+                )
+            else:
+                lookups.extend((asyncio.sleep(0, [host]), asyncio.sleep(0, [])))
+        answers = await asyncio.gather(*lookups, return_exceptions=True)
+
+        addresses: dict[str, list[str]] = {}
+        for i, host in enumerate(hosts):
+            found = [
+                address
+                for records in answers[2 * i:2 * i + 2]
+                if not isinstance(records, BaseException)
+                for address in records
+            ]
+            if found:
+                addresses[host] = found
+        return addresses
+
+    @classmethod
+    async def _validate(cls, domain: str, timeout: float) -> DNSResult:
+        """执行实际的DNS验证"""
         result = DNSResult()
 
         try:
-            # 创建异步解析器
-            resolver = dns.asyncresolver.Resolver()
-            resolver.timeout = timeout
-            resolver.lifetime = timeout
+            resolver = cls._get_resolver()
 
             # 并行查询 MX 和 A 记录
-            mx_task = cls._query_mx(resolver, domain)
-            a_task = cls._query_a(resolver, domain)
+            mx_task = cls._query_mx(resolver, domain, timeout)
+            a_task = cls._query_a(resolver, domain, timeout)
 
             mx_result, a_result = await asyncio.gather(
                 mx_task, a_task,
@@ -73,22 +171,96 @@ class DNSValidator:
 
         return result
 
+    @classmethod
+    def _get_resolver(cls) -> dns.asyncresolver.Resolver:
+        """获取共享的异步解析器（避免每次查询都重新读取系统配置）"""
+        if cls._resolver is None:
+            if cls.NAMESERVERS:
+                resolver = dns.asyncresolver.Resolver(configure=False)
+                resolver.nameservers = list(cls.NAMESERVERS)
+                resolver.port = cls.NAMESERVER_PORT
+            else:
+                resolver = dns.asyncresolver.Resolver()
+            cls._resolver = resolver
+        return cls._resolver
+
+    @classmethod
+    def use_nameservers(cls, nameservers: list[str], port: int = 53) -> None:
+        """切换DNS服务器（同时清空缓存）"""
+        cls.NAMESERVERS = list(nameservers)
+        cls.NAMESERVER_PORT = port
+        cls._resolver = None
+        cls.clear_cache()
+
+    @classmethod
+    async def _resolve(
+        cls,
+        resolver: dns.asyncresolver.Resolver,
+        domain: str,
+        rdtype: str,
+        timeout: float
+    ) -> List[str]:
+        """
+        带缓存的记录查询
+
+        返回解析后的记录列表（MX按优先级排序后的主机名，其他类型为文本形式），
+        NXDOMAIN/NoAnswer 以空列表进行负缓存，其他异常不缓存并向上抛出
+        """
+        key = (domain, rdtype)
+        cached = cls._cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            with stage(f"dns_{rdtype.lower()}"), IN_FLIGHT.track(kind="dns_query"):
+                answers = await resolver.resolve(domain, rdtype, lifetime=timeout)
+        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+            cls._cache.set(key, [], ttl=cls.NEGATIVE_TTL)
+            return []
+
+        if rdtype == "MX":
+            records = [
+                str(rdata.exchange).rstrip(".")
+                for rdata in sorted(answers, key=lambda x: x.preference)
+            ]
+        else:
+            records = [rdata.to_text() for rdata in answers]
+
+        ttl = answers.rrset.ttl if answers.rrset is not None else cls.MIN_TTL
+        ttl = max(cls.MIN_TTL, min(cls.MAX_TTL, ttl))
+        cls._cache.set(key, records, ttl=ttl if records else cls.NEGATIVE_TTL)
+        if rdtype == "MX":
+            cls._cache_additional(answers, set(records))
+        return records
+
+    @classmethod
+    def _cache_additional(cls, answers, mx_hosts: set[str]) -> None:
+        """把MX应答附加段中这些MX主机的 A/AAAA 记录写入缓存，之后解析MX地址时无需再次查询"""
+        response = getattr(answers, "response", None)
+        for rrset in getattr(response, "additional", None) or ():
+            if rrset.rdtype not in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                continue
+            host = rrset.name.to_text().rstrip(".")
+            if host not in mx_hosts:
+                continue
+            ttl = max(cls.MIN_TTL, min(cls.MAX_TTL, rrset.ttl))
+            cls._cache.set(
+                (host, dns.rdatatype.to_text(rrset.rdtype)),
+                [rdata.to_text() for rdata in rrset],
+                ttl=ttl
+            )
+
     @classmethod
     async def _query_mx(
         cls,
         resolver: dns.asyncresolver.Resolver,
-        domain: str
+        domain: str,
+        timeout: float = DEFAULT_TIMEOUT
     ) -> Tuple[bool, List[str]]:
         """查询MX记录"""
         try:
-            answers = await resolver.resolve(domain, "MX")
-            mx_records = []
-            for rdata in sorted(answers, key=lambda x: x.preference):
-                mx_host = str(rdata.exchange).rstrip(".")
-                mx_records.append(mx_host)
-            return (len(mx_records) > 0, mx_records)
-        except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
-            return (False, [])
+            mx_records = await cls._resolve(resolver, domain, "MX", timeout)
+            return (len(mx_records) > 0, list(mx_records))
         except Exception:
             return (False, [])
 
@@ -96,15 +268,31 @@ class DNSValidator:
     async def _query_a(
         cls,
         resolver: dns.asyncresolver.Resolver,
-        domain: str
+        domain: str,
+        timeout: float = DEFAULT_TIMEOUT
     ) -> bool:
         """查询A记录"""
         try:
-            answers = await resolver.resolve(domain, "A")
-            return len(answers) > 0
+            addresses = await cls._resolve(resolver, domain, "A", timeout)
+            return len(addresses) > 0
         except Exception:
             return False
 
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """DNS缓存统计信息"""
+        return cls._cache.stats()
+
+    @classmethod
+    def coalescing_stats(cls) -> dict:
+        """DNS请求合并统计信息"""
+        return cls._flight.stats()
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """清空DNS缓存"""
+        cls._cache.clear()
+
     @classmethod
     def validate_sync(cls, domain: str, timeout: float = DEFAULT_TIMEOUT) -> DNSResult:
         """同步版本的DNS验证"""
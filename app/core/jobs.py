@@ -0,0 +1,476 @@
+"""
+异步批量验证任务
+将大规模邮箱列表持久化到本地 SQLite，由有界的工作池分片验证，支持进度查询、
+分页获取结果、取消，以及进程重启后从已完成的位置继续
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+from app.models.schemas import (
+    EmailValidationResult,
+    JobInfo,
+    JobResultItem,
+    JobStatus,
+    ValidationLevel,
+)
+from app.core.validator import EmailValidator
+from app.core.retry import current_job_id, retry_scheduler
+
+logger = logging.getLogger(__name__)
+
+class JobStore:
+    """任务持久化存储（SQLite, WAL 模式）"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        level TEXT NOT NULL,
+        timeout INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        processed INTEGER NOT NULL DEFAULT 0,
+        valid_count INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+    CREATE TABLE IF NOT EXISTS job_emails (
+        job_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        email TEXT NOT NULL,
+        PRIMARY KEY (job_id, idx)
+    );
+    CREATE TABLE IF NOT EXISTS job_results (
+        job_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        email TEXT NOT NULL,
+        valid INTEGER NOT NULL,
+        result TEXT NOT NULL,
+        PRIMARY KEY (job_id, idx)
+    );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """延迟打开数据库连接"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def create_job(
+        self,
+        emails: list[str],
+        level: ValidationLevel,
+        timeout: int
+    ) -> str:
+        """创建任务并保存邮箱列表，返回任务ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, level, timeout, total, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, JobStatus.QUEUED.value, level.value, timeout,
+                     len(emails), now, now)
+                )
+                conn.executemany(
+                    "INSERT INTO job_emails (job_id, idx, email) VALUES (?, ?, ?)",
+                    ((job_id, idx, email) for idx, email in enumerate(emails))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[JobInfo]:
+        """查询任务状态"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, status, level, timeout, total, processed, valid_count,"
+                " error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        (job_id, status, level, timeout, total, processed, valid_count,
+         error, created_at, updated_at) = row
+        return JobInfo(
+            id=job_id,
+            status=JobStatus(status),
+            level=ValidationLevel(level),
+            timeout=timeout,
+            total=total,
+            processed=processed,
+            valid_count=valid_count,
+            invalid_count=processed - valid_count,
+            progress=round(processed / total, 4) if total else 1.0,
+            error=error,
+            created_at=created_at,
+            updated_at=updated_at
+        )
+
+    def claim_job(self, owner: str, stale_after: float) -> Optional[str]:
+        """
+        认领一个待处理的任务
+
+        可认领排队中的任务，以及其他进程心跳超过 stale_after 秒的运行中任务
+        （其所属进程已退出）。认领在写事务中完成，多个工作进程不会重复认领。
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ?"
+                    " OR (status = ? AND updated_at < ? AND owner IS NOT ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (JobStatus.QUEUED.value, JobStatus.RUNNING.value,
+                     now - stale_after, owner)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ?",
+                        (JobStatus.RUNNING.value, owner, now, row[0])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def heartbeat(self, owner: str) -> None:
+        """刷新指定进程所有运行中任务的心跳时间"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET updated_at = ? WHERE owner = ? AND status = ?",
+                (time.time(), owner, JobStatus.RUNNING.value)
+            )
+
+    def release_jobs(self, owner: str) -> None:
+        """将指定进程运行中的任务放回队列（进程正常停止时调用）"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ?"
+                " WHERE owner = ? AND status = ?",
+                (JobStatus.QUEUED.value, time.time(), owner, JobStatus.RUNNING.value)
+            )
+
+    def pending_emails(self, job_id: str, limit: int) -> list[tuple[int, str]]:
+        """
+        获取下一批待处理的邮箱（按序号），用于分片处理和断点续跑
+
+        分片按序号顺序处理且每个分片的结果在同一事务中写入，
+        因此已有结果的最大序号之后即为未处理的部分
+        """
+        with self._lock:
+            return self._connect().execute(
+                "SELECT idx, email FROM job_emails"
+                " WHERE job_id = ? AND idx > ("
+                "   SELECT COALESCE(MAX(idx), -1) FROM job_results WHERE job_id = ?"
+                " )"
+                " ORDER BY idx LIMIT ?",
+                (job_id, job_id, limit)
+            ).fetchall()
+
+    def save_results(
+        self,
+        job_id: str,
+        results: list[tuple[int, EmailValidationResult]]
+    ) -> None:
+        """
+        保存一个分片的结果并更新进度（同一事务内完成）
+
+        任务被重新认领后同一分片可能再次处理，已有的结果被替换，进度只计算新增的部分
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                existing = dict(conn.execute(
+                    "SELECT idx, valid FROM job_results WHERE job_id = ?"
+                    f" AND idx IN ({', '.join('?' * len(results))})",
+                    (job_id, *(idx for idx, _ in results))
+                ).fetchall())
+                conn.executemany(
+                    "INSERT OR REPLACE INTO job_results (job_id, idx, email, valid, result)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    ((job_id, idx, r.email, int(r.valid), r.model_dump_json())
+                     for idx, r in results)
+                )
+                conn.execute(
+                    "UPDATE jobs SET processed = processed + ?,"
+                    " valid_count = valid_count + ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (len(results) - len(existing),
+                     sum(1 for _, r in results if r.valid) - sum(existing.values()),
+                     time.time(), job_id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def update_result(self, job_id: str, result: EmailValidationResult) -> int:
+        """
+        用重试得到的新结果替换任务中该地址的结果，并修正有效数
+
+        Returns:
+            int: 更新的结果条数
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                rows = conn.execute(
+                    "SELECT valid FROM job_results WHERE job_id = ? AND email = ?",
+                    (job_id, result.email)
+                ).fetchall()
+                conn.execute(
+                    "UPDATE job_results SET valid = ?, result = ? WHERE job_id = ? AND email = ?",
+                    (int(result.valid), result.model_dump_json(), job_id, result.email)
+                )
+                delta = sum(int(result.valid) - valid for (valid,) in rows)
+                conn.execute(
+                    "UPDATE jobs SET valid_count = valid_count + ?, updated_at = ? WHERE id = ?",
+                    (delta, time.time(), job_id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def get_status(self, job_id: str) -> Optional[JobStatus]:
+        """仅查询任务状态"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return JobStatus(row[0]) if row else None
+
+    def set_status(
+        self,
+        job_id: str,
+        status: JobStatus,
+        error: Optional[str] = None,
+        only_if_active: bool = False
+    ) -> bool:
+        """更新任务状态，only_if_active 时仅更新排队中/运行中的任务"""
+        sql = "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?"
+        params: tuple = (status.value, error, time.time(), job_id)
+        if only_if_active:
+            sql += " AND status IN (?, ?)"
+            params += (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+        with self._lock:
+            cursor = self._connect().execute(sql, params)
+        return cursor.rowcount > 0
+
+    def get_results(self, job_id: str, offset: int, limit: int) -> list[JobResultItem]:
+        """按序号分页获取已完成的结果"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT idx, result FROM job_results WHERE job_id = ?"
+                " ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [
+            JobResultItem(
+                index=idx,
+                result=EmailValidationResult.model_validate_json(result)
+            )
+            for idx, result in rows
+        ]
+
+
+class JobManager:
+    """
+    任务调度器
+
+    后台轮询认领任务，最多同时运行 MAX_CONCURRENT_JOBS 个任务。
+    每个任务按 CHUNK_SIZE 分片调用 EmailValidator.iter_batch，
+    每个分片完成后持久化结果，因此进程重启后只需处理剩余部分。
+    收到临时错误的地址由重试调度器稍后重试，得到结论后更新任务结果（任务完成后也会更新）。
+    """
+
+    DB_PATH = os.environ.get("JOB_DB_PATH", "data/jobs.db")
+    MAX_CONCURRENT_JOBS = 2
+    CHUNK_SIZE = 200
+    POLL_INTERVAL = 2.0
+    # 运行中任务超过该时间无心跳，视为所属进程异常退出，可被重新认领
+    STALE_AFTER = 60.0
+    # 轮询出错（如数据库被锁）后等待的秒数
+    ERROR_DELAY = 5.0
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.store = JobStore(db_path or self.DB_PATH)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running: dict[str, asyncio.Task] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """启动后台调度（会自动恢复未完成的任务）"""
+        retry_scheduler.add_listener(self._on_retry_result)
+        if self._poller is None:
+            self._wakeup = asyncio.Event()
+            self._poller = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        """停止调度；运行中的任务放回队列，重启后从已完成的位置续跑"""
+        tasks = list(self._running.values())
+        if self._poller is not None:
+            tasks.append(self._poller)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._poller = None
+        self._running.clear()
+        await asyncio.to_thread(self.store.release_jobs, self.owner)
+        self.store.close()
+
+    async def submit(
+        self,
+        emails: list[str],
+        level: ValidationLevel,
+        timeout: int
+    ) -> JobInfo:
+        """提交新任务"""
+        job_id = await asyncio.to_thread(self.store.create_job, emails, level, timeout)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[JobInfo]:
+        """查询任务"""
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is not None:
+            job.pending_retries = retry_scheduler.pending_count(job_id)
+        return job
+
+    async def results(self, job_id: str, offset: int, limit: int) -> list[JobResultItem]:
+        """分页获取任务结果"""
+        return await asyncio.to_thread(self.store.get_results, job_id, offset, limit)
+
+    async def cancel(self, job_id: str) -> Optional[JobInfo]:
+        """取消任务；已结束的任务保持原状态"""
+        await asyncio.to_thread(
+            self.store.set_status, job_id, JobStatus.CANCELLED, None, True
+        )
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return await self.get(job_id)
+
+    async def _poll_loop(self) -> None:
+        """认领任务直到达到并发上限，空闲时等待新任务或轮询间隔"""
+        while True:
+            try:
+                if self._running:
+                    await asyncio.to_thread(self.store.heartbeat, self.owner)
+
+                while len(self._running) < self.MAX_CONCURRENT_JOBS:
+                    job_id = await asyncio.to_thread(
+                        self.store.claim_job, self.owner, self.STALE_AFTER
+                    )
+                    if job_id is None:
+                        break
+                    task = asyncio.create_task(self._run_job(job_id))
+                    self._running[job_id] = task
+                    task.add_done_callback(lambda _, j=job_id: self._on_job_done(j))
+            except Exception:
+                # 出错不能结束轮询，否则不再认领任务，运行中的任务也停止心跳
+                logger.exception("轮询任务出错")
+                await asyncio.sleep(self.ERROR_DELAY)
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _on_retry_result(self, job_id: str, result: EmailValidationResult) -> None:
+        """重试得到结论后更新任务结果"""
+        await asyncio.to_thread(self.store.update_result, job_id, result)
+
+    def _on_job_done(self, job_id: str) -> None:
+        self._running.pop(job_id, None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_job(self, job_id: str) -> None:
+        """分片处理一个任务"""
+        job = await self.get(job_id)
+        if job is None:
+            return
+
+        try:
+            while True:
+                status = await asyncio.to_thread(self.store.get_status, job_id)
+                if status != JobStatus.RUNNING:
+                    return
+
+                chunk = await asyncio.to_thread(
+                    self.store.pending_emails, job_id, self.CHUNK_SIZE
+                )
+                if not chunk:
+                    await asyncio.to_thread(
+                        self.store.set_status, job_id, JobStatus.COMPLETED, None, True
+                    )
+                    return
+
+                indexes = [idx for idx, _ in chunk]
+                results: list[tuple[int, EmailValidationResult]] = []
+                # 验证任务继承上下文，进入重试队列的地址记录所属任务
+                token = current_job_id.set(job_id)
+                try:
+                    async for position, result in EmailValidator.iter_batch(
+                        [email for _, email in chunk], job.level, job.timeout
+                    ):
+                        results.append((indexes[position], result))
+                finally:
+                    current_job_id.reset(token)
+
+                await asyncio.to_thread(self.store.save_results, job_id, results)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await asyncio.to_thread(
+                self.store.set_status, job_id, JobStatus.FAILED, str(e), True
+            )
+
+
+# 进程内共享的任务调度器
+job_manager = JobManager()
@@ -0,0 +1,289 @@
+"""
+字符串匹配索引
+- DomainSuffixTrie: 按标签倒序存储的域名后缀树，判断域名本身或任一上级域名是否在名单中
+- KeywordMatcher: Aho-Corasick 多关键词匹配自动机，一次扫描找出文本中包含的任一关键词
+- RoleMatcher: 角色账户前缀树，一次扫描识别精确匹配、数字后缀和分隔符变体
+
+均在构建后只读，查询耗时只与查询串长度有关，与名单规模无关
+"""
+import sys
+from collections import deque
+from typing import Iterable, Optional
+
+
+# 后缀树中表示“到此为止的域名在名单中”的标记：
+# 没有子节点的终止节点直接存为 _LEAF，有子节点的终止节点在字典中以 _END 键标记
+_LEAF = True
+_END = ""
+
+
+def _deep_sizeof(obj, seen: set[int]) -> int:
+    """递归估算容器及其内容占用的内存（字节），共享对象只计一次"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_sizeof(key, seen) + _deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _deep_sizeof(item, seen)
+    return size
+
+
+class DomainSuffixTrie:
+    """按标签倒序存储的域名后缀树（com -> mailinator -> ...）"""
+
+    def __init__(self, domains: Iterable[str] = ()):
+        self._root: dict = {}
+        self._size = 0
+        self._nodes = 1
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain: str) -> bool:
+        """
+        加入一个域名
+
+        Returns:
+            bool: 是否为新加入的域名
+        """
+        labels = domain.strip().lower().rstrip(".").split(".")
+        if not all(labels):
+            return False
+
+        node = self._root
+        for label in reversed(labels[1:]):
+            label = sys.intern(label)
+            child = node.get(label)
+            if child is None:
+                child = node[label] = {}
+                self._nodes += 1
+            elif child is _LEAF:
+                # 已有的终止节点需要挂子节点，展开为字典
+                child = node[label] = {_END: _LEAF}
+            node = child
+
+        label = sys.intern(labels[0])
+        child = node.get(label)
+        if child is _LEAF or (child is not None and _END in child):
+            return False
+        if child is None:
+            node[label] = _LEAF
+            self._nodes += 1
+        else:
+            child[_END] = _LEAF
+        self._size += 1
+        return True
+
+    def match(self, domain: str) -> Optional[str]:
+        """
+        查找名单中与域名匹配的条目（域名本身或任一上级域名）
+
+        Args:
+            domain: 已标准化的域名
+
+        Returns:
+            str: 匹配到的名单条目（最短的上级域名），未匹配时返回 None
+        """
+        labels = domain.split(".")
+        node = self._root
+        depth = 0
+        for label in reversed(labels):
+            child = node.get(label)
+            if child is None:
+                return None
+            depth += 1
+            if child is _LEAF or _END in child:
+                return ".".join(labels[-depth:])
+            node = child
+        return None
+
+    def __contains__(self, domain: str) -> bool:
+        return self.match(domain) is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        """条目数、节点数和估算的内存占用"""
+        return {
+            "entries": self._size,
+            "nodes": self._nodes,
+            "memory_bytes": _deep_sizeof(self._root, set()),
+        }
+
+
+class KeywordMatcher:
+    """Aho-Corasick 多关键词匹配"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted({k.lower() for k in keywords if k})
+        # 每个状态的转移表；失败转移在构建时展开，扫描时每个字符只查一次表
+        self._goto: list[dict[str, int]] = [{}]
+        # 到达该状态时已匹配到的关键词（自身或经失败转移可达的），None 表示无
+        self._output: list[Optional[str]] = [None]
+        self._build()
+
+    def _build(self) -> None:
+        # 先构建关键词前缀树，children 只保存树边
+        children: list[dict[str, int]] = [{}]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = children[state].get(char)
+                if next_state is None:
+                    next_state = len(children)
+                    children.append({})
+                    self._output.append(None)
+                    children[state][char] = next_state
+                state = next_state
+            self._output[state] = keyword
+
+        # 广度优先计算失败转移，并把失败状态的转移合并进转移表（浅层状态先处理完毕）
+        self._goto = [dict(edges) for edges in children]
+        fail = [0] * len(children)
+        queue = deque(children[0].values())
+        while queue:
+            state = queue.popleft()
+            if state:
+                for char, target in self._goto[fail[state]].items():
+                    self._goto[state].setdefault(char, target)
+            for char, child in children[state].items():
+                fail[child] = self._goto[fail[state]].get(char, 0)
+                if self._output[child] is None:
+                    self._output[child] = self._output[fail[child]]
+                queue.append(child)
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        扫描文本，返回第一个出现的关键词
+
+        Returns:
+            str: 匹配到的关键词，未匹配时返回 None
+        """
+        goto = self._goto
+        output = self._output
+        state = 0
+        for char in text:
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+    def __contains__(self, text: str) -> bool:
+        return self.search(text) is not None
+
+    def stats(self) -> dict:
+        """关键词数、状态数和估算的内存占用"""
+        return {
+            "keywords": len(self.keywords),
+            "states": len(self._goto),
+            "memory_bytes": _deep_sizeof([self._goto, self._output], set()),
+        }
+
+
+class RoleMatcher:
+    """
+    角色账户前缀树
+
+    识别以下形式（prefix 为名单中的前缀）：
+    - 精确匹配: support
+    - 数字后缀: support2, admin01
+    - 分隔符变体: support-team, info.cn, sales_2 —— 分隔符后为数字、
+      REGION_CODES 中的地区/语言代码，或者本身是角色账户
+
+    分隔符后的短单词不一定是地区代码（sales.amy、info.bob 是个人地址），只接受明确列出的代码
+    """
+
+    SEPARATORS = frozenset("-._")
+
+    # 常见的 ISO 3166-1 国家/地区代码和 ISO 639-1 语言代码（含 uk、eu 等习惯写法）
+    REGION_CODES = frozenset({
+        # 国家/地区
+        "ae", "ar", "at", "au", "be", "bg", "br", "ca", "ch", "cl", "cn", "co", "cz", "de",
+        "dk", "ee", "eg", "es", "eu", "fi", "fr", "gb", "gr", "hk", "hr", "hu", "id", "ie",
+        "il", "in", "is", "it", "jp", "kr", "lt", "lu", "lv", "mo", "mx", "my", "ng", "nl",
+        "no", "nz", "pe", "ph", "pk", "pl", "pt", "ro", "rs", "ru", "sa", "se", "sg", "si",
+        "sk", "th", "tr", "tw", "ua", "uk", "us", "vn", "za",
+        # 语言
+        "cs", "da", "el", "en", "et", "fa", "he", "hi", "ja", "ko", "ms", "sl", "sr", "sv",
+        "vi", "zh",
+    })
+
+    def __init__(self, prefixes: Iterable[str] = ()):
+        self._root: dict = {}
+        self._size = 0
+        self._nodes = 1
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str) -> bool:
+        """
+        加入一个前缀
+
+        Returns:
+            bool: 是否为新加入的前缀
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return False
+        node = self._root
+        for char in prefix:
+            child = node.get(char)
+            if child is None:
+                child = node[char] = {}
+                self._nodes += 1
+            node = child
+        if _END in node:
+            return False
+        node[_END] = _LEAF
+        self._size += 1
+        return True
+
+    def match(self, local_part: str) -> Optional[str]:
+        """
+        沿前缀树扫描本地部分，在每个前缀结束处检查剩余部分
+
+        Args:
+            local_part: 已标准化的本地部分
+
+        Returns:
+            str: 匹配到的前缀，不是角色账户时返回 None
+        """
+        node = self._root
+        for i, char in enumerate(local_part):
+            node = node.get(char)
+            if node is None:
+                return None
+            if _END in node and self.suffix_allowed(local_part[i + 1:]):
+                return local_part[:i + 1]
+        return None
+
+    def suffix_allowed(self, tail: str) -> bool:
+        """前缀之后的剩余部分是否仍表示角色账户"""
+        if not tail or tail.isdigit():
+            return True
+        if tail[0] not in self.SEPARATORS:
+            return False
+        rest = tail[1:]
+        if not rest:
+            return False
+        if rest.isdigit() or rest in self.REGION_CODES:
+            return True
+        return self.match(rest) is not None
+
+    def __contains__(self, local_part: str) -> bool:
+        return self.match(local_part) is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        """前缀数、节点数和估算的内存占用"""
+        return {
+            "entries": self._size,
+            "nodes": self._nodes,
+            "memory_bytes": _deep_sizeof(self._root, set()),
+        }
@@ -0,0 +1,254 @@
+"""
+运行指标
+进程内的计数器、仪表盘和直方图，按 Prometheus 文本格式导出；
+同时在当前请求的上下文中累计各验证阶段的耗时
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    """生成 {name="value",...} 形式的标签串"""
+    parts = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """指标基类：按标签值分组保存样本"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} 需要标签 {self.labels}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for key in sorted(self._values):
+            lines.extend(self._render_sample(key, self._values[key]))
+        return lines
+
+    def _render_sample(self, key: tuple[str, ...], value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """在代码块执行期间将仪表盘加一"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """累积分桶直方图（单位：秒）"""
+
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+    )
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        sample = self._values.get(key)
+        if sample is None:
+            sample = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                sample["buckets"][i] += 1
+                break
+        sample["sum"] += value
+        sample["count"] += 1
+
+    def count(self, **labels: str) -> int:
+        sample = self._values.get(self._key(labels))
+        return sample["count"] if sample else 0
+
+    def _render_sample(self, key: tuple[str, ...], sample) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, observed in zip(self.buckets, sample["buckets"]):
+            cumulative += observed
+            labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(sample['sum'])}")
+        lines.append(f"{self.name}_count{labels} {sample['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, labels))
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """清空所有样本（测试用）"""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "email_validation_stage_seconds", "各验证阶段耗时（秒）", ("stage",)
+)
+VALIDATIONS = registry.counter(
+    "email_validations_total", "完成的验证次数", ("level", "cached")
+)
+SMTP_REPLIES = registry.counter(
+    "smtp_replies_total", "SMTP命令响应码计数", ("mx", "command", "code")
+)
+IN_FLIGHT = registry.gauge(
+    "email_validation_in_flight", "正在进行的操作数", ("kind",)
+)
+CACHE_HIT_RATIO = registry.gauge(
+    "cache_hit_ratio", "缓存命中率", ("cache",)
+)
+CACHE_ENTRIES = registry.gauge(
+    "cache_entries", "缓存条目数", ("cache",)
+)
+SMTP_POOL_CONNECTIONS = registry.gauge(
+    "smtp_pool_connections", "SMTP连接池连接数", ("state",)
+)
+SMTP_BREAKERS = registry.gauge(
+    "smtp_circuit_breakers", "处于熔断状态的MX主机数", ("state",)
+)
+
+
+# 当前请求的阶段耗时（毫秒），未收集时为 None
+_stage_timings: ContextVar[Optional[dict[str, float]]] = ContextVar(
+    "stage_timings", default=None
+)
+
+
+@contextmanager
+def collect_timings(initial: Optional[dict[str, float]] = None) -> Iterator[dict[str, float]]:
+    """
+    在代码块内收集阶段耗时
+
+    Args:
+        initial: 预先测得的耗时（例如批量验证中同一域名共享的DNS耗时）
+
+    Yields:
+        dict[str, float]: 阶段名到累计耗时（毫秒）的映射
+    """
+    timings = dict(initial or {})
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """记录一次阶段耗时：写入直方图，并累加到当前上下文（如有）"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 3)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """测量代码块的耗时并记录为指定阶段"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
@@ -0,0 +1,134 @@
+"""
+已知邮箱提供商配置
+为常见的免费邮箱提供商内置MX主机和行为特征（RCPT验证是否有意义、是否 catch-all），
+DNS级别验证可以直接使用静态MX表而不访问网络，SMTP阶段据此调整探测策略。
+配置保存在 JSON 数据文件中，可在运行时重新加载
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class ProviderProfile:
+    """单个提供商的配置"""
+    name: str
+    domains: tuple[str, ...]
+    mx_hosts: tuple[str, ...]
+    # RCPT TO 的响应是否能反映邮箱是否存在（部分提供商对所有地址都返回250）
+    rcpt_verification: bool = True
+    # 是否 catch-all，None 表示未知，仍需探测
+    catch_all: Optional[bool] = None
+
+
+class ProviderRegistry:
+    """提供商配置注册表，按域名查找"""
+
+    PATH = os.environ.get(
+        "PROVIDER_PROFILES_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "providers.json")
+    )
+    ENABLED = os.environ.get("PROVIDER_PROFILES_ENABLED", "1") != "0"
+
+    # 域名 -> 配置，首次使用时加载
+    _profiles: Optional[dict[str, ProviderProfile]] = None
+    _version: Optional[int] = None
+
+    @classmethod
+    def get(cls, domain: Optional[str]) -> Optional[ProviderProfile]:
+        """
+        查找域名对应的提供商配置
+
+        Args:
+            domain: 邮箱域名
+
+        Returns:
+            ProviderProfile: 提供商配置，未知域名或功能关闭时返回 None
+        """
+        if not cls.ENABLED or not domain:
+            return None
+        return cls._load().get(domain.lower())
+
+    @classmethod
+    def profiles(cls) -> list[ProviderProfile]:
+        """所有已加载的提供商配置（去重，按名称排序）"""
+        unique = {id(profile): profile for profile in cls._load().values()}
+        return sorted(unique.values(), key=lambda profile: profile.name)
+
+    @classmethod
+    def reload(cls, path: Optional[str] = None) -> int:
+        """
+        从数据文件重新加载配置
+
+        新配置完整解析成功后才替换旧配置，文件无效时保留旧配置
+
+        Args:
+            path: 数据文件路径，为空时使用 PATH
+
+        Returns:
+            int: 加载的提供商数量
+
+        Raises:
+            ValueError: 文件不存在或格式无效
+        """
+        path = path or cls.PATH
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"无法读取提供商配置 {path}: {e}") from e
+
+        profiles, version = cls._parse(data)
+        cls._profiles = profiles
+        cls._version = version
+        cls.PATH = path
+        return len({id(profile) for profile in profiles.values()})
+
+    @classmethod
+    def _parse(cls, data) -> tuple[dict[str, ProviderProfile], Optional[int]]:
+        """解析数据文件内容，返回 (域名 -> 配置, 版本号)"""
+        if not isinstance(data, dict) or not isinstance(data.get("providers"), list):
+            raise ValueError("提供商配置缺少 providers 列表")
+
+        profiles: dict[str, ProviderProfile] = {}
+        for entry in data["providers"]:
+            try:
+                profile = ProviderProfile(
+                    name=str(entry["name"]),
+                    domains=tuple(d.strip().lower() for d in entry["domains"]),
+                    mx_hosts=tuple(h.strip().lower().rstrip(".") for h in entry["mx_hosts"]),
+                    rcpt_verification=bool(entry.get("rcpt_verification", True)),
+                    catch_all=entry.get("catch_all"),
+                )
+            except (KeyError, TypeError, AttributeError) as e:
+                raise ValueError(f"提供商配置格式无效: {entry!r}") from e
+            if not profile.domains or not profile.mx_hosts:
+                raise ValueError(f"提供商 {profile.name} 缺少域名或MX主机")
+            if profile.catch_all not in (True, False, None):
+                raise ValueError(f"提供商 {profile.name} 的 catch_all 必须为布尔值或 null")
+            for domain in profile.domains:
+                profiles[domain] = profile
+        return profiles, data.get("version")
+
+    @classmethod
+    def _load(cls) -> dict[str, ProviderProfile]:
+        if cls._profiles is None:
+            try:
+                cls.reload()
+            except ValueError:
+                # 数据文件缺失或无效时不使用静态配置，回退到正常的DNS/SMTP验证
+                cls._profiles = {}
+        return cls._profiles
+
+    @classmethod
+    def stats(cls) -> dict:
+        """配置统计信息"""
+        profiles = cls.profiles()
+        return {
+            "enabled": cls.ENABLED,
+            "path": cls.PATH,
+            "version": cls._version,
+            "providers": len(profiles),
+            "domains": sum(len(profile.domains) for profile in profiles),
+        }
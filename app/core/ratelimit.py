@@ -0,0 +1,202 @@
+"""
+出站SMTP限速
+对同一个MX主机、同一个提供商（例如所有 *.google.com 的MX）的新建连接和 RCPT 命令分别使用令牌桶限速，
+令牌不足时等待而不是失败，避免短时间内大量探测导致被对方降速（tarpit）或拉黑
+"""
+import asyncio
+import ipaddress
+import os
+import time
+from typing import Optional
+from app.core.metrics import record_stage
+
+
+def _parse_limit(value: str) -> tuple[float, float]:
+    """解析“速率/突发量”形式的限速配置，例如 "10/20" 表示每秒10个、最多累积20个"""
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+# 二级域名为公共后缀的国家顶级域（例如 co.uk、com.cn）
+_SECOND_LEVEL_SUFFIXES = frozenset({"co", "com", "net", "org", "ac", "gov", "edu", "ne", "or"})
+
+
+def provider_group(mx_host: str) -> str:
+    """
+    MX主机所属的提供商分组：主机的注册域名
+
+    gmail-smtp-in.l.google.com 和 alt1.gmail-smtp-in.l.google.com 同属 google.com，
+    xxx.mail.protection.outlook.com 属于 outlook.com；IP地址自成一组
+    """
+    try:
+        return str(ipaddress.ip_address(mx_host))
+    except ValueError:
+        pass
+    labels = mx_host.lower().rstrip(".").split(".")
+    if (len(labels) >= 3 and len(labels[-1]) == 2
+            and labels[-2] in _SECOND_LEVEL_SUFFIXES):
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    采用预约方式：取令牌时直接扣减（可以扣成负数），返回需要等待的时间，
+    后到的调用方排在前面的预约之后，等待期间不需要轮询
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated_at:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """
+        预约一个令牌
+
+        Returns:
+            float: 令牌可用前需要等待的秒数，0 表示立即可用
+        """
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def cancel(self) -> None:
+        """归还一个未使用的预约"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def idle(self, now: float) -> bool:
+        """令牌已回满，删除后重新创建不影响限速"""
+        return self.tokens + (now - self.updated_at) * self.rate >= self.burst
+
+
+class RateLimiter:
+    """
+    按MX主机和提供商分组的令牌桶限速器
+
+    每次新建连接、发送 RCPT 前分别从该MX的桶和所属提供商分组的桶中各取一个令牌，
+    按两者中较长的等待时间等待；等待时间记录为 smtp_connect_throttle / smtp_rcpt_throttle 阶段耗时
+    """
+
+    CONNECT = "connect"
+    RCPT = "rcpt"
+
+    ENABLED = os.environ.get("SMTP_RATE_LIMIT_ENABLED", "1") != "0"
+
+    # 限速配置：“每秒速率/突发量”，速率为0表示不限
+    MX_LIMITS = {
+        CONNECT: _parse_limit(os.environ.get("SMTP_RATE_MX_CONNECT", "2/5")),
+        RCPT: _parse_limit(os.environ.get("SMTP_RATE_MX_RCPT", "10/20")),
+    }
+    GROUP_LIMITS = {
+        CONNECT: _parse_limit(os.environ.get("SMTP_RATE_GROUP_CONNECT", "5/10")),
+        RCPT: _parse_limit(os.environ.get("SMTP_RATE_GROUP_RCPT", "30/60")),
+    }
+
+    # 桶数超过该值时清理已回满的桶
+    MAX_BUCKETS = 10000
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = self.ENABLED if enabled is None else enabled
+        self.mx_limits = dict(self.MX_LIMITS)
+        self.group_limits = dict(self.GROUP_LIMITS)
+        self._buckets: dict[tuple[str, str, str], TokenBucket] = {}
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _bucket(self, scope: str, key: str, kind: str) -> Optional[TokenBucket]:
+        limits = self.mx_limits if scope == "mx" else self.group_limits
+        rate, burst = limits[kind]
+        if rate <= 0:
+            return None
+        bucket = self._buckets.get((scope, key, kind))
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                self._prune()
+            bucket = self._buckets[(scope, key, kind)] = TokenBucket(rate, burst)
+        return bucket
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            if bucket.idle(now):
+                del self._buckets[key]
+
+    async def acquire(self, kind: str, mx_host: str, timeout: Optional[float] = None) -> float:
+        """
+        等待直到该MX和所属分组都有可用令牌
+
+        Args:
+            kind: CONNECT 或 RCPT
+            mx_host: MX主机
+            timeout: 最多等待的秒数，为空时不限
+
+        Returns:
+            float: 实际等待的秒数
+
+        Raises:
+            asyncio.TimeoutError: 需要等待的时间超过 timeout（预约已归还，不占用配额）
+        """
+        if not self.enabled:
+            return 0.0
+        buckets = [
+            bucket for bucket in (
+                self._bucket("mx", mx_host, kind),
+                self._bucket("group", provider_group(mx_host), kind),
+            )
+            if bucket is not None
+        ]
+        now = time.monotonic()
+        wait = max((bucket.reserve(now) for bucket in buckets), default=0.0)
+        if timeout is not None and wait > timeout:
+            for bucket in buckets:
+                bucket.cancel()
+            self.throttled += 1
+            raise asyncio.TimeoutError(f"{mx_host} 的限速等待超过剩余时间")
+        self.acquired += 1
+        if wait <= 0:
+            return 0.0
+
+        self.throttled += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # 等待被取消（例如对冲探测已得到结论）时归还预约，不占用后来者的配额
+            for bucket in buckets:
+                bucket.cancel()
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+            record_stage(f"smtp_{kind}_throttle", waited)
+        return waited
+
+    def stats(self) -> dict:
+        """限速统计信息"""
+        return {
+            "enabled": self.enabled,
+            "buckets": len(self._buckets),
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "mx_limits": {kind: list(limit) for kind, limit in self.mx_limits.items()},
+            "group_limits": {kind: list(limit) for kind, limit in self.group_limits.items()},
+        }
+
+    def clear(self) -> None:
+        """清空所有令牌桶和统计（测试用）"""
+        self._buckets.clear()
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
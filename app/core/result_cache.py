@@ -0,0 +1,229 @@
+"""
+持久化验证结果缓存
+基于 SQLite (WAL 模式) 的磁盘缓存，按 (标准化邮箱, 验证级别) 保存完整验证结果，
+同一台机器上的多个 uvicorn 工作进程共享，服务重启后仍然有效。
+读写都是阻塞的 SQLite 调用，异步代码中应通过 asyncio.to_thread 调用
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+from app.models.schemas import EmailValidationResult, ValidationLevel
+
+
+class ResultCache:
+    """跨进程共享的验证结果缓存"""
+
+    DB_PATH = os.environ.get("RESULT_CACHE_PATH", "data/results.db")
+    ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") != "0"
+
+    # 各验证级别的缓存时间（秒），0 表示不缓存
+    LEVEL_TTLS: dict[ValidationLevel, int] = {
+        ValidationLevel.SYNTAX: 0,
+        ValidationLevel.DNS: 6 * 3600,
+        ValidationLevel.SMTP: 24 * 3600,
+        ValidationLevel.FULL: 24 * 3600,
+    }
+
+    # 结论不确定（DNS查询失败、SMTP无法连接或临时错误）时的缓存时间
+    INCONCLUSIVE_TTL = 300
+
+    # 每写入多少次清理一次过期条目
+    PURGE_EVERY = 1000
+
+    # 数据库繁忙时最多等待的毫秒数，超时则跳过缓存
+    BUSY_TIMEOUT_MS = 200
+
+    _conn: Optional[sqlite3.Connection] = None
+    _pid: Optional[int] = None
+    # 连接在工作线程间共享，同一时间只允许一个线程使用
+    _lock = threading.Lock()
+    _writes = 0
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def configure(cls, path: str, enabled: bool = True) -> None:
+        """修改缓存位置（关闭已打开的连接）"""
+        cls.close()
+        cls.DB_PATH = path
+        cls.ENABLED = enabled
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        """延迟打开连接；进程 fork 后重新打开"""
+        if cls._conn is None or cls._pid != os.getpid():
+            directory = os.path.dirname(cls.DB_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(
+                cls.DB_PATH,
+                timeout=cls.BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                " email TEXT NOT NULL,"
+                " level TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (email, level)"
+                ") WITHOUT ROWID"
+            )
+            cls._conn = conn
+            cls._pid = os.getpid()
+        return cls._conn
+
+    @classmethod
+    def close(cls) -> None:
+        """关闭连接"""
+        with cls._lock:
+            if cls._conn is not None and cls._pid == os.getpid():
+                cls._conn.close()
+            cls._conn = None
+            cls._pid = None
+
+    @classmethod
+    def is_cacheable(cls, level: ValidationLevel) -> bool:
+        """该验证级别是否使用缓存"""
+        return cls.ENABLED and cls.LEVEL_TTLS.get(level, 0) > 0
+
+    @classmethod
+    def get(cls, email: str, level: ValidationLevel) -> Optional[EmailValidationResult]:
+        """
+        读取缓存的验证结果
+
+        Args:
+            email: 标准化后的邮箱地址
+            level: 验证级别
+
+        Returns:
+            命中时返回标记为 cached 的结果，否则返回 None
+        """
+        return cls.get_many([email], level).get(email)
+
+    @classmethod
+    def get_many(
+        cls,
+        emails: Iterable[str],
+        level: ValidationLevel
+    ) -> dict[str, EmailValidationResult]:
+        """批量读取缓存的验证结果"""
+        if not cls.is_cacheable(level):
+            return {}
+
+        emails = list(emails)
+        found: dict[str, EmailValidationResult] = {}
+        now = time.time()
+        rows = []
+        with cls._lock:
+            try:
+                conn = cls._connect()
+                # 分批查询，避免超出 SQLite 参数数量上限
+                for i in range(0, len(emails), 500):
+                    chunk = emails[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows += conn.execute(
+                        f"SELECT email, result FROM verdicts"
+                        f" WHERE level = ? AND expires_at > ? AND email IN ({placeholders})",
+                        (level.value, now, *chunk)
+                    ).fetchall()
+            except (sqlite3.Error, OSError):
+                pass
+            cls._hits += len(rows)
+            cls._misses += len(emails) - len(rows)
+        for email, result in rows:
+            cached = EmailValidationResult.model_validate_json(result)
+            cached.cached = True
+            found[email] = cached
+        return found
+
+    @classmethod
+    def set(cls, email: str, level: ValidationLevel, result: EmailValidationResult) -> None:
+        """写入验证结果，按级别和结论确定缓存时间"""
+        if not cls.is_cacheable(level):
+            return
+
+        ttl = cls._ttl_for(level, result)
+        data = result.model_dump_json()
+        with cls._lock:
+            try:
+                conn = cls._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO verdicts (email, level, result, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (email, level.value, data, time.time() + ttl)
+                )
+                cls._writes += 1
+                if cls._writes % cls.PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),))
+            except (sqlite3.Error, OSError):
+                pass
+
+    @classmethod
+    def _ttl_for(cls, level: ValidationLevel, result: EmailValidationResult) -> int:
+        """结论不确定的结果只短暂缓存"""
+        ttl = cls.LEVEL_TTLS[level]
+        inconclusive = (
+            (result.dns is not None and result.dns.error is not None)
+            or (result.smtp is not None and (
+                not result.smtp.connectable
+                or result.smtp.temporary_failure
+            ))
+        )
+        if inconclusive:
+            ttl = min(ttl, cls.INCONCLUSIVE_TTL)
+        return ttl
+
+    @classmethod
+    def delete(cls, email: str, level: Optional[ValidationLevel] = None) -> None:
+        """删除缓存的结果，不指定级别时删除所有级别"""
+        with cls._lock:
+            try:
+                conn = cls._connect()
+                if level is None:
+                    conn.execute("DELETE FROM verdicts WHERE email = ?", (email,))
+                else:
+                    conn.execute(
+                        "DELETE FROM verdicts WHERE email = ? AND level = ?",
+                        (email, level.value)
+                    )
+            except (sqlite3.Error, OSError):
+                pass
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        """清理过期条目，返回删除的数量"""
+        with cls._lock:
+            try:
+                cursor = cls._connect().execute(
+                    "DELETE FROM verdicts WHERE expires_at <= ?", (time.time(),)
+                )
+                return cursor.rowcount
+            except (sqlite3.Error, OSError):
+                return 0
+
+    @classmethod
+    def stats(cls) -> dict:
+        """缓存统计信息"""
+        entries = 0
+        if cls.ENABLED:
+            with cls._lock:
+                try:
+                    (entries,) = cls._connect().execute(
+                        "SELECT COUNT(*) FROM verdicts WHERE expires_at > ?", (time.time(),)
+                    ).fetchone()
+                except (sqlite3.Error, OSError):
+                    pass
+        lookups = cls._hits + cls._misses
+        return {
+            "enabled": cls.ENABLED,
+            "entries": entries,
+            "hits": cls._hits,
+            "misses": cls._misses,
+            "hit_ratio": round(cls._hits / lookups, 4) if lookups else 0.0,
+        }
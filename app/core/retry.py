@@ -0,0 +1,498 @@
+"""
+灰名单重试调度
+RCPT TO 收到 450/451/452 临时错误（通常是灰名单）的地址不直接给出结论，
+而是放入按时间排序的重试队列（内存堆 + SQLite 持久化），按MX退避一段时间后重新探测。
+同一组MX上到期的地址在一个复用的SMTP会话中批量重试，得到结论后更新结果缓存，
+批量任务中的地址同时更新任务结果。
+数据库读写都放到线程中执行，内存中的队列只在事件循环中修改
+"""
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+from app.models.schemas import EmailValidationRequest, EmailValidationResult, SMTPResult, ValidationLevel
+from app.core.smtp import SMTPValidator
+from app.core.result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# 当前正在执行的批量任务ID，由任务调度器设置，重试得到结论后据此更新任务结果
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+# 重试得到最终结论、重新生成验证结果时置位，避免再次排队
+_retrying: ContextVar[bool] = ContextVar("retrying", default=False)
+
+
+@dataclass
+class RetryEntry:
+    """一个等待重试的地址"""
+    email: str
+    level: ValidationLevel
+    job_id: str                  # 空字符串表示不属于批量任务
+    mx_hosts: tuple[str, ...]
+    timeout: int
+    check_catch_all: bool
+    attempts: int                # 已完成的重试次数
+    due_at: float
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return (self.email, self.level.value, self.job_id)
+
+    @property
+    def mx_key(self) -> str:
+        return ",".join(self.mx_hosts)
+
+
+class RetryScheduler:
+    """
+    灰名单重试调度器
+
+    到期时间最早的条目在堆顶；同一组MX上已到期的条目连同 BATCH_WINDOW 秒内即将到期的条目
+    一起通过 SMTPValidator.validate_many 在同一会话中重试。多个工作进程共享同一个数据库，
+    重试前以条件更新认领条目，不会重复探测
+    """
+
+    DB_PATH = os.environ.get("RETRY_DB_PATH", "data/retries.db")
+    ENABLED = os.environ.get("GREYLIST_RETRY_ENABLED", "1") != "0"
+
+    # 第 n 次重试前等待的秒数，重试次数用完仍是临时错误时给出最终结论
+    DELAYS: list[float] = [
+        float(delay) for delay in os.environ.get("GREYLIST_RETRY_DELAYS", "300,900,1800").split(",")
+    ]
+
+    # 同一MX上提前一并重试的时间窗口（秒）
+    BATCH_WINDOW = 60.0
+
+    # 认领后未完成（进程退出）的条目在该时间后可被重新认领
+    LEASE = 300.0
+
+    # 重新读取数据库（其他工作进程加入的条目）的间隔
+    RELOAD_INTERVAL = 60.0
+
+    # 后台重试出错后等待的秒数
+    ERROR_DELAY = 5.0
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS retries (
+        email TEXT NOT NULL,
+        level TEXT NOT NULL,
+        job_id TEXT NOT NULL,
+        mx_hosts TEXT NOT NULL,
+        timeout INTEGER NOT NULL,
+        check_catch_all INTEGER NOT NULL,
+        attempts INTEGER NOT NULL,
+        due_at REAL NOT NULL,
+        PRIMARY KEY (email, level, job_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_retries_due ON retries (due_at);
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.path = db_path or self.DB_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+        self._entries: dict[tuple[str, str, str], RetryEntry] = {}
+        # (到期时间, 键)；条目改期后旧的堆项在弹出时跳过
+        self._heap: list[tuple[float, tuple[str, str, str]]] = []
+        # 各MX当前的退避级别（DELAYS 的下标），仍在灰名单中时逐级增加
+        self._mx_backoff: dict[str, int] = {}
+        self._listeners: list[Callable[[str, EmailValidationResult], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loaded = False
+        # 数据库连接在多个线程中使用，读写串行进行
+        self._lock = threading.Lock()
+
+    def configure(self, path: str, enabled: bool = True) -> None:
+        """修改数据库位置（清空内存中的队列）"""
+        self.close()
+        self.path = path
+        self.ENABLED = enabled
+        self._entries.clear()
+        self._heap.clear()
+        self._mx_backoff.clear()
+        self._loaded = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """执行一条语句（阻塞，异步代码中通过 asyncio.to_thread 调用）"""
+        with self._lock:
+            return self._connect().execute(sql, params)
+
+    def add_listener(self, listener: Callable[[str, EmailValidationResult], Awaitable[None]]) -> None:
+        """注册批量任务结果更新回调，参数为 (任务ID, 新的验证结果)"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    async def schedule(
+        self,
+        email: str,
+        level: ValidationLevel,
+        mx_hosts: list[str],
+        timeout: int,
+        check_catch_all: bool = True
+    ) -> Optional[float]:
+        """
+        将收到临时错误的地址放入重试队列
+
+        Args:
+            email: 标准化后的邮箱地址
+            level: 验证级别
+            mx_hosts: MX服务器列表
+            timeout: 超时时间（秒）
+            check_catch_all: 重试时是否进行 catch-all 检测
+
+        Returns:
+            float: 计划的重试时间（Unix 时间戳），未启用或正在给出最终结论时返回 None
+        """
+        if not self.ENABLED or not self.DELAYS or not mx_hosts or _retrying.get():
+            return None
+        if not self._loaded:
+            await self._reload()
+
+        entry = RetryEntry(
+            email=email,
+            level=level,
+            job_id=current_job_id.get() or "",
+            mx_hosts=tuple(mx_hosts),
+            timeout=timeout,
+            check_catch_all=check_catch_all,
+            attempts=0,
+            due_at=0.0,
+        )
+        existing = self._entries.get(entry.key)
+        if existing is not None:
+            return existing.due_at
+
+        backoff = self._mx_backoff.get(entry.mx_key, 0)
+        entry.due_at = time.time() + self.DELAYS[min(backoff, len(self.DELAYS) - 1)]
+        try:
+            await asyncio.to_thread(
+                self._execute,
+                "INSERT OR IGNORE INTO retries (email, level, job_id, mx_hosts, timeout,"
+                " check_catch_all, attempts, due_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry.email, entry.level.value, entry.job_id, entry.mx_key, entry.timeout,
+                 int(entry.check_catch_all), entry.attempts, entry.due_at)
+            )
+        except sqlite3.Error:
+            return None
+        # 等待写入期间同一地址可能已被并发的验证加入
+        existing = self._entries.get(entry.key)
+        if existing is not None:
+            return existing.due_at
+        self._push(entry)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return entry.due_at
+
+    def pending_count(self, job_id: Optional[str] = None) -> int:
+        """等待重试的条目数，指定任务ID时只统计该任务"""
+        self._ensure_loaded()
+        if job_id is None:
+            return len(self._entries)
+        return sum(1 for entry in self._entries.values() if entry.job_id == job_id)
+
+    def stats(self) -> dict:
+        """重试队列统计信息"""
+        self._ensure_loaded()
+        due = [entry.due_at for entry in self._entries.values()]
+        return {
+            "enabled": self.ENABLED,
+            "pending": len(due),
+            "next_retry_at": min(due) if due else None,
+            "delays": list(self.DELAYS),
+            "backoff_mx_hosts": len(self._mx_backoff),
+        }
+
+    async def start(self) -> None:
+        """启动后台重试（恢复数据库中未完成的条目）"""
+        if self._task is None:
+            await self._reload()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self) -> None:
+        """停止后台重试；未完成的条目保留在数据库中，重启后继续"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    def _ensure_loaded(self) -> None:
+        """统计接口在后台任务启动前被调用时同步读取一次（启动后已在线程中读取）"""
+        if not self._loaded:
+            try:
+                self._merge(self._read_rows(), set(self._entries))
+            except sqlite3.Error:
+                pass
+
+    def _read_rows(self) -> list[tuple]:
+        """读取全部条目（阻塞）"""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT email, level, job_id, mx_hosts, timeout, check_catch_all, attempts, due_at"
+                " FROM retries"
+            ).fetchall()
+
+    async def _reload(self) -> None:
+        """在线程中读取数据库，合并其他工作进程加入或移除的条目"""
+        known = set(self._entries)
+        try:
+            rows = await asyncio.to_thread(self._read_rows)
+        except sqlite3.Error:
+            return
+        self._merge(rows, known)
+
+    def _merge(self, rows: list[tuple], known: set[tuple[str, str, str]]) -> None:
+        """
+        合并读取到的条目
+
+        读取期间本进程加入的条目不在 known 中，予以保留；内存中已有的条目保持不变，
+        其他进程改期或认领造成的到期时间不一致会在认领失败后于下次读取时纠正
+        """
+        keys = set()
+        for email, level, job_id, mx_hosts, timeout, check_catch_all, attempts, due_at in rows:
+            entry = RetryEntry(
+                email=email,
+                level=ValidationLevel(level),
+                job_id=job_id,
+                mx_hosts=tuple(mx_hosts.split(",")),
+                timeout=timeout,
+                check_catch_all=bool(check_catch_all),
+                attempts=attempts,
+                due_at=due_at,
+            )
+            keys.add(entry.key)
+            if entry.key not in self._entries:
+                self._push(entry)
+        # 已被其他进程完成的条目
+        for key in known - keys:
+            self._entries.pop(key, None)
+        self._loaded = True
+
+    def _push(self, entry: RetryEntry) -> None:
+        self._entries[entry.key] = entry
+        heapq.heappush(self._heap, (entry.due_at, entry.key))
+
+    def _next_due(self) -> Optional[float]:
+        """最早的到期时间，跳过已改期或已移除的堆项"""
+        while self._heap:
+            due_at, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry.due_at == due_at:
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run_loop(self) -> None:
+        """等待最早的条目到期后批量重试"""
+        next_reload = time.time() + self.RELOAD_INTERVAL
+        while True:
+            now = time.time()
+            try:
+                if now >= next_reload:
+                    await self._reload()
+                    next_reload = now + self.RELOAD_INTERVAL
+
+                due_at = self._next_due()
+                if due_at is not None and due_at <= now:
+                    await self.run_due(now)
+                    continue
+            except Exception:
+                # 出错不能结束后台任务，稍后继续
+                logger.exception("灰名单重试出错")
+                await asyncio.sleep(self.ERROR_DELAY)
+                continue
+
+            wait = next_reload - now
+            if due_at is not None:
+                wait = min(wait, due_at - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(wait, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """
+        重试所有已到期的条目（连同同一MX上 BATCH_WINDOW 内到期的条目）
+
+        Returns:
+            int: 本次重试的条目数
+        """
+        if not self._loaded:
+            await self._reload()
+        now = time.time() if now is None else now
+        due_mx = {entry.mx_key for entry in self._entries.values() if entry.due_at <= now}
+        batch = [
+            entry for entry in self._entries.values()
+            if entry.mx_key in due_mx and entry.due_at <= now + self.BATCH_WINDOW
+        ]
+        claimed = await self._claim(batch, now)
+
+        groups: dict[tuple[str, bool], list[RetryEntry]] = {}
+        for entry in claimed:
+            groups.setdefault((entry.mx_key, entry.check_catch_all), []).append(entry)
+        outcomes = await asyncio.gather(
+            *[self._retry_group(group) for group in groups.values()], return_exceptions=True
+        )
+        for (mx_key, _), outcome in zip(groups, outcomes):
+            # 出错的组保留在数据库中，租期过后重新认领
+            if isinstance(outcome, Exception):
+                logger.error("重试 %s 上的地址失败", mx_key, exc_info=outcome)
+        return len(claimed)
+
+    def _claim_rows(
+        self,
+        entries: list[tuple[tuple[str, str, str], float]],
+        lease_until: float
+    ) -> tuple[list[tuple[str, str, str]], list[tuple[str, str, str]]]:
+        """
+        以条件更新认领条目（阻塞）
+
+        中途出错时返回已处理的部分，其余条目仍然到期，下次再认领
+
+        Returns:
+            tuple: (认领成功的键, 已被其他进程认领或完成的键)
+
+        Raises:
+            sqlite3.Error: 一个条目都没有处理（如数据库被锁），由后台任务等待后重试
+        """
+        claimed, lost = [], []
+        try:
+            for key, due_at in entries:
+                cursor = self._execute(
+                    "UPDATE retries SET due_at = ?"
+                    " WHERE email = ? AND level = ? AND job_id = ? AND due_at = ?",
+                    (lease_until, *key, due_at)
+                )
+                (claimed if cursor.rowcount else lost).append(key)
+        except sqlite3.Error:
+            if not claimed and not lost:
+                raise
+            logger.exception("认领重试条目中途出错")
+        return claimed, lost
+
+    async def _claim(self, entries: list[RetryEntry], now: float) -> list[RetryEntry]:
+        """认领条目（到期时间延后一个租期），被其他进程认领的条目从内存中移除"""
+        lease_until = now + self.LEASE
+        claimed_keys, lost_keys = await asyncio.to_thread(
+            self._claim_rows, [(entry.key, entry.due_at) for entry in entries], lease_until
+        )
+        claimed_keys = set(claimed_keys)
+        for key in lost_keys:
+            self._entries.pop(key, None)
+        claimed = []
+        for entry in entries:
+            if entry.key in claimed_keys:
+                entry.due_at = lease_until
+                self._push(entry)
+                claimed.append(entry)
+        return claimed
+
+    async def _retry_group(self, entries: list[RetryEntry]) -> None:
+        """在同一会话中重试同一组MX上的条目"""
+        mx_key = entries[0].mx_key
+        emails = list(dict.fromkeys(entry.email for entry in entries))
+        try:
+            results = await SMTPValidator.validate_many(
+                emails,
+                list(entries[0].mx_hosts),
+                max(entry.timeout for entry in entries),
+                check_catch_all=entries[0].check_catch_all
+            )
+        except Exception as e:
+            results = {email: SMTPResult(error=f"重试失败: {e}") for email in emails}
+
+        greylisted = any(result.temporary_failure for result in results.values())
+        if greylisted:
+            backoff = self._mx_backoff[mx_key] = min(
+                self._mx_backoff.get(mx_key, 0) + 1, len(self.DELAYS) - 1
+            )
+        else:
+            self._mx_backoff.pop(mx_key, None)
+            backoff = 0
+
+        for entry in entries:
+            result = results.get(entry.email) or SMTPResult(error="所有MX服务器连接失败")
+            entry.attempts += 1
+            if result.temporary_failure and entry.attempts < len(self.DELAYS):
+                delay = self.DELAYS[max(entry.attempts, backoff)]
+                await self._reschedule(entry, time.time() + delay)
+                continue
+            try:
+                await self._finish(entry, result)
+            except Exception:
+                # 条目保留在数据库中（到期时间为认领时的租期），租期过后再次重试
+                entry.attempts -= 1
+                logger.exception("更新 %s 的重试结果失败", entry.email)
+                continue
+            await self._remove(entry)
+
+    async def _reschedule(self, entry: RetryEntry, due_at: float) -> None:
+        try:
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE retries SET attempts = ?, due_at = ?"
+                " WHERE email = ? AND level = ? AND job_id = ?",
+                (entry.attempts, due_at, *entry.key)
+            )
+        except sqlite3.Error:
+            pass
+        entry.due_at = due_at
+        self._push(entry)
+
+    async def _remove(self, entry: RetryEntry) -> None:
+        self._entries.pop(entry.key, None)
+        try:
+            await asyncio.to_thread(
+                self._execute,
+                "DELETE FROM retries WHERE email = ? AND level = ? AND job_id = ?", entry.key
+            )
+        except sqlite3.Error:
+            pass
+
+    async def _finish(self, entry: RetryEntry, smtp_result: SMTPResult) -> None:
+        """用重试得到的SMTP结果重新生成验证结果，更新结果缓存和任务结果"""
+        # 验证引擎在排队时依赖本模块，这里延迟导入
+        from app.core.validator import EmailValidator
+
+        request = EmailValidationRequest(email=entry.email, level=entry.level, timeout=entry.timeout)
+        token = _retrying.set(True)
+        try:
+            await asyncio.to_thread(ResultCache.delete, entry.email, entry.level)
+            result = await EmailValidator.validate(request, smtp_result=smtp_result)
+        finally:
+            _retrying.reset(token)
+
+        if entry.job_id:
+            for listener in self._listeners:
+                await listener(entry.job_id, result)
+
+
+# 进程内共享的重试调度器
+retry_scheduler = RetryScheduler()
@@ -3,10 +3,932 @@ SMTP验证器
 通过SMTP协议验证邮箱是否存在（不发送实际邮件）
 """
 import asyncio
-from typing import Optional
+import ipaddress
+import math
+import socket
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Iterable, Optional
 import aiosmtplib
-from aiosmtplib import SMTP, SMTPException
+from aiosmtplib import SMTP, SMTPException, SMTPResponse
 from app.models.schemas import SMTPResult
+from app.core.cache import SingleFlight, TTLCache
+from app.core.metrics import SMTP_REPLIES, record_stage, stage
+from app.core.ratelimit import RateLimiter
+
+
+@dataclass
+class PooledConnection:
+    """连接池中的一条SMTP连接"""
+    smtp: SMTP
+    # 实际连通的端口（主端口不通时可能是备用端口），决定连接归还到哪个空闲列表
+    port: Optional[int] = None
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    # 最近一次确认连接存活（建立连接或 NOOP 成功）的时间
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+class PoolExhausted(Exception):
+    """在截止时间前没有等到连接池的空闲名额或新建连接的限速令牌"""
+
+
+class DeadlineExceeded(Exception):
+    """验证的总时间预算已用完"""
+
+
+class SubmissionRefused(Exception):
+    """备用（提交）端口要求认证或拒绝中继，不能据此判断邮箱是否存在"""
+
+
+class LatencyProfile:
+    """单个MX主机某类操作的延迟画像：指数加权平均和最近样本窗口"""
+
+    ALPHA = 0.2
+    WINDOW = 50
+
+    def __init__(self):
+        self.ewma: Optional[float] = None
+        self.samples: deque[float] = deque(maxlen=self.WINDOW)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma = self.ALPHA * seconds + (1 - self.ALPHA) * self.ewma
+
+    def percentile(self, pct: float) -> float:
+        """最近样本的百分位数（最近秩法）"""
+        ordered = sorted(self.samples)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+class MXLatencyTracker:
+    """
+    按MX主机记录连接和命令延迟，推导自适应超时
+
+    超时取 max(EWMA x EWMA_MULTIPLIER, p95 x P95_MULTIPLIER, MIN_TIMEOUT)，
+    并且不超过调用方给出的上限；样本不足 MIN_SAMPLES 时直接使用上限。
+    超时的操作以所用的超时时间作为样本记录，使持续变慢的主机逐步获得更长的时间。
+    """
+
+    CONNECT = "connect"
+    COMMAND = "command"
+
+    MIN_SAMPLES = 3
+    EWMA_MULTIPLIER = 3.0
+    P95_MULTIPLIER = 1.5
+    MIN_TIMEOUT = 1.0
+    MAX_HOSTS = 10000
+
+    def __init__(self, min_timeout: float = MIN_TIMEOUT):
+        self.min_timeout = min_timeout
+        self._profiles: OrderedDict[str, dict[str, LatencyProfile]] = OrderedDict()
+
+    def observe(self, host: str, kind: str, seconds: float) -> None:
+        """记录一次操作耗时"""
+        profiles = self._profiles.get(host)
+        if profiles is None:
+            profiles = self._profiles[host] = {
+                self.CONNECT: LatencyProfile(),
+                self.COMMAND: LatencyProfile(),
+            }
+            if len(self._profiles) > self.MAX_HOSTS:
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(host)
+        profiles[kind].observe(seconds)
+
+    def has_profile(self, host: str) -> bool:
+        """是否已有足够的样本推导超时"""
+        profiles = self._profiles.get(host)
+        return profiles is not None and any(
+            len(profile.samples) >= self.MIN_SAMPLES for profile in profiles.values()
+        )
+
+    def timeout(self, host: str, kind: str, cap: float) -> float:
+        """
+        计算某类操作的超时时间
+
+        Args:
+            host: MX主机
+            kind: CONNECT 或 COMMAND
+            cap: 超时上限（秒）
+
+        Returns:
+            float: 超时时间（秒）
+        """
+        profiles = self._profiles.get(host)
+        profile = profiles[kind] if profiles else None
+        if profile is None or len(profile.samples) < self.MIN_SAMPLES:
+            return cap
+        adaptive = max(
+            profile.ewma * self.EWMA_MULTIPLIER,
+            profile.percentile(95) * self.P95_MULTIPLIER,
+            self.min_timeout
+        )
+        return min(adaptive, cap)
+
+    def stats(self, host: str) -> Optional[dict]:
+        """单个主机的延迟统计（毫秒）"""
+        profiles = self._profiles.get(host)
+        if profiles is None:
+            return None
+        stats = {"host": host}
+        for kind, profile in profiles.items():
+            stats[f"{kind}_samples"] = len(profile.samples)
+            stats[f"{kind}_ewma_ms"] = (
+                round(profile.ewma * 1000, 3) if profile.ewma is not None else None
+            )
+            stats[f"{kind}_p95_ms"] = (
+                round(profile.percentile(95) * 1000, 3) if profile.samples else None
+            )
+        return stats
+
+    def clear(self) -> None:
+        self._profiles.clear()
+
+
+@dataclass
+class HostBreaker:
+    """单个MX主机的熔断状态"""
+    state: str = "closed"
+    consecutive_failures: int = 0
+    total_failures: int = 0
+    opened_at: Optional[float] = None
+    probing: bool = False
+    last_error: Optional[str] = None
+
+
+class MXCircuitBreaker:
+    """
+    按MX主机的熔断器
+
+    - closed: 正常连接；连续 FAILURE_THRESHOLD 次连接失败或超时后转为 open
+      （只统计建立连接阶段的失败，连接成功后的命令超时或断开不计入）
+    - open: COOL_DOWN 秒内不再连接，直接返回不可达
+    - half_open: 冷却结束后只放行一次探测连接，成功则恢复 closed，失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    FAILURE_THRESHOLD = 3
+    COOL_DOWN = 60.0
+    MAX_HOSTS = 10000
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        cool_down: float = COOL_DOWN,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self._timer = timer
+        self._hosts: OrderedDict[str, HostBreaker] = OrderedDict()
+
+    def _get(self, host: str) -> HostBreaker:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostBreaker()
+            # 超出上限时丢弃最久未访问的主机
+            if len(self._hosts) > self.MAX_HOSTS:
+                self._hosts.popitem(last=False)
+        else:
+            self._hosts.move_to_end(host)
+        return state
+
+    def allow(self, host: str) -> bool:
+        """是否允许连接该主机；half_open 状态下只放行一个探测"""
+        state = self._hosts.get(host)
+        if state is None or state.state == self.CLOSED:
+            return True
+        if state.state == self.OPEN:
+            if self._timer() - state.opened_at < self.cool_down:
+                return False
+            state.state = self.HALF_OPEN
+            state.probing = False
+        if state.probing:
+            return False
+        state.probing = True
+        return True
+
+    def record_success(self, host: str) -> None:
+        """连接成功：恢复 closed"""
+        state = self._hosts.get(host)
+        if state is None:
+            return
+        state.state = self.CLOSED
+        state.consecutive_failures = 0
+        state.opened_at = None
+        state.probing = False
+
+    def record_failure(self, host: str, error: Optional[str] = None) -> None:
+        """连接失败或超时：达到阈值或探测失败时 open"""
+        state = self._get(host)
+        state.consecutive_failures += 1
+        state.total_failures += 1
+        state.last_error = error
+        state.probing = False
+        if state.state == self.HALF_OPEN or state.consecutive_failures >= self.failure_threshold:
+            state.state = self.OPEN
+            state.opened_at = self._timer()
+
+    def release(self, host: str) -> None:
+        """探测以无法判断的结果结束时释放探测名额"""
+        state = self._hosts.get(host)
+        if state is not None:
+            state.probing = False
+
+    def state(self, host: str) -> str:
+        state = self._hosts.get(host)
+        return state.state if state else self.CLOSED
+
+    def reset(self, host: Optional[str] = None) -> bool:
+        """重置指定主机（或全部主机）的熔断状态，返回是否存在该主机的记录"""
+        if host is None:
+            self._hosts.clear()
+            return True
+        return self._hosts.pop(host, None) is not None
+
+    def stats(self) -> dict:
+        """熔断器统计信息：只列出存在失败记录的主机"""
+        now = self._timer()
+        hosts = []
+        for host, state in self._hosts.items():
+            if state.state == self.CLOSED and state.consecutive_failures == 0:
+                continue
+            retry_in = None
+            if state.state == self.OPEN:
+                retry_in = round(max(0.0, self.cool_down - (now - state.opened_at)), 3)
+            hosts.append({
+                "host": host,
+                "state": state.state,
+                "consecutive_failures": state.consecutive_failures,
+                "total_failures": state.total_failures,
+                "retry_in": retry_in,
+                "last_error": state.last_error,
+            })
+        return {
+            "failure_threshold": self.failure_threshold,
+            "cool_down": self.cool_down,
+            "open": sum(1 for h in hosts if h["state"] == self.OPEN),
+            "half_open": sum(1 for h in hosts if h["state"] == self.HALF_OPEN),
+            "hosts": hosts,
+        }
+
+
+@dataclass
+class MXFacts:
+    """单个MX主机的连接特征"""
+    reachable: bool = False
+    banner: Optional[str] = None              # 欢迎语
+    esmtp: bool = False                       # 是否支持 EHLO
+    starttls: Optional[bool] = None           # 是否支持 STARTTLS，未知为 None
+    extensions: list[str] = field(default_factory=list)
+    # 最近一次连通的路径，之后的连接优先使用
+    port: Optional[int] = None
+    address: Optional[str] = None
+    family: Optional[str] = None              # ipv4 / ipv6
+    learned_at: float = 0.0
+    last_error: Optional[str] = None
+
+
+class MXFactsRegistry:
+    """
+    按MX主机记录的连接特征：可达性、欢迎语、ESMTP扩展（是否支持 STARTTLS）
+
+    大量域名共享同一组MX主机，这些特征只在新建连接时记录，
+    同一MX上所有域名的地址直接使用，TTL 内不重复获取
+    """
+
+    TTL = 3600.0
+    MAX_HOSTS = 10000
+
+    def __init__(self, ttl: float = TTL, timer: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self._timer = timer
+        self._hosts: OrderedDict[str, MXFacts] = OrderedDict()
+
+    def _store(self, host: str, facts: MXFacts) -> None:
+        self._hosts[host] = facts
+        self._hosts.move_to_end(host)
+        # 超出上限时丢弃最久未更新的主机
+        if len(self._hosts) > self.MAX_HOSTS:
+            self._hosts.popitem(last=False)
+
+    def record_connection(
+        self,
+        host: str,
+        banner: Optional[str],
+        smtp: SMTP,
+        path: Optional["ConnectPath"] = None
+    ) -> MXFacts:
+        """新建连接并完成 EHLO 后记录该主机的特征和连通的路径"""
+        extensions = sorted(smtp.esmtp_extensions)
+        # 连接时已自动升级为TLS的会话，EHLO 响应中不再列出 STARTTLS
+        upgraded = smtp.get_transport_info("sslcontext") is not None
+        facts = MXFacts(
+            reachable=True,
+            banner=banner,
+            esmtp=bool(extensions) or upgraded,
+            starttls=upgraded or "starttls" in extensions,
+            extensions=extensions,
+            port=path.port if path else None,
+            address=path.address if path else None,
+            family=path.family_name if path else None,
+            learned_at=self._timer(),
+        )
+        self._store(host, facts)
+        return facts
+
+    def record_failure(self, host: str, error: str) -> None:
+        """连接失败时记录不可达，保留此前得到的其他特征（连通路径作废）"""
+        previous = self._hosts.get(host)
+        facts = MXFacts(
+            banner=previous.banner if previous else None,
+            esmtp=previous.esmtp if previous else False,
+            starttls=previous.starttls if previous else None,
+            extensions=previous.extensions if previous else [],
+            learned_at=self._timer(),
+            last_error=error,
+        )
+        self._store(host, facts)
+
+    def get(self, host: str) -> Optional[MXFacts]:
+        """查询主机特征，未记录或已过期时返回 None"""
+        facts = self._hosts.get(host)
+        if facts is None or self._timer() - facts.learned_at > self.ttl:
+            return None
+        return facts
+
+    def clear(self) -> None:
+        self._hosts.clear()
+
+    def stats(self) -> dict:
+        """未过期的主机特征"""
+        now = self._timer()
+        hosts = [
+            {"host": host, **facts.__dict__}
+            for host, facts in self._hosts.items()
+            if now - facts.learned_at <= self.ttl
+        ]
+        return {
+            "ttl": self.ttl,
+            "reachable": sum(1 for h in hosts if h["reachable"]),
+            "unreachable": sum(1 for h in hosts if not h["reachable"]),
+            "hosts": hosts,
+        }
+
+
+@dataclass(frozen=True)
+class ConnectPath:
+    """一条候选的连接路径：地址族、IP地址和端口"""
+    family: int
+    address: str
+    port: int
+
+    @property
+    def family_name(self) -> str:
+        return "ipv6" if self.family == socket.AF_INET6 else "ipv4"
+
+
+class MXConnector:
+    """
+    MX连接策略：按端口依次尝试，同一端口上在地址族之间竞速（Happy Eyeballs，RFC 8305）
+
+    先在主端口上对MX主机的全部地址（IPv6/IPv4 交替排列）每隔 ATTEMPT_DELAY 秒启动一个
+    TCP连接尝试，某个尝试失败时立即启动下一个，第一个连通的路径胜出并取消其余尝试；
+    主端口的全部地址都失败或超时后才尝试备用端口，主端口可用时不会连接备用端口
+    """
+
+    ATTEMPT_DELAY = 0.25
+
+    # 直接使用TLS的端口（SMTPS），其余端口为明文（可由 STARTTLS 升级）
+    IMPLICIT_TLS_PORTS = frozenset({465})
+
+    def __init__(self, attempt_delay: float = ATTEMPT_DELAY):
+        self.attempt_delay = attempt_delay
+        self.attempts = 0
+
+    async def resolve(self, host: str) -> list[tuple[int, str]]:
+        """解析主机地址，返回 IPv6/IPv4 交替排列的 (地址族, IP)"""
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, None, type=socket.SOCK_STREAM
+        )
+        return self.interleave(
+            sockaddr[0] for family, _, _, _, sockaddr in infos
+            if family in (socket.AF_INET, socket.AF_INET6)
+        )
+
+    @staticmethod
+    def interleave(addresses: Iterable[str]) -> list[tuple[int, str]]:
+        """
+        按地址族交替排列IP地址（去重）
+
+        第一个地址族沿用输入的优先顺序，之后 IPv6/IPv4 交替；无效的地址被忽略
+        """
+        by_family: dict[int, list[str]] = {}
+        for address in addresses:
+            try:
+                version = ipaddress.ip_address(address).version
+            except ValueError:
+                continue
+            family = socket.AF_INET6 if version == 6 else socket.AF_INET
+            same_family = by_family.setdefault(family, [])
+            if address not in same_family:
+                same_family.append(address)
+        ordered = []
+        for i in range(max((len(same_family) for same_family in by_family.values()), default=0)):
+            for family, same_family in by_family.items():
+                if i < len(same_family):
+                    ordered.append((family, same_family[i]))
+        return ordered
+
+    def plan(
+        self,
+        addresses: list[tuple[int, str]],
+        ports: list[int],
+        preferred: Optional[MXFacts] = None
+    ) -> list[list[ConnectPath]]:
+        """
+        排列连接轮次：每个端口一轮，轮内覆盖该端口上的全部地址
+
+        端口总是主端口在前，备用端口只在前面的端口都失败后才尝试；上次连通的地址族排在各轮前面。
+        上次在主端口上连通的路径单独作为第一轮，正常工作时不会产生额外的连接
+
+        Args:
+            addresses: 交替排列的 (地址族, IP)
+            ports: 主端口在前的端口列表
+            preferred: 该主机已记录的特征
+
+        Returns:
+            list[list[ConnectPath]]: 依次尝试的各轮候选路径
+        """
+        if not addresses:
+            return []
+        ports = list(dict.fromkeys(ports))
+        if preferred is not None and preferred.family is not None:
+            addresses = sorted(
+                addresses,
+                key=lambda item: ConnectPath(item[0], item[1], 0).family_name != preferred.family
+            )
+        rounds = [
+            [ConnectPath(family, address, port) for family, address in addresses]
+            for port in ports
+        ]
+        if preferred is not None and preferred.port == ports[0]:
+            known = [path for path in rounds[0] if path.address == preferred.address]
+            if known:
+                rounds[0].remove(known[0])
+                rounds = [known] + [paths for paths in rounds if paths]
+        return rounds
+
+    async def connect(
+        self,
+        host: str,
+        ports: list[int],
+        preferred: Optional[MXFacts] = None,
+        addresses: Optional[list[str]] = None,
+        round_timeout: Optional[float] = None
+    ) -> tuple[socket.socket, ConnectPath]:
+        """
+        建立到MX主机的TCP连接
+
+        Args:
+            host: MX主机
+            ports: 主端口在前的端口列表
+            preferred: 该主机已记录的特征
+            addresses: 预先解析的IP地址（来自DNS缓存），为空时解析主机名
+            round_timeout: 除最后一轮外每轮的超时时间（秒），超时后转到下一轮；
+                为空时只有连接失败才转到下一轮
+
+        Returns:
+            tuple[socket.socket, ConnectPath]: 已连通的套接字和胜出的路径
+
+        Raises:
+            OSError: 主机无法解析或所有路径都无法连通
+        """
+        resolved = self.interleave(addresses) if addresses else []
+        if not resolved:
+            resolved = await self.resolve(host)
+        rounds = self.plan(resolved, ports, preferred)
+        if not rounds:
+            raise OSError(f"无法解析 {host} 的地址")
+        last_error: Optional[BaseException] = None
+        for i, paths in enumerate(rounds):
+            try:
+                if round_timeout is not None and i < len(rounds) - 1:
+                    return await asyncio.wait_for(self._race(paths), timeout=round_timeout)
+                return await self._race(paths)
+            except (OSError, asyncio.TimeoutError) as e:
+                last_error = e
+        raise OSError(f"所有路径都无法连接: {last_error}")
+
+    async def _race(self, paths: list[ConnectPath]) -> tuple[socket.socket, ConnectPath]:
+        attempts: set[asyncio.Task] = set()
+        winner: Optional[tuple[socket.socket, ConnectPath]] = None
+        last_error: Optional[BaseException] = None
+        next_path = 0
+        try:
+            while winner is None and (next_path < len(paths) or attempts):
+                if next_path < len(paths):
+                    attempts.add(asyncio.create_task(self._open(paths[next_path])))
+                    next_path += 1
+                wait = self.attempt_delay if next_path < len(paths) else None
+                done, attempts = await asyncio.wait(
+                    attempts, timeout=wait, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        task.result()[0].close()
+        finally:
+            for task in attempts:
+                task.cancel()
+            for outcome in await asyncio.gather(*attempts, return_exceptions=True):
+                # 取消前已经连通的落选连接直接关闭
+                if isinstance(outcome, tuple):
+                    outcome[0].close()
+
+        if winner is None:
+            raise OSError(f"所有路径都无法连接: {last_error}")
+        return winner
+
+    async def _open(self, path: ConnectPath) -> tuple[socket.socket, ConnectPath]:
+        """尝试一条路径的TCP连接"""
+        self.attempts += 1
+        sock = socket.socket(path.family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (path.address, path.port))
+        except BaseException:
+            sock.close()
+            raise
+        return sock, path
+
+
+class SMTPConnectionPool:
+    """
+    按MX主机划分的SMTP连接池
+
+    - 每个主机、全局分别限制同时使用的连接数，超出时等待而不是新建连接
+    - 归还的连接执行 RSET 后保留为空闲连接，供后续请求复用
+    - 后台任务每隔 KEEPALIVE_INTERVAL 向空闲连接发送 NOOP 保活（start/stop），
+      超过该间隔未确认存活的连接复用前也先发送 NOOP
+    - 等待连接名额不超过调用方的截止时间，超时抛出 PoolExhausted
+    - 空闲超过 IDLE_TIMEOUT 的连接被关闭淘汰
+    - 记录每个主机的连接和命令延迟（latency），用于推导自适应超时
+    - 新建连接前按MX主机和提供商分组限速（rate_limiter），令牌不足时等待
+    - 新建连接时在 IPv4/IPv6 地址之间竞速，主端口不通时才尝试备用端口（connector），
+      记录主机的可达性、欢迎语、ESMTP扩展和连通的路径（facts），之后的连接优先走该路径
+    - 新建连接的任何一步失败或被取消都关闭套接字
+    """
+
+    MAX_CONNECTIONS_PER_HOST = 3
+    MAX_CONNECTIONS_TOTAL = 50
+    MAX_IDLE_TOTAL = 100
+    IDLE_TIMEOUT = 30.0
+    KEEPALIVE_INTERVAL = 10.0
+
+    def __init__(
+        self,
+        max_per_host: int = MAX_CONNECTIONS_PER_HOST,
+        max_total: int = MAX_CONNECTIONS_TOTAL,
+        max_idle: int = MAX_IDLE_TOTAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        keepalive_interval: float = KEEPALIVE_INTERVAL,
+        rate_limiter: Optional[RateLimiter] = None,
+        connector: Optional[MXConnector] = None
+    ):
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle: dict[tuple[str, int], list[PooledConnection]] = {}
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+        self._global_limit: Optional[asyncio.Semaphore] = None
+        self._in_use = 0
+        self._keepalive: Optional[asyncio.Task] = None
+
+        self.latency = MXLatencyTracker()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.facts = MXFactsRegistry()
+        self.connector = connector or MXConnector()
+
+        self.opened = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def _ensure_loop(self) -> None:
+        """连接和信号量绑定在事件循环上，循环变化时重置池状态"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        for connections in self._idle.values():
+            for conn in connections:
+                conn.smtp.close()
+        self._loop = loop
+        self._idle = {}
+        self._host_limits = {}
+        self._global_limit = asyncio.Semaphore(self.max_total)
+        self._in_use = 0
+
+    @asynccontextmanager
+    async def connection(
+        self,
+        host: str,
+        port: int,
+        timeout: float,
+        connect_timeout: Optional[float] = None,
+        backup_ports: tuple[int, ...] = (),
+        addresses: Optional[list[str]] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[SMTP]:
+        """
+        借出一条已完成 EHLO 的连接
+
+        正常退出时连接按实际连通的端口归还到池中；发生异常时连接被关闭丢弃。
+        空闲连接先取 port 上的，给出 backup_ports 时也复用备用端口上的连接。
+
+        Args:
+            host: MX主机
+            port: 端口
+            timeout: 单条命令的超时时间（秒）
+            connect_timeout: 建立连接的超时时间（秒），默认与 timeout 相同
+            backup_ports: port 不通时依次尝试的备用端口
+            addresses: 预先解析的主机IP地址，新建连接时直接使用，为空时解析主机名
+            deadline: 取得连接名额的截止时间（time.monotonic()），默认为 connect_timeout 之后
+
+        Raises:
+            PoolExhausted: 截止时间前没有等到主机或全局的连接名额
+        """
+        self._ensure_loop()
+        if deadline is None:
+            deadline = time.monotonic() + (connect_timeout or timeout)
+        key = (host, port)
+        host_limit = self._host_limits.get(host)
+        if host_limit is None:
+            host_limit = self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+
+        # 先取主机配额再取全局配额，避免等待单个主机时占用全局名额；
+        # 需要新建连接时在取全局配额之前等待限速令牌
+        waiting_since = time.perf_counter()
+        await self._acquire(host_limit, deadline, host)
+        try:
+            throttled = 0.0
+            if not any(self._idle.get(k) for k in self._idle_keys(key, backup_ports)):
+                try:
+                    throttled = await self.rate_limiter.acquire(
+                        RateLimiter.CONNECT, host, timeout=deadline - time.monotonic()
+                    )
+                except asyncio.TimeoutError:
+                    raise PoolExhausted(f"等待 {host} 的连接限速令牌超时") from None
+            global_limit = self._global_limit
+            await self._acquire(global_limit, deadline, host)
+            try:
+                record_stage("smtp_pool_wait", time.perf_counter() - waiting_since - throttled)
+                with stage("smtp_connect"):
+                    conn = await self._checkout(
+                        key, timeout, connect_timeout or timeout, backup_ports, addresses
+                    )
+                self._in_use += 1
+                healthy = False
+                try:
+                    yield conn.smtp
+                    healthy = True
+                finally:
+                    self._in_use -= 1
+                    if healthy:
+                        await self._checkin((host, conn.port or port), conn)
+                    else:
+                        conn.smtp.close()
+            finally:
+                global_limit.release()
+        finally:
+            host_limit.release()
+
+    @staticmethod
+    async def _acquire(limit: asyncio.Semaphore, deadline: float, host: str) -> None:
+        """在截止时间前取得一个连接名额"""
+        try:
+            await asyncio.wait_for(limit.acquire(), timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise PoolExhausted(f"等待 {host} 的连接名额超时") from None
+
+    @staticmethod
+    def _idle_keys(key: tuple[str, int], backup_ports: tuple[int, ...] = ()) -> list[tuple[str, int]]:
+        """可以复用的空闲列表：主端口在前，其后是允许的备用端口"""
+        host, port = key
+        return [(host, p) for p in dict.fromkeys((port, *backup_ports))]
+
+    async def _checkout(
+        self,
+        key: tuple[str, int],
+        timeout: float,
+        connect_timeout: float,
+        backup_ports: tuple[int, ...] = (),
+        addresses: Optional[list[str]] = None
+    ) -> PooledConnection:
+        """取出可用的空闲连接，没有则新建"""
+        self._evict_expired()
+        for idle_key in self._idle_keys(key, backup_ports):
+            idle = self._idle.get(idle_key, [])
+            while idle:
+                conn = idle.pop()
+                if not conn.smtp.is_connected:
+                    continue
+                conn.smtp.timeout = timeout
+                if time.monotonic() - conn.checked_at > self.keepalive_interval:
+                    if not await self._ping(conn):
+                        continue
+                self.reused += 1
+                return conn
+
+        host, port = key
+        started = time.perf_counter()
+        sock: Optional[socket.socket] = None
+        smtp: Optional[SMTP] = None
+        try:
+            try:
+                # 主端口（或上次连通的路径）在分得的时间内没有连通时才尝试备用端口
+                ports = [port, *backup_ports]
+                sock, path = await asyncio.wait_for(
+                    self.connector.connect(
+                        host, ports, self.facts.get(host), addresses,
+                        round_timeout=connect_timeout / len(ports) if backup_ports else None
+                    ),
+                    timeout=connect_timeout
+                )
+                smtp = SMTP(
+                    hostname=host, sock=sock, timeout=timeout,
+                    use_tls=path.port in MXConnector.IMPLICIT_TLS_PORTS
+                )
+                # TCP连接之后的欢迎语（和自动 STARTTLS）共用剩余的连接超时
+                greeting = await smtp.connect(
+                    timeout=max(connect_timeout - (time.perf_counter() - started), 0.001)
+                )
+            except asyncio.TimeoutError:
+                self.latency.observe(host, MXLatencyTracker.CONNECT, connect_timeout)
+                self.facts.record_failure(host, "连接超时")
+                raise
+            except (OSError, SMTPException) as e:
+                self.facts.record_failure(host, str(e))
+                # 与直接连接时一致，所有路径都无法连通视为连接错误
+                if not isinstance(e, SMTPException):
+                    raise aiosmtplib.SMTPConnectError(f"Error connecting to {host}: {e}") from e
+                raise
+            self.latency.observe(host, MXLatencyTracker.CONNECT, time.perf_counter() - started)
+            smtp.timeout = timeout
+            # 发送 EHLO (aiosmtplib自动使用本机hostname)
+            if smtp.is_ehlo_or_helo_needed:
+                await smtp.ehlo()
+        except BaseException:
+            # 任何失败（包括竞速或对冲落败时的取消）都关闭已建立的连接，避免泄漏套接字
+            if smtp is not None:
+                smtp.close()
+            if sock is not None:
+                sock.close()
+            raise
+        self.facts.record_connection(host, greeting.message, smtp, path)
+        self.opened += 1
+        return PooledConnection(smtp=smtp, port=path.port)
+
+    async def _checkin(self, key: tuple[str, int], conn: PooledConnection) -> None:
+        """归还连接：RSET 重置事务状态后放回空闲列表"""
+        try:
+            if not conn.smtp.is_connected:
+                return
+            response = await conn.smtp.execute_command(b"RSET")
+            if response.code != 250:
+                raise SMTPException(response.message)
+        except Exception:
+            conn.smtp.close()
+            return
+
+        conn.last_used = conn.checked_at = time.monotonic()
+        self._idle.setdefault(key, []).append(conn)
+
+        # 超出全局空闲上限时关闭最久未用的连接
+        if self.idle_count() > self.max_idle:
+            oldest_key = min(
+                (k for k, conns in self._idle.items() if conns),
+                key=lambda k: self._idle[k][0].last_used
+            )
+            self._idle[oldest_key].pop(0).smtp.close()
+            self.evicted += 1
+
+    async def _ping(self, conn: PooledConnection) -> bool:
+        """发送 NOOP 确认连接存活，失败时关闭连接"""
+        try:
+            response = await conn.smtp.noop()
+            if response.code != 250:
+                raise SMTPException(response.message)
+        except Exception:
+            conn.smtp.close()
+            self.evicted += 1
+            return False
+        conn.checked_at = time.monotonic()
+        return True
+
+    async def keepalive(self) -> int:
+        """
+        淘汰空闲超时的连接，并向超过 KEEPALIVE_INTERVAL 未确认存活的空闲连接发送 NOOP
+
+        保活期间连接从空闲列表中取出，不会同时被借出；不更新 last_used，
+        长时间没有使用的连接仍在 IDLE_TIMEOUT 后淘汰
+
+        Returns:
+            int: 保活成功的连接数
+        """
+        self._evict_expired()
+        now = time.monotonic()
+        stale = []
+        for key, connections in self._idle.items():
+            for conn in [c for c in connections if now - c.checked_at > self.keepalive_interval]:
+                connections.remove(conn)
+                stale.append((key, conn))
+        alive = await asyncio.gather(*[self._ping(conn) for _, conn in stale])
+        for (key, conn), ok in zip(stale, alive):
+            if ok:
+                self._idle.setdefault(key, []).append(conn)
+        # 保活的连接放回后按 last_used 排序，淘汰时仍优先关闭最久未用的连接
+        for connections in self._idle.values():
+            connections.sort(key=lambda c: c.last_used)
+        return sum(alive)
+
+    async def start(self) -> None:
+        """启动后台保活任务"""
+        self._ensure_loop()
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.create_task(self._keepalive_loop())
+
+    async def stop(self) -> None:
+        """停止后台保活任务"""
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            await asyncio.gather(self._keepalive, return_exceptions=True)
+            self._keepalive = None
+
+    async def _keepalive_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            await self.keepalive()
+
+    def _evict_expired(self) -> None:
+        """关闭空闲超时的连接"""
+        deadline = time.monotonic() - self.idle_timeout
+        for key, connections in list(self._idle.items()):
+            alive = []
+            for conn in connections:
+                if conn.last_used < deadline or not conn.smtp.is_connected:
+                    conn.smtp.close()
+                    self.evicted += 1
+                else:
+                    alive.append(conn)
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+
+    def idle_count(self) -> int:
+        """空闲连接总数"""
+        return sum(len(connections) for connections in self._idle.values())
+
+    async def close_all(self) -> None:
+        """关闭所有空闲连接（服务停止时调用）"""
+        for connections in self._idle.values():
+            for conn in connections:
+                try:
+                    await asyncio.wait_for(conn.smtp.quit(), timeout=2)
+                except Exception:
+                    conn.smtp.close()
+        self._idle = {}
+
+    def stats(self) -> dict:
+        """连接池统计信息"""
+        return {
+            "in_use": self._in_use,
+            "idle": self.idle_count(),
+            "hosts": len({host for host, _ in self._idle}),
+            "opened": self.opened,
+            "reused": self.reused,
+            "evicted": self.evicted,
+            "max_per_host": self.max_per_host,
+            "max_total": self.max_total,
+        }
 
 
 class SMTPValidator:
@@ -15,6 +937,7 @@ class SMTPValidator:
     # 默认配置
     DEFAULT_TIMEOUT = 10
     DEFAULT_PORT = 25
+    # 出站25端口被封锁时的备用端口，DEFAULT_PORT 连接失败或超时后依次尝试（465 使用 SMTPS）
     BACKUP_PORTS = [587, 465]
 
     # 用于验证的发件人地址
@@ -23,12 +946,37 @@ class SMTPValidator:
     # Catch-all 检测用的随机地址
     CATCH_ALL_TEST_USER = "nonexistent_user_test_12345678"
 
+    # 时间预算用完时未得到结论的地址的错误信息
+    TIMEOUT_ERROR = "SMTP验证超时"
+
+    # 单个SMTP会话内最多验证的收件人数
+    MAX_RECIPIENTS_PER_SESSION = 20
+
+    # 对冲探测：优先级最高的MX在 HEDGE_DELAY 秒内没有连上时，并行尝试下一个MX
+    HEDGED_PROBING = True
+    HEDGE_DELAY = 1.0
+
+    # catch-all 结论按 (MX主机, 域名) 缓存，窗口期内每个域名只探测一次
+    CATCH_ALL_TTL = 3600
+    _catch_all_cache = TTLCache(maxsize=10000, default_ttl=CATCH_ALL_TTL, name="catch_all")
+
+    # 同一域名的并发 catch-all 检测合并为一次探测
+    _catch_all_flight = SingleFlight(name="catch_all")
+
+    # 进程内共享的SMTP连接池
+    _pool = SMTPConnectionPool()
+
+    # 连续连接失败的MX主机暂时熔断，冷却期内直接返回不可达
+    _breaker = MXCircuitBreaker()
+
     @classmethod
     async def validate(
         cls,
         email: str,
         mx_hosts: list[str],
-        timeout: int = DEFAULT_TIMEOUT
+        timeout: int = DEFAULT_TIMEOUT,
+        check_catch_all: bool = True,
+        mx_addresses: Optional[dict[str, list[str]]] = None
     ) -> SMTPResult:
         """
         通过SMTP验证邮箱是否存在
@@ -44,32 +992,237 @@ class SMTPValidator:
             email: 待验证的邮箱地址
             mx_hosts: MX服务器列表
             timeout: 超时时间（秒）
+            check_catch_all: 收件人被接受时是否进行 catch-all 检测
+            mx_addresses: 预先解析的MX主机地址（DNSResult.mx_addresses），
+                有地址的MX直接连接这些IP，不再解析主机名
 
         Returns:
             SMTPResult: SMTP验证结果
         """
-        result = SMTPResult()
+        results = await cls.validate_many(
+            [email], mx_hosts, timeout, check_catch_all=check_catch_all,
+            mx_addresses=mx_addresses
+        )
+        return results[email]
+
+    @classmethod
+    async def validate_many(
+        cls,
+        emails: list[str],
+        mx_hosts: list[str],
+        timeout: int = DEFAULT_TIMEOUT,
+        max_recipients_per_session: Optional[int] = None,
+        hedged: Optional[bool] = None,
+        check_catch_all: bool = True,
+        mx_addresses: Optional[dict[str, list[str]]] = None
+    ) -> dict[str, SMTPResult]:
+        """
+        在复用的SMTP会话中批量验证同一组MX上的多个邮箱
+
+        每个会话依次发送多条 RCPT TO，超过单会话收件人上限时开启新会话；
+        某个MX无法连接时，未完成的地址转到下一个MX继续验证。
+        timeout 是所有MX共享的总时间预算，每个MX的连接和命令超时根据其历史延迟推导。
+
+        Args:
+            emails: 待验证的邮箱地址列表（应共享同一组MX）
+            mx_hosts: MX服务器列表
+            timeout: 超时时间（秒）
+            max_recipients_per_session: 单个会话最多验证的收件人数
+            hedged: 是否对冲探测多个MX，默认使用 HEDGED_PROBING
+            check_catch_all: 收件人被接受时是否进行 catch-all 检测
+            mx_addresses: 预先解析的MX主机地址，有地址的MX直接连接这些IP
+
+        Returns:
+            dict[str, SMTPResult]: 邮箱地址到验证结果的映射
+        """
+        pending = list(dict.fromkeys(emails))
+        results: dict[str, SMTPResult] = {}
 
         if not mx_hosts:
-            result.error = "没有可用的MX服务器"
-            return result
+            for email in pending:
+                results[email] = SMTPResult(error="没有可用的MX服务器")
+            return results
 
-        # 尝试每个MX服务器
-        last_error = None
-        for mx_host in mx_hosts[:3]:  # 最多尝试3个MX服务器
-            try:
-                smtp_result = await cls._verify_with_host(
-                    email, mx_host, timeout
+        if max_recipients_per_session is None:
+            max_recipients_per_session = cls.MAX_RECIPIENTS_PER_SESSION
+        if hedged is None:
+            hedged = cls.HEDGED_PROBING
+
+        # 最多尝试3个MX服务器，共享同一个时间预算
+        hosts = mx_hosts[:3]
+        deadline = time.monotonic() + timeout
+        last_errors: dict[str, Optional[str]] = {}
+        if hedged and len(hosts) > 1:
+            await cls._probe_hedged(
+                pending, hosts, deadline, max_recipients_per_session, check_catch_all,
+                results, last_errors, mx_addresses or {}
+            )
+        else:
+            await cls._probe_sequential(
+                pending, hosts, deadline, max_recipients_per_session, check_catch_all,
+                results, last_errors, mx_addresses or {}
+            )
+
+        for email in pending:
+            if email not in results:
+                results[email] = SMTPResult(
+                    error=last_errors.get(email) or "所有MX服务器连接失败"
                 )
-                if smtp_result.connectable:
-                    return smtp_result
-                last_error = smtp_result.error
-            except Exception as e:
-                last_error = str(e)
+        return results
+
+    @classmethod
+    def _collect(
+        cls,
+        host_results: dict[str, SMTPResult],
+        results: dict[str, SMTPResult],
+        last_errors: dict[str, Optional[str]]
+    ) -> None:
+        """收下已连接到MX得到的结论，未连接的地址只记录错误"""
+        for email, smtp_result in host_results.items():
+            if email in results:
                 continue
+            if smtp_result.connectable:
+                results[email] = smtp_result
+            else:
+                last_errors[email] = smtp_result.error
 
-        result.error = last_error or "所有MX服务器连接失败"
-        return result
+    @classmethod
+    async def _attempt(
+        cls,
+        emails: list[str],
+        mx_host: str,
+        timeout: float,
+        max_recipients_per_session: int,
+        check_catch_all: bool = True,
+        on_connected: Optional[Callable[[], None]] = None,
+        addresses: Optional[list[str]] = None
+    ) -> dict[str, SMTPResult]:
+        """在一个MX上验证一组地址，异常转换为每个地址的错误结果"""
+        try:
+            return await cls._verify_many_with_host(
+                emails, mx_host, timeout, max_recipients_per_session, check_catch_all,
+                on_connected, addresses
+            )
+        except Exception as e:
+            return {email: SMTPResult(error=str(e)) for email in emails}
+
+    @classmethod
+    async def _probe_sequential(
+        cls,
+        pending: list[str],
+        hosts: list[str],
+        deadline: float,
+        max_recipients_per_session: int,
+        check_catch_all: bool,
+        results: dict[str, SMTPResult],
+        last_errors: dict[str, Optional[str]],
+        mx_addresses: dict[str, list[str]]
+    ) -> None:
+        """依次尝试每个MX，前一个无法连接时才尝试下一个"""
+        for position, mx_host in enumerate(hosts):
+            unresolved = [email for email in pending if email not in results]
+            remaining = deadline - time.monotonic()
+            if not unresolved or remaining <= 0:
+                break
+            host_results = await cls._attempt(
+                unresolved, mx_host, cls._host_budget(mx_host, remaining, len(hosts) - position),
+                max_recipients_per_session, check_catch_all,
+                addresses=mx_addresses.get(mx_host)
+            )
+            cls._collect(host_results, results, last_errors)
+
+    @classmethod
+    async def _probe_hedged(
+        cls,
+        pending: list[str],
+        hosts: list[str],
+        deadline: float,
+        max_recipients_per_session: int,
+        check_catch_all: bool,
+        results: dict[str, SMTPResult],
+        last_errors: dict[str, Optional[str]],
+        mx_addresses: dict[str, list[str]]
+    ) -> None:
+        """
+        对冲探测：先连接优先级最高的MX，HEDGE_DELAY 内仍未连上时并行启动下一个MX；
+        某个MX失败且没有其他尝试在进行时立即转到下一个。
+        最先连上的尝试胜出，其余尝试在发送 RCPT 之前即被取消，避免重复的 RCPT 和限速令牌；
+        胜出的尝试未得到结论的地址再转到下一个MX。
+        """
+        attempts: set[asyncio.Task] = set()
+        next_host = 0
+        latest_connected: Optional[asyncio.Event] = None
+        hedge_at = 0.0
+
+        def launch() -> None:
+            nonlocal next_host, latest_connected, hedge_at
+            unresolved = [email for email in pending if email not in results]
+            latest_connected = asyncio.Event()
+            hedge_at = time.monotonic() + cls.HEDGE_DELAY
+
+            def on_connected() -> None:
+                # 同步回调中取消其他尝试：它们停在当前的 await 处，不会再发送命令
+                latest_connected.set()
+                for other in attempts:
+                    if other is not task:
+                        other.cancel()
+
+            task = asyncio.create_task(cls._attempt(
+                unresolved, hosts[next_host], max(0.0, deadline - time.monotonic()),
+                max_recipients_per_session, check_catch_all, on_connected,
+                mx_addresses.get(hosts[next_host])
+            ))
+            attempts.add(task)
+            next_host += 1
+
+        launch()
+        try:
+            while attempts and len(results) < len(pending):
+                now = time.monotonic()
+                if now >= deadline:
+                    for email in pending:
+                        if email not in results and not last_errors.get(email):
+                            last_errors[email] = "SMTP验证超时"
+                    break
+                wait = deadline - now
+                can_hedge = next_host < len(hosts) and not latest_connected.is_set()
+                if can_hedge:
+                    wait = min(wait, max(0.0, hedge_at - now))
+
+                done, attempts_left = await asyncio.wait(
+                    attempts, timeout=wait, return_when=asyncio.FIRST_COMPLETED
+                )
+                attempts = attempts_left
+                for task in done:
+                    if not task.cancelled():
+                        cls._collect(task.result(), results, last_errors)
+
+                if len(results) >= len(pending) or next_host >= len(hosts):
+                    continue
+                if not attempts:
+                    # 没有进行中的尝试：转到下一个MX
+                    launch()
+                elif (not done and not latest_connected.is_set()
+                        and time.monotonic() >= hedge_at):
+                    # 最近的尝试在对冲延迟内没有连上：并行启动下一个MX
+                    launch()
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
+
+    @classmethod
+    def _host_budget(cls, mx_host: str, remaining: float, hosts_left: int) -> float:
+        """
+        单个MX可使用的超时上限
+
+        已有延迟画像的主机可以使用全部剩余时间（实际超时由画像决定）；
+        未知主机只分得剩余时间的一部分，避免一个无响应的MX耗尽整个预算
+        """
+        if hosts_left <= 1 or cls._pool.latency.has_profile(mx_host):
+            return remaining
+        return max(remaining / hosts_left, min(remaining, MXLatencyTracker.MIN_TIMEOUT))
 
     @classmethod
     async def _verify_with_host(
@@ -79,83 +1232,395 @@ class SMTPValidator:
         timeout: int
     ) -> SMTPResult:
         """使用指定的MX主机验证邮箱"""
-        result = SMTPResult()
+        results = await cls._verify_many_with_host([email], mx_host, timeout, 1)
+        return results[email]
 
-        try:
-            # 尝试连接
-            smtp = SMTP(
-                hostname=mx_host,
-                port=cls.DEFAULT_PORT,
-                timeout=timeout
+    @classmethod
+    async def _verify_many_with_host(
+        cls,
+        emails: list[str],
+        mx_host: str,
+        timeout: float,
+        max_recipients_per_session: int,
+        check_catch_all: bool = True,
+        on_connected: Optional[Callable[[], None]] = None,
+        addresses: Optional[list[str]] = None
+    ) -> dict[str, SMTPResult]:
+        """
+        使用指定的MX主机验证多个邮箱，按会话收件人上限分批
+
+        timeout 是该MX上所有会话共享的时间预算，用完后未验证的地址标记为超时
+        """
+        deadline = time.monotonic() + timeout
+        results: dict[str, SMTPResult] = {}
+        step = max(1, max_recipients_per_session)
+        for i in range(0, len(emails), step):
+            results.update(
+                await cls._run_session(
+                    emails[i:i + step], mx_host, deadline, check_catch_all, on_connected,
+                    addresses
+                )
             )
+        return results
 
-            try:
-                await smtp.connect()
-                result.connectable = True
+    @classmethod
+    async def _run_session(
+        cls,
+        emails: list[str],
+        mx_host: str,
+        deadline: float,
+        check_catch_all: bool = True,
+        on_connected: Optional[Callable[[], None]] = None,
+        addresses: Optional[list[str]] = None
+    ) -> dict[str, SMTPResult]:
+        """
+        在单个SMTP会话中依次验证多个收件人，超时根据该MX的历史延迟推导
 
-                # 发送 EHLO (aiosmtplib自动使用本机hostname)
-                await smtp.ehlo()
+        每条命令和限速等待都不超过截止时间 deadline（time.monotonic()），
+        到达截止时间后尚未得到响应的地址标记为超时。
+        on_connected 在取得连接后、发送任何命令前调用，供对冲探测取消其他尝试；
+        addresses 为预先解析的该MX的IP地址，新建连接时直接使用
+        """
+        results = {email: SMTPResult() for email in emails}
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            cls._fail_unfinished(results, cls.TIMEOUT_ERROR)
+            return results
 
-                # 发送 MAIL FROM
-                code, message = await smtp.execute_command(
-                    "MAIL", f"FROM:<{cls.SENDER_EMAIL}>"
-                )
+        # 熔断中的主机直接返回不可达，由调用方转到下一个MX
+        if not cls._breaker.allow(mx_host):
+            for result in results.values():
+                result.error = f"无法连接到 {mx_host}（熔断中，已缓存）"
+            return results
+
+        latency = cls._pool.latency
+        connect_timeout = latency.timeout(mx_host, MXLatencyTracker.CONNECT, remaining)
+        command_timeout = latency.timeout(mx_host, MXLatencyTracker.COMMAND, remaining)
+
+        # 熔断只反映能否连上该MX：取得连接后的超时或断开（如 RCPT 阶段的 tarpit）不计入
+        checked_out = False
+        try:
+            # 从连接池借出连接（已完成 EHLO）
+            async with cls._pool.connection(
+                mx_host, cls.DEFAULT_PORT, command_timeout, connect_timeout,
+                backup_ports=tuple(cls.BACKUP_PORTS), addresses=addresses,
+                deadline=deadline
+            ) as smtp:
+                checked_out = True
+                cls._breaker.record_success(mx_host)
+                if on_connected is not None:
+                    on_connected()
+                # MX级别的特征（STARTTLS等）在建立连接时已记录，同一MX上的所有域名共享
+                facts = cls._pool.facts.get(mx_host)
+                for result in results.values():
+                    result.connectable = True
+                    result.mx_host = mx_host
+                    result.starttls = facts.starttls if facts else None
 
+                # 提交端口上的 530 和 5.7.x 拒绝只说明未认证，不反映收件人是否存在
+                submission = cls._peer_port(smtp) in cls.BACKUP_PORTS
+
+                # 发送 MAIL FROM
+                code, message = await cls._mail_from(smtp, deadline)
+                if submission and cls._submission_refusal(code, message):
+                    raise SubmissionRefused(f"{mx_host} 的提交端口拒绝验证: {code} {message}")
                 if code >= 400:
-                    result.smtp_response = f"{code} {message}"
-                    result.error = "MAIL FROM 被拒绝"
-                    return result
+                    for result in results.values():
+                        result.smtp_response = f"{code} {message}"
+                        result.error = "MAIL FROM 被拒绝"
+                    return results
 
-                # 发送 RCPT TO 验证收件人
-                code, message = await smtp.execute_command(
-                    "RCPT", f"TO:<{email}>"
-                )
+                accepted_in_transaction = 0
+                for email in emails:
+                    result = results[email]
 
-                result.smtp_response = f"{code} {message}"
+                    # 发送 RCPT TO 验证收件人
+                    code, message = await cls._rcpt_to(smtp, email, deadline)
 
-                if code == 250:
-                    result.accepts_mail = True
-                    # 检测是否为 catch-all
-                    result.is_catch_all = await cls._check_catch_all(
-                        smtp, email
-                    )
-                elif code == 251:
-                    # 用户不在本地，但会转发
-                    result.accepts_mail = True
-                elif code in (450, 451, 452):
-                    # 临时错误，可能有效
-                    result.accepts_mail = False
-                    result.error = f"临时错误: {message}"
-                elif code in (550, 551, 552, 553):
-                    # 永久错误，用户不存在
-                    result.accepts_mail = False
-                    result.error = f"邮箱不存在: {message}"
-                else:
-                    result.accepts_mail = False
-                    result.error = f"未知响应: {code} {message}"
+                    # 452 可能表示本次事务收件人过多，RSET 后开启新事务重试
+                    if code == 452 and accepted_in_transaction > 0:
+                        await smtp.execute_command(
+                            b"RSET", timeout=cls._command_timeout(smtp, deadline)
+                        )
+                        mail_code, _ = await cls._mail_from(smtp, deadline)
+                        accepted_in_transaction = 0
+                        if mail_code < 400:
+                            code, message = await cls._rcpt_to(smtp, email, deadline)
 
-                # 发送 RSET 重置状态
-                await smtp.execute_command("RSET")
+                    if submission and cls._submission_refusal(code, message):
+                        raise SubmissionRefused(f"{mx_host} 的提交端口拒绝验证: {code} {message}")
+                    cls._apply_rcpt_response(result, code, message)
 
-            finally:
-                try:
-                    await smtp.quit()
-                except Exception:
-                    pass
+                    if code in (250, 251):
+                        accepted_in_transaction += 1
+                    if code == 250 and check_catch_all:
+                        # 检测是否为 catch-all
+                        with stage("smtp_catch_all"):
+                            result.is_catch_all = await cls._get_catch_all(
+                                smtp, mx_host, email, deadline
+                            )
+
+                # 连接归还连接池时会发送 RSET 重置状态
 
+        except DeadlineExceeded:
+            cls._fail_unfinished(results, cls.TIMEOUT_ERROR)
+            cls._breaker.release(mx_host)
+        except SubmissionRefused as e:
+            # 没有得到结论，由调用方转到下一个MX；连接在退出时丢弃，不归还连接池
+            cls._fail_unfinished(results, str(e))
+            cls._breaker.release(mx_host)
+        except PoolExhausted as e:
+            # 本机连接名额不足，与MX是否可达无关，不计入熔断
+            cls._fail_unfinished(results, str(e))
+            cls._breaker.release(mx_host)
         except asyncio.TimeoutError:
-            result.error = f"连接 {mx_host} 超时"
+            if time.monotonic() >= deadline:
+                # 命令超时由截止时间截短，不代表该MX无响应
+                cls._fail_unfinished(results, cls.TIMEOUT_ERROR)
+                cls._breaker.release(mx_host)
+            elif checked_out:
+                cls._fail_unfinished(results, f"{mx_host} 响应超时")
+            else:
+                cls._fail_unfinished(results, f"连接 {mx_host} 超时")
+                cls._breaker.record_failure(mx_host, "timeout")
         except aiosmtplib.SMTPConnectError as e:
-            result.error = f"无法连接到 {mx_host}: {str(e)}"
+            cls._fail_unfinished(results, f"无法连接到 {mx_host}: {str(e)}")
+            cls._breaker.record_failure(mx_host, str(e))
         except aiosmtplib.SMTPServerDisconnected:
-            result.error = f"服务器 {mx_host} 断开连接"
+            cls._fail_unfinished(results, f"服务器 {mx_host} 断开连接")
+            if not checked_out:
+                cls._breaker.record_failure(mx_host, "disconnected")
         except Exception as e:
-            result.error = f"SMTP验证错误: {str(e)}"
+            cls._fail_unfinished(results, f"SMTP验证错误: {str(e)}")
+            cls._breaker.release(mx_host)
+        except asyncio.CancelledError:
+            cls._breaker.release(mx_host)
+            raise
 
-        return result
+        return results
+
+    @classmethod
+    async def _mail_from(cls, smtp: SMTP, deadline: Optional[float] = None) -> tuple[int, str]:
+        """发送 MAIL FROM 命令"""
+        with stage("smtp_mail"):
+            response = await cls._command(
+                smtp, "MAIL", f"FROM:<{cls.SENDER_EMAIL}>", deadline
+            )
+        return response.code, response.message
+
+    @classmethod
+    async def _rcpt_to(
+        cls,
+        smtp: SMTP,
+        email: str,
+        deadline: Optional[float] = None
+    ) -> tuple[int, str]:
+        """发送 RCPT TO 命令（按MX主机和提供商分组限速，等待不超过截止时间）"""
+        try:
+            await cls._pool.rate_limiter.acquire(
+                RateLimiter.RCPT, smtp.hostname,
+                timeout=None if deadline is None else deadline - time.monotonic()
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{smtp.hostname} 的限速等待超过剩余时间") from None
+        with stage("smtp_rcpt"):
+            response = await cls._command(smtp, "RCPT", f"TO:<{email}>", deadline)
+        return response.code, response.message
+
+    @classmethod
+    def _command_timeout(cls, smtp: SMTP, deadline: Optional[float]) -> float:
+        """单条命令的超时：该MX的命令超时，不超过距截止时间的剩余时间"""
+        if deadline is None:
+            return smtp.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("验证的总时间预算已用完")
+        return min(smtp.timeout, remaining)
 
     @classmethod
-    async def _check_catch_all(cls, smtp: SMTP, email: str) -> Optional[bool]:
+    async def _command(
+        cls,
+        smtp: SMTP,
+        command: str,
+        argument: str,
+        deadline: Optional[float] = None
+    ) -> SMTPResponse:
+        """发送命令，记录该MX的命令延迟和响应码"""
+        timeout = cls._command_timeout(smtp, deadline)
+        started = time.perf_counter()
+        try:
+            response = await smtp.execute_command(
+                command.encode(), argument.encode(), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            # 被截止时间截短的超时不能说明该MX的响应速度，不计入延迟画像
+            if timeout >= smtp.timeout:
+                cls._pool.latency.observe(smtp.hostname, MXLatencyTracker.COMMAND, timeout)
+            raise
+        cls._pool.latency.observe(
+            smtp.hostname, MXLatencyTracker.COMMAND, time.perf_counter() - started
+        )
+        SMTP_REPLIES.inc(mx=smtp.hostname, command=command, code=str(response.code))
+        return response
+
+    @staticmethod
+    def _peer_port(smtp: SMTP) -> Optional[int]:
+        """当前连接的对端端口"""
+        peer = smtp.get_transport_info("peername")
+        return peer[1] if peer else None
+
+    @staticmethod
+    def _submission_refusal(code: int, message: str) -> bool:
+        """
+        判断是否为提交端口上的认证或中继拒绝（530、5.7.x 或提到 relay/auth 的5xx响应）
+
+        Args:
+            code: 响应码
+            message: 响应文本
+        """
+        if code == 530:
+            return True
+        if not 500 <= code < 600:
+            return False
+        text = message.strip().lower()
+        return text.startswith("5.7.") or "relay" in text or "auth" in text
+
+    @classmethod
+    def _apply_rcpt_response(cls, result: SMTPResult, code: int, message: str) -> None:
+        """根据 RCPT TO 响应码填充验证结果"""
+        result.smtp_response = f"{code} {message}"
+
+        if code == 250:
+            result.accepts_mail = True
+        elif code == 251:
+            # 用户不在本地，但会转发
+            result.accepts_mail = True
+        elif code in (450, 451, 452):
+            # 临时错误（常见于灰名单），可能有效，稍后重试可得到结论
+            result.accepts_mail = False
+            result.temporary_failure = True
+            result.error = f"临时错误: {message}"
+        elif code in (550, 551, 552, 553):
+            # 永久错误，用户不存在
+            result.accepts_mail = False
+            result.error = f"邮箱不存在: {message}"
+        else:
+            result.accepts_mail = False
+            result.error = f"未知响应: {code} {message}"
+
+    @classmethod
+    def _fail_unfinished(cls, results: dict[str, SMTPResult], error: str) -> None:
+        """
+        会话异常中断时标记尚未得到RCPT响应的地址
+
+        这些地址被视为不可连接，以便调用方换用下一个MX重试
+        """
+        for result in results.values():
+            if result.smtp_response is None:
+                result.connectable = False
+                result.error = error
+
+    @classmethod
+    async def _get_catch_all(
+        cls,
+        smtp: SMTP,
+        mx_host: str,
+        email: str,
+        deadline: Optional[float] = None
+    ) -> Optional[bool]:
+        """
+        获取 catch-all 结论，优先使用缓存，未命中时合并并发探测
+
+        合并的键为 (MX主机, 域名)，不区分会话：同一MX上同一域名的并发探测只在第一个调用方
+        （leader）的会话上发送随机地址的 RCPT，其他调用方等待并共享其结论，不在自己的会话上探测。
+        catch-all 是MX对整个域名的配置，与会话无关；leader 的会话出错时各调用方都得到 None（不缓存）
+        """
+        key = (mx_host, email.split("@")[1])
+        verdict = cls._catch_all_cache.get(key)
+        if verdict is not None:
+            return verdict
+
+        verdict = await cls._catch_all_flight.do(
+            key, lambda: cls._check_catch_all(smtp, email, deadline)
+        )
+        # 探测失败(None)不缓存，下次重新探测
+        if verdict is not None:
+            cls._catch_all_cache.set(key, verdict)
+        return verdict
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """catch-all 缓存统计信息"""
+        return cls._catch_all_cache.stats()
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """SMTP连接池统计信息"""
+        return cls._pool.stats()
+
+    @classmethod
+    def mx_facts_stats(cls) -> dict:
+        """已记录的MX主机特征"""
+        return cls._pool.facts.stats()
+
+    @classmethod
+    def rate_limit_stats(cls) -> dict:
+        """出站限速统计信息"""
+        return cls._pool.rate_limiter.stats()
+
+    @classmethod
+    async def configure_pool(cls, **options) -> SMTPConnectionPool:
+        """
+        关闭当前连接池并换用新的连接池（例如基准测试中关闭限速）
+
+        Args:
+            options: SMTPConnectionPool 的构造参数
+
+        Returns:
+            SMTPConnectionPool: 新的连接池
+        """
+        await cls.close_pool()
+        cls._pool = SMTPConnectionPool(**options)
+        return cls._pool
+
+    @classmethod
+    async def start_pool(cls) -> None:
+        """启动连接池的后台保活"""
+        await cls._pool.start()
+
+    @classmethod
+    async def close_pool(cls) -> None:
+        """停止保活并关闭连接池中的空闲连接"""
+        await cls._pool.stop()
+        await cls._pool.close_all()
+
+    @classmethod
+    def coalescing_stats(cls) -> dict:
+        """catch-all 探测合并统计信息"""
+        return cls._catch_all_flight.stats()
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """清空 catch-all 缓存"""
+        cls._catch_all_cache.clear()
+
+    @classmethod
+    def breaker_stats(cls) -> dict:
+        """MX熔断器状态"""
+        return cls._breaker.stats()
+
+    @classmethod
+    def reset_breaker(cls, host: Optional[str] = None) -> bool:
+        """重置指定MX主机（不指定时为全部主机）的熔断状态"""
+        return cls._breaker.reset(host)
+
+    @classmethod
+    async def _check_catch_all(
+        cls,
+        smtp: SMTP,
+        email: str,
+        deadline: Optional[float] = None
+    ) -> Optional[bool]:
         """
         检测是否为 catch-all 邮箱服务器
 
@@ -165,9 +1630,7 @@ class SMTPValidator:
             domain = email.split("@")[1]
             test_email = f"{cls.CATCH_ALL_TEST_USER}@{domain}"
 
-            code, _ = await smtp.execute_command(
-                "RCPT", f"TO:<{test_email}>"
-            )
+            code, _ = await cls._rcpt_to(smtp, test_email, deadline)
 
             # 如果随机地址也被接受，则可能是 catch-all
             return code == 250
@@ -3,8 +3,9 @@
 整合所有验证器，提供统一的验证接口
 """
 import asyncio
+import os
 import time
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Optional
 from app.models.schemas import (
     EmailValidationRequest,
     EmailValidationResult,
@@ -20,24 +21,194 @@ from app.core.syntax import SyntaxValidator
 from app.core.dns import DNSValidator
 from app.core.smtp import SMTPValidator
 from app.core.disposable import DisposableDetector
+from app.core.providers import ProviderProfile, ProviderRegistry
+from app.core.result_cache import ResultCache
+from app.core.retry import retry_scheduler
+from app.core.metrics import IN_FLIGHT, VALIDATIONS, collect_timings, stage
+
+
+class MXClusters:
+    """
+    批量验证中按MX主机集合聚合待探测的地址
+
+    大量企业域名托管在 Google Workspace、Microsoft 365、腾讯企业邮等服务上，MX记录指向同一组主机。
+    不同域名下的地址按 (MX主机集合, 是否检测 catch-all) 放入同一个簇，凑满单会话收件人上限时
+    立即在一个复用的会话中验证（共享连接池和限速配额）。未凑满的簇在所有域名完成DNS解析后发出，
+    或者在簇建立 COALESCE_WINDOW 秒后发出，不必等待个别解析缓慢的域名
+    """
+
+    # 未凑满的簇等待其他域名加入的最长时间（秒）
+    COALESCE_WINDOW = float(os.environ.get("BATCH_COALESCE_WINDOW", "0.1"))
+
+    def __init__(self, timeout: int, queue: asyncio.Queue, window: Optional[float] = None):
+        self.timeout = timeout
+        self.queue = queue
+        self.window = self.COALESCE_WINDOW if window is None else window
+        self.tasks: list[asyncio.Task] = []
+        self._timers: dict[tuple[tuple[str, ...], bool], asyncio.TimerHandle] = {}
+        # 每组MX主机预先解析的IP地址
+        self._addresses: dict[tuple[str, ...], dict[str, list[str]]] = {}
+        self._pending: dict[
+            tuple[tuple[str, ...], bool],
+            list[tuple[str, Callable[[Optional[SMTPResult], dict[str, float]], Awaitable[None]]]]
+        ] = {}
+
+    def add(
+        self,
+        mx_hosts: list[str],
+        email: str,
+        check_catch_all: bool,
+        finish: Callable[[Optional[SMTPResult], dict[str, float]], Awaitable[None]],
+        mx_addresses: Optional[dict[str, list[str]]] = None
+    ) -> None:
+        """
+        加入一个待探测的地址
+
+        Args:
+            mx_hosts: 地址所在域名的MX服务器列表
+            email: 已标准化的邮箱地址
+            check_catch_all: 是否进行 catch-all 检测
+            finish: 得到SMTP结果后的回调，参数为 (SMTP结果, SMTP阶段耗时)
+            mx_addresses: DNS阶段预先解析的MX主机IP地址
+        """
+        key = (tuple(mx_hosts), check_catch_all)
+        if mx_addresses:
+            self._addresses.setdefault(key[0], mx_addresses)
+        entries = self._pending.get(key)
+        if entries is None:
+            entries = self._pending[key] = []
+            if self.window > 0:
+                self._timers[key] = asyncio.get_running_loop().call_later(
+                    self.window, self._launch, key
+                )
+        entries.append((email, finish))
+        if len(entries) >= SMTPValidator.MAX_RECIPIENTS_PER_SESSION:
+            self._launch(key)
+
+    def flush(self) -> None:
+        """发出所有未凑满的簇"""
+        for key in list(self._pending):
+            self._launch(key)
+
+    def close(self) -> None:
+        """取消等待中的簇和进行中的验证"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
+        for task in self.tasks:
+            task.cancel()
+
+    def _launch(self, key: tuple[tuple[str, ...], bool]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        entries = self._pending.pop(key, None)
+        if entries:
+            self.tasks.append(asyncio.create_task(self._verify(key, entries)))
+
+    async def _verify(self, key: tuple[tuple[str, ...], bool], entries: list) -> None:
+        mx_hosts, check_catch_all = key
+        try:
+            with collect_timings() as timings:
+                with stage("smtp"):
+                    results = await SMTPValidator.validate_many(
+                        [email for email, _ in entries], list(mx_hosts), self.timeout,
+                        check_catch_all=check_catch_all,
+                        mx_addresses=self._addresses.get(mx_hosts)
+                    )
+            await asyncio.gather(*[
+                finish(results.get(email), timings) for email, finish in entries
+            ])
+        except Exception as e:
+            self.queue.put_nowait(e)
 
 
 class EmailValidator:
     """邮箱验证引擎"""
 
+    # 完整验证时先运行本地分类（一次性邮箱、角色账户、已知提供商），再按策略跳过网络阶段
+    # 一次性邮箱: skip_network 跳过DNS和SMTP，skip_smtp 只跳过SMTP，none 不跳过
+    DISPOSABLE_ACTION = os.environ.get("PIPELINE_DISPOSABLE_ACTION", "skip_network")
+    # 角色账户: skip_smtp 或 none
+    ROLE_ACTION = os.environ.get("PIPELINE_ROLE_ACTION", "none")
+    # 已知的免费邮箱提供商不是 catch-all，跳过 catch-all 探测
+    # （内置提供商配置中 catch-all 行为已知时，SMTP/完整级别均直接使用配置的值）
+    SKIP_PROVIDER_CATCH_ALL = os.environ.get("PIPELINE_SKIP_PROVIDER_CATCH_ALL", "1") != "0"
+
+    # 各网络阶段在评分中的满分。跳过的阶段不计分，已执行的网络阶段的得分按网络阶段总满分折算；
+    # 语法、本地分类的得分和各项扣分不参与折算
+    STAGE_WEIGHTS = {"dns": 20, "smtp": 30}
+    STAGE_NAMES = {"dns": "DNS验证", "smtp": "SMTP验证", "catch_all": "catch-all检测"}
+
     @classmethod
-    async def validate(cls, request: EmailValidationRequest) -> EmailValidationResult:
+    async def validate(
+        cls,
+        request: EmailValidationRequest,
+        smtp_result: Optional[SMTPResult] = None,
+        dns_result: Optional[DNSResult] = None,
+        timings: Optional[dict[str, float]] = None,
+        cache_checked: bool = False,
+        deep_result: Optional[DeepAnalysisResult] = None
+    ) -> EmailValidationResult:
         """
         验证邮箱地址
 
         Args:
             request: 验证请求
+            smtp_result: 预先取得的SMTP验证结果（批量验证时按会话复用得到），
+                提供时跳过单独的SMTP探测
+            dns_result: 预先取得的域名DNS验证结果（批量验证时每个域名解析一次），
+                提供时跳过单独的DNS查询
+            timings: 预先取得上述结果时测得的阶段耗时（毫秒）
+            cache_checked: 调用方已查询过结果缓存且未命中（批量验证），不再重复查询
+            deep_result: 预先取得的本地分类结果（批量验证规划阶段时已分析），
+                提供时不再重复分析
 
         Returns:
             EmailValidationResult: 验证结果
         """
         start_time = time.time()
-        email = request.email.strip().lower()
+        email = SyntaxValidator.normalize(request.email)
+
+        with collect_timings(timings) as stage_timings, IN_FLIGHT.track(kind="validation"):
+            # 优先使用持久化的结果缓存（多进程共享），SQLite 读写放到线程中，不阻塞事件循环
+            cacheable = ResultCache.is_cacheable(request.level)
+            cached = None
+            if cacheable and not cache_checked:
+                with stage("result_cache"):
+                    cached = await asyncio.to_thread(ResultCache.get, email, request.level)
+            if cached is not None:
+                cached.validation_time_ms = int((time.time() - start_time) * 1000)
+                VALIDATIONS.inc(level=request.level.value, cached="true")
+                if request.include_timings:
+                    cached.timings = dict(stage_timings)
+                return cached
+
+            result = await cls._validate_uncached(
+                request, email, start_time, smtp_result, dns_result, deep_result
+            )
+            if cacheable:
+                with stage("result_cache"):
+                    await asyncio.to_thread(ResultCache.set, email, request.level, result)
+
+        VALIDATIONS.inc(level=request.level.value, cached="false")
+        # 耗时明细不写入结果缓存
+        if request.include_timings:
+            result.timings = dict(stage_timings)
+        return result
+
+    @classmethod
+    async def _validate_uncached(
+        cls,
+        request: EmailValidationRequest,
+        email: str,
+        start_time: float,
+        smtp_result: Optional[SMTPResult],
+        dns_result: Optional[DNSResult],
+        deep_result: Optional[DeepAnalysisResult] = None
+    ) -> EmailValidationResult:
+        """执行完整的验证流程"""
 
         # 初始化结果
         result = EmailValidationResult(
@@ -51,7 +222,8 @@ class EmailValidator:
         )
 
         # Step 1: 语法验证
-        syntax_result = SyntaxValidator.validate(email)
+        with stage("syntax"):
+            syntax_result = SyntaxValidator.validate(email, normalized=True)
         result.syntax = syntax_result
 
         if not syntax_result.valid:
@@ -70,14 +242,40 @@ class EmailValidator:
 
         domain = syntax_result.domain
 
-        # Step 2: DNS/MX验证
-        dns_result = await DNSValidator.validate(domain, timeout=request.timeout)
-        result.dns = dns_result
-
-        if not dns_result.has_mx and not dns_result.has_a_record:
-            result.message = f"DNS验证失败: {dns_result.error or '无MX记录'}"
-            result.validation_time_ms = int((time.time() - start_time) * 1000)
-            return result
+        # Step 2: 本地分类（完整验证时先于网络阶段运行）和提供商配置，决定可以跳过的阶段；
+        # 已知提供商在各网络级别都直接使用静态MX表，DNS级别因此不访问网络
+        profile = ProviderRegistry.get(domain)
+        if request.level == ValidationLevel.FULL:
+            if deep_result is None:
+                with stage("deep_analysis"):
+                    deep_result = DisposableDetector.analyze(email)
+            result.deep_analysis = deep_result
+        else:
+            deep_result = None
+        if request.level in (ValidationLevel.SMTP, ValidationLevel.FULL):
+            result.skipped_stages = cls._plan_stages(request.level, deep_result, profile)
+        skipped = result.skipped_stages
+
+        # Step 3: DNS/MX验证
+        if "dns" in skipped:
+            dns_result = None
+        else:
+            if dns_result is None:
+                with stage("dns"):
+                    dns_result = await DNSValidator.validate(
+                        domain, timeout=request.timeout,
+                        resolve_mx_addresses=(
+                            request.level in (ValidationLevel.SMTP, ValidationLevel.FULL)
+                            and "smtp" not in skipped
+                        ),
+                        profile=profile
+                    )
+            result.dns = dns_result
+
+            if not dns_result.has_mx and not dns_result.has_a_record:
+                result.message = f"DNS验证失败: {dns_result.error or '无MX记录'}"
+                result.validation_time_ms = int((time.time() - start_time) * 1000)
+                return result
 
         # 如果只需要DNS验证
         if request.level == ValidationLevel.DNS:
@@ -88,13 +286,31 @@ class EmailValidator:
             result.validation_time_ms = int((time.time() - start_time) * 1000)
             return result
 
-        # Step 3: SMTP验证
-        smtp_result = await SMTPValidator.validate(
-            email=email,
-            mx_hosts=dns_result.mx_records,
-            timeout=request.timeout
-        )
-        result.smtp = smtp_result
+        # Step 4: SMTP验证
+        if "smtp" in skipped:
+            smtp_result = None
+        else:
+            if smtp_result is None:
+                with stage("smtp"):
+                    smtp_result = await SMTPValidator.validate(
+                        email=email,
+                        mx_hosts=dns_result.mx_records,
+                        timeout=request.timeout,
+                        check_catch_all="catch_all" not in skipped,
+                        mx_addresses=dns_result.mx_addresses
+                    )
+            # 提供商的 catch-all 行为已知，不需要探测
+            if "catch_all" in skipped and profile is not None and smtp_result.accepts_mail:
+                smtp_result = smtp_result.model_copy(update={"is_catch_all": profile.catch_all})
+            # 临时错误（灰名单）稍后重试，得到结论后更新缓存的结果
+            if smtp_result.temporary_failure:
+                retry_at = await retry_scheduler.schedule(
+                    email, request.level, dns_result.mx_records, request.timeout,
+                    check_catch_all="catch_all" not in skipped
+                )
+                if retry_at is not None:
+                    smtp_result = smtp_result.model_copy(update={"retry_at": retry_at})
+            result.smtp = smtp_result
 
         # 如果只需要SMTP验证
         if request.level == ValidationLevel.SMTP:
@@ -102,28 +318,71 @@ class EmailValidator:
             result.validation_time_ms = int((time.time() - start_time) * 1000)
             return result
 
-        # Step 4: 深度分析（完整验证）
-        deep_result = DisposableDetector.analyze(email)
-        result.deep_analysis = deep_result
-
         # 计算最终结果
         result = cls._calculate_result(result, syntax_result, dns_result, smtp_result, deep_result)
         result.validation_time_ms = int((time.time() - start_time) * 1000)
 
         return result
 
+    @classmethod
+    def _plan_stages(
+        cls,
+        level: ValidationLevel,
+        deep: Optional[DeepAnalysisResult],
+        profile: Optional[ProviderProfile] = None
+    ) -> list[str]:
+        """
+        根据本地分类结果和提供商配置决定跳过的阶段（SMTP/完整验证）
+
+        Args:
+            level: 验证级别
+            deep: 本地分类结果（仅完整验证）
+            profile: 域名对应的提供商配置
+
+        Returns:
+            list[str]: 跳过的阶段 (dns/smtp/catch_all)
+        """
+        if level not in (ValidationLevel.SMTP, ValidationLevel.FULL):
+            return []
+
+        skipped = []
+        if deep is not None:
+            if deep.is_disposable and cls.DISPOSABLE_ACTION == "skip_network":
+                skipped += ["dns", "smtp"]
+            elif ((deep.is_disposable and cls.DISPOSABLE_ACTION == "skip_smtp")
+                    or (deep.is_role_account and cls.ROLE_ACTION == "skip_smtp")):
+                skipped.append("smtp")
+
+        # RCPT 响应不能反映邮箱是否存在的提供商，SMTP探测没有意义
+        if "smtp" not in skipped and profile is not None and not profile.rcpt_verification:
+            skipped.append("smtp")
+
+        if "smtp" not in skipped:
+            if profile is not None and profile.catch_all is not None:
+                skipped.append("catch_all")
+            elif deep is not None and deep.is_free_provider and cls.SKIP_PROVIDER_CATCH_ALL:
+                skipped.append("catch_all")
+        return skipped
+
     @classmethod
     def _calculate_result(
         cls,
         result: EmailValidationResult,
         syntax: SyntaxResult,
-        dns: DNSResult,
-        smtp: SMTPResult,
+        dns: Optional[DNSResult],
+        smtp: Optional[SMTPResult],
         deep: Optional[DeepAnalysisResult]
     ) -> EmailValidationResult:
-        """计算验证结果和评分"""
+        """
+        计算验证结果和评分
+
+        dns/smtp 为 None 表示该阶段被跳过：不计分，已执行的网络阶段的得分按网络阶段总满分折算，
+        扣分在折算之后计入；跳过了SMTP验证时邮箱是否存在未经确认，风险等级最低为 MEDIUM
+        """
 
         score = 0
+        network_score = 0
+        penalty = 0
         messages = []
 
         # 语法验证 (基础分 30分)
@@ -131,23 +390,27 @@ class EmailValidator:
             score += 30
 
         # DNS验证 (20分)
-        if dns.has_mx:
-            score += 20
+        if dns is None:
+            pass
+        elif dns.has_mx:
+            network_score += 20
         elif dns.has_a_record:
-            score += 10
+            network_score += 10
             messages.append("使用A记录作为邮件服务器")
 
         # SMTP验证 (30分)
-        if smtp.connectable:
-            score += 10
+        if smtp is not None and smtp.connectable:
+            network_score += 10
             if smtp.accepts_mail:
-                score += 20
+                network_score += 20
             else:
                 messages.append(smtp.error or "SMTP验证未通过")
+                if smtp.retry_at is not None:
+                    messages.append("已安排稍后重试")
 
             # Catch-all 检测扣分
             if smtp.is_catch_all:
-                score -= 10
+                penalty += 10
                 messages.append("邮件服务器接受所有地址(catch-all)")
 
         # 深度分析 (20分)
@@ -155,13 +418,13 @@ class EmailValidator:
             if not deep.is_disposable:
                 score += 10
             else:
-                score -= 20
+                penalty += 20
                 messages.append("一次性/临时邮箱")
 
             if not deep.is_role_account:
                 score += 5
             else:
-                score -= 5
+                penalty += 5
                 messages.append("角色账户")
 
             if deep.is_free_provider:
@@ -172,12 +435,25 @@ class EmailValidator:
                 score += 5
                 messages.append("可能是企业邮箱")
 
+        # 跳过的网络阶段不计分，已执行的网络阶段的得分按网络阶段总满分折算
+        network_weight = sum(cls.STAGE_WEIGHTS.values())
+        executed_weight = network_weight - sum(
+            cls.STAGE_WEIGHTS.get(name, 0) for name in result.skipped_stages
+        )
+        if 0 < executed_weight < network_weight:
+            network_score = network_score * network_weight / executed_weight
+        score = round(score + network_score) - penalty
+        if result.skipped_stages:
+            messages.append(
+                "已跳过" + "、".join(cls.STAGE_NAMES[name] for name in result.skipped_stages)
+            )
+
         # 确保分数在0-100范围内
         score = max(0, min(100, score))
         result.score = score
 
-        # 确定风险等级和有效性
-        if score >= 80:
+        # 确定风险等级和有效性（跳过了SMTP验证时邮箱是否存在未经确认，最高为 MEDIUM）
+        if score >= 80 and "smtp" not in result.skipped_stages:
             result.valid = True
             result.risk_level = RiskLevel.LOW
             result.message = "邮箱验证通过，可信度高"
@@ -205,7 +481,8 @@ class EmailValidator:
         cls,
         emails: list[str],
         level: ValidationLevel = ValidationLevel.FULL,
-        timeout: int = 10
+        timeout: int = 10,
+        include_timings: bool = False
     ) -> BatchValidationResult:
         """
         批量验证邮箱
@@ -214,20 +491,16 @@ class EmailValidator:
             emails: 邮箱列表
             level: 验证级别
             timeout: 超时时间
+            include_timings: 是否在结果中返回各阶段耗时
 
         Returns:
             BatchValidationResult: 批量验证结果
         """
-        tasks = []
-        for email in emails:
-            request = EmailValidationRequest(
-                email=email,
-                level=level,
-                timeout=timeout
-            )
-            tasks.append(cls.validate(request))
-
-        results = await asyncio.gather(*tasks)
+        results: list[Optional[EmailValidationResult]] = [None] * len(emails)
+        async for index, item_result in cls.iter_batch(
+            emails, level, timeout, include_timings
+        ):
+            results[index] = item_result
 
         valid_count = sum(1 for r in results if r.valid)
 
@@ -238,6 +511,183 @@ class EmailValidator:
             results=list(results)
         )
 
+    @classmethod
+    async def iter_batch(
+        cls,
+        emails: list[str],
+        level: ValidationLevel = ValidationLevel.FULL,
+        timeout: int = 10,
+        include_timings: bool = False
+    ) -> AsyncIterator[tuple[int, EmailValidationResult]]:
+        """
+        批量验证邮箱，按完成顺序逐个产出结果
+
+        地址先标准化去重，再按域名分组：每个域名只解析一次DNS；
+        需要SMTP探测的地址再按MX主机集合跨域名聚合（MXClusters），共享同一组MX的域名
+        在复用的会话中一起验证；未凑满的簇最多等待 MXClusters.COALESCE_WINDOW 秒。每个地址验证完成后立即产出
+        （重复地址在各自的位置上各产出一次）。生成器提前关闭时取消未完成的验证。
+
+        Args:
+            emails: 邮箱列表
+            level: 验证级别
+            timeout: 超时时间
+            include_timings: 是否在结果中返回各阶段耗时（共享的DNS/SMTP耗时计入组内每个地址）
+
+        Yields:
+            tuple[int, EmailValidationResult]: (在 emails 中的序号, 验证结果)
+        """
+        # 标准化并去重，记录每个地址在原始列表中的所有位置
+        positions: dict[str, list[int]] = {}
+        for index, email in enumerate(emails):
+            positions.setdefault(SyntaxValidator.normalize(email), []).append(index)
+
+        queue: asyncio.Queue = asyncio.Queue()
+
+        # 已缓存的地址直接产出，不再参与DNS/SMTP分组
+        cached = await asyncio.to_thread(ResultCache.get_many, positions, level)
+        for email, result in cached.items():
+            queue.put_nowait((email, result))
+        if cached:
+            VALIDATIONS.inc(len(cached), level=level.value, cached="true")
+        pending = [email for email in positions if email not in cached]
+
+        clusters = MXClusters(timeout, queue)
+        domain_tasks = [
+            asyncio.create_task(
+                cls._validate_domain_group(
+                    domain, addresses, level, timeout, queue, clusters, include_timings
+                )
+            )
+            for domain, addresses in cls._group_by_domain(pending).items()
+        ]
+
+        async def flush_when_resolved() -> None:
+            # 所有域名的DNS解析和分簇完成后，发出剩余未凑满的簇
+            await asyncio.gather(*domain_tasks)
+            clusters.flush()
+        tasks = domain_tasks + [asyncio.create_task(flush_when_resolved())]
+
+        try:
+            for _ in range(len(positions)):
+                item = await queue.get()
+                if isinstance(item, BaseException):
+                    raise item
+                email, result = item
+                # 重复地址共享同一个验证结果
+                for index in positions[email]:
+                    yield index, result
+        finally:
+            for task in tasks:
+                task.cancel()
+            clusters.close()
+
+    @classmethod
+    def _group_by_domain(cls, addresses) -> dict[Optional[str], list[str]]:
+        """按域名分组已标准化的地址，语法无效的地址归入 None 组"""
+        addresses = list(addresses)
+        groups: dict[Optional[str], list[str]] = {}
+        for email, syntax_result in zip(
+            addresses, SyntaxValidator.validate_many(addresses, normalized=True)
+        ):
+            domain = syntax_result.domain if syntax_result.valid else None
+            groups.setdefault(domain, []).append(email)
+        return groups
+
+    @classmethod
+    async def _validate_domain_group(
+        cls,
+        domain: Optional[str],
+        addresses: list[str],
+        level: ValidationLevel,
+        timeout: int,
+        queue: asyncio.Queue,
+        clusters: MXClusters,
+        include_timings: bool = False
+    ) -> None:
+        """
+        验证同一域名下的一组地址，结果以 (地址, 结果) 逐个放入队列
+
+        DNS只解析一次；SMTP/完整级别下需要探测的地址交给 clusters，
+        与解析到同一组MX的其他域名的地址一起通过 SMTPValidator.validate_many 在复用的会话中验证。
+        先按本地分类结果和提供商配置规划阶段，策略跳过的DNS/SMTP不再执行
+        """
+        async def finish(
+            email: str,
+            timings: dict[str, float],
+            smtp_result: Optional[SMTPResult] = None
+        ) -> None:
+            request = EmailValidationRequest(
+                email=email, level=level, timeout=timeout, include_timings=include_timings
+            )
+            # iter_batch 已批量查询过结果缓存，这里的地址都未命中
+            result = await cls.validate(
+                request, smtp_result=smtp_result, dns_result=dns_result, timings=timings,
+                cache_checked=True, deep_result=deep_results.get(email)
+            )
+            queue.put_nowait((email, result))
+
+        def finisher(email: str):
+            async def finish_probed(
+                smtp_result: Optional[SMTPResult],
+                smtp_timings: dict[str, float]
+            ) -> None:
+                # 本域名的DNS耗时加上所在会话批次的SMTP耗时
+                timings = dict(group_timings)
+                for name, ms in smtp_timings.items():
+                    timings[name] = round(timings.get(name, 0.0) + ms, 3)
+                await finish(email, timings, smtp_result)
+            return finish_probed
+
+        # 本地分类在规划阶段时完成，结果传给 validate，每个地址只分析一次
+        deep_results: dict[str, DeepAnalysisResult] = {}
+        try:
+            plans: dict[str, list[str]] = {}
+            profile = ProviderRegistry.get(domain)
+            if domain and level in (ValidationLevel.SMTP, ValidationLevel.FULL):
+                if level == ValidationLevel.FULL:
+                    deep_results = {
+                        email: DisposableDetector.analyze(email) for email in addresses
+                    }
+                plans = {
+                    email: cls._plan_stages(level, deep_results.get(email), profile)
+                    for email in addresses
+                }
+            needs_dns = any("dns" not in plans.get(email, ()) for email in addresses)
+            probes_smtp = level in (ValidationLevel.SMTP, ValidationLevel.FULL) and any(
+                "smtp" not in plans.get(email, ()) for email in addresses
+            )
+
+            dns_result: Optional[DNSResult] = None
+            with collect_timings() as group_timings:
+                if domain and level != ValidationLevel.SYNTAX and needs_dns:
+                    with stage("dns"):
+                        dns_result = await DNSValidator.validate(
+                            domain, timeout=timeout, resolve_mx_addresses=probes_smtp,
+                            profile=profile
+                        )
+
+            needs_smtp = (
+                dns_result is not None
+                and (dns_result.has_mx or dns_result.has_a_record)
+                and level in (ValidationLevel.SMTP, ValidationLevel.FULL)
+            )
+            if needs_smtp:
+                local = []
+                for email in addresses:
+                    plan = plans.get(email, ())
+                    if "smtp" in plan:
+                        local.append(email)
+                    else:
+                        clusters.add(
+                            dns_result.mx_records, email, "catch_all" not in plan, finisher(email),
+                            dns_result.mx_addresses
+                        )
+                await asyncio.gather(*[finish(email, group_timings) for email in local])
+            else:
+                await asyncio.gather(*[finish(email, group_timings) for email in addresses])
+        except Exception as e:
+            queue.put_nowait(e)
+
     @classmethod
     def validate_sync(cls, request: EmailValidationRequest) -> EmailValidationResult:
         """同步版本的验证方法"""
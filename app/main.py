@@ -2,12 +2,36 @@
 邮箱验证API服务
 FastAPI 入口文件
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
+from app.core.smtp import SMTPValidator
+from app.core.disposable import DisposableDetector
+from app.core.blocklist import blocklists
+from app.core.jobs import job_manager
+from app.core.retry import retry_scheduler
 from app import __version__
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：构建一次性邮箱索引、启动外部名单监视、SMTP连接保活、灰名单重试和批量任务调度，
+    停止时释放任务并关闭SMTP连接池
+    """
+    DisposableDetector.build_index()
+    await blocklists.start()
+    await SMTPValidator.start_pool()
+    await retry_scheduler.start()
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    await retry_scheduler.stop()
+    await blocklists.stop()
+    await SMTPValidator.close_pool()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="邮箱验证API",
@@ -59,7 +83,8 @@ print(response.json())
     version=__version__,
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 
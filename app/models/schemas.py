@@ -35,6 +35,10 @@ class EmailValidationRequest(BaseModel):
         le=30,
         description="SMTP验证超时时间（秒）"
     )
+    include_timings: bool = Field(
+        default=False,
+        description="是否在结果中返回各阶段耗时"
+    )
 
 
 class BatchValidationRequest(BaseModel):
@@ -42,6 +46,7 @@ class BatchValidationRequest(BaseModel):
     emails: list[str] = Field(..., min_length=1, max_length=100, description="邮箱列表")
     level: ValidationLevel = Field(default=ValidationLevel.FULL)
     timeout: int = Field(default=10, ge=1, le=30)
+    include_timings: bool = Field(default=False, description="是否在结果中返回各阶段耗时")
 
 
 class SyntaxResult(BaseModel):
@@ -58,6 +63,10 @@ class DNSResult(BaseModel):
     mx_records: list[str] = []
     has_a_record: bool = False
     error: Optional[str] = None
+    from_profile: bool = Field(default=False, description="MX主机来自内置的提供商配置，未查询DNS")
+    mx_addresses: dict[str, list[str]] = Field(
+        default_factory=dict, description="前几个MX主机预先解析的IP地址（IPv6在前），供SMTP连接直接使用"
+    )
 
 
 class SMTPResult(BaseModel):
@@ -67,6 +76,10 @@ class SMTPResult(BaseModel):
     is_catch_all: Optional[bool] = None
     smtp_response: Optional[str] = None
     error: Optional[str] = None
+    temporary_failure: bool = Field(default=False, description="收到4xx临时错误（如灰名单），结论待重试确认")
+    retry_at: Optional[float] = Field(default=None, description="计划的重试时间（Unix 时间戳）")
+    mx_host: Optional[str] = Field(default=None, description="给出结论的MX主机")
+    starttls: Optional[bool] = Field(default=None, description="该MX是否支持 STARTTLS")
 
 
 class DeepAnalysisResult(BaseModel):
@@ -92,6 +105,15 @@ class EmailValidationResult(BaseModel):
 
     validation_time_ms: int = Field(description="验证耗时（毫秒）")
     message: str = Field(description="验证结果说明")
+    cached: bool = Field(default=False, description="是否来自结果缓存")
+    skipped_stages: list[str] = Field(
+        default=[],
+        description="根据本地分类结果按策略跳过的阶段 (dns/smtp/catch_all)"
+    )
+    timings: Optional[dict[str, float]] = Field(
+        default=None,
+        description="各阶段耗时（毫秒），仅在请求 include_timings 时返回"
+    )
 
 
 class BatchValidationResult(BaseModel):
@@ -102,6 +124,231 @@ class BatchValidationResult(BaseModel):
     results: list[EmailValidationResult]
 
 
+class JobStatus(str, Enum):
+    """批量任务状态"""
+    QUEUED = "queued"           # 排队中
+    RUNNING = "running"         # 运行中
+    COMPLETED = "completed"     # 已完成
+    CANCELLED = "cancelled"     # 已取消
+    FAILED = "failed"           # 失败
+
+
+class JobCreateRequest(BaseModel):
+    """批量任务提交请求"""
+    emails: list[str] = Field(
+        ..., min_length=1, max_length=1_000_000, description="邮箱列表"
+    )
+    level: ValidationLevel = Field(default=ValidationLevel.FULL)
+    timeout: int = Field(default=10, ge=1, le=30)
+
+
+class JobInfo(BaseModel):
+    """批量任务状态"""
+    id: str
+    status: JobStatus
+    level: ValidationLevel
+    timeout: int
+    total: int
+    processed: int
+    valid_count: int
+    invalid_count: int
+    progress: float = Field(description="完成比例 0-1")
+    pending_retries: int = Field(default=0, description="等待灰名单重试的地址数，重试完成后结果会更新")
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+class JobResultItem(BaseModel):
+    """批量任务的单条结果"""
+    index: int = Field(description="在提交的 emails 中的序号")
+    result: "EmailValidationResult"
+
+
+class JobResultsPage(BaseModel):
+    """批量任务结果分页"""
+    job_id: str
+    offset: int
+    limit: int
+    total: int
+    processed: int
+    results: list[JobResultItem]
+
+
+class BatchStreamItem(BaseModel):
+    """流式批量验证的单条结果（NDJSON 的一行）"""
+    type: str = "result"
+    index: int = Field(description="在请求 emails 中的序号")
+    result: EmailValidationResult
+
+
+class BatchStreamSummary(BaseModel):
+    """流式批量验证的汇总（NDJSON 的最后一行）"""
+    type: str = "summary"
+    total: int
+    valid_count: int
+    invalid_count: int
+
+
+class CacheStats(BaseModel):
+    """缓存统计"""
+    name: str
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+
+class SingleFlightStats(BaseModel):
+    """请求合并统计"""
+    name: str
+    in_flight: int
+    calls: int
+    shared: int                           # 合并到已有请求的调用次数
+
+
+class PoolStats(BaseModel):
+    """SMTP连接池统计"""
+    in_use: int                           # 正在使用的连接数
+    idle: int                             # 空闲连接数
+    hosts: int                            # 持有空闲连接的MX主机数
+    opened: int                           # 累计新建连接数
+    reused: int                           # 累计复用次数
+    evicted: int                          # 累计淘汰连接数
+    max_per_host: int
+    max_total: int
+
+
+class RateLimitStats(BaseModel):
+    """出站SMTP限速统计"""
+    enabled: bool
+    buckets: int                          # 当前的令牌桶数
+    acquired: int                         # 累计取令牌次数
+    throttled: int                        # 其中需要等待的次数
+    wait_seconds: float                   # 累计等待时间（秒）
+    mx_limits: dict[str, list[float]]     # 每个MX的 [每秒速率, 突发量]
+    group_limits: dict[str, list[float]]  # 每个提供商分组的 [每秒速率, 突发量]
+
+
+class ResultCacheStats(BaseModel):
+    """持久化结果缓存统计（命中数为当前进程的统计）"""
+    enabled: bool
+    entries: int                          # 未过期的条目数（所有进程共享）
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class BlocklistStats(BaseModel):
+    """外部名单统计"""
+    name: str
+    source: str                           # 源文件
+    entries: int
+    size_bytes: int                       # 内存映射索引文件大小（工作进程间共享）
+    loaded_at: Optional[float] = None     # 当前索引的加载时间
+    error: Optional[str] = None           # 最近一次加载失败的原因
+
+
+class DisposableIndexStats(BaseModel):
+    """一次性邮箱域名索引统计"""
+    domains: int                          # 内置名单中的域名数
+    domain_nodes: int                     # 后缀树节点数
+    keywords: int
+    keyword_states: int                   # 关键词自动机状态数
+    role_prefixes: int                    # 内置角色账户前缀数
+    role_nodes: int                       # 角色前缀树节点数
+    memory_bytes: int                     # 估算的内存占用
+    blocklists: list[BlocklistStats] = []
+
+
+class RetryStats(BaseModel):
+    """灰名单重试队列统计"""
+    enabled: bool
+    pending: int                          # 等待重试的地址数
+    next_retry_at: Optional[float] = None # 最早的重试时间
+    delays: list[float]                   # 各次重试前的等待时间（秒）
+    backoff_mx_hosts: int                 # 处于退避中的MX组数
+
+
+class StatsResponse(BaseModel):
+    """运行统计响应"""
+    caches: list[CacheStats]
+    single_flight: list[SingleFlightStats]
+    smtp_pool: PoolStats
+    rate_limits: RateLimitStats
+    result_cache: ResultCacheStats
+    disposable_index: DisposableIndexStats
+    retries: RetryStats
+
+
+class BreakerState(str, Enum):
+    """MX熔断器状态"""
+    CLOSED = "closed"           # 正常
+    OPEN = "open"               # 熔断中，不再连接
+    HALF_OPEN = "half_open"     # 冷却结束，等待探测结果
+
+
+class MXBreakerInfo(BaseModel):
+    """单个MX主机的熔断信息"""
+    host: str
+    state: BreakerState
+    consecutive_failures: int
+    total_failures: int
+    retry_in: Optional[float] = Field(default=None, description="距离允许探测的秒数")
+    last_error: Optional[str] = None
+
+
+class MXBreakerResponse(BaseModel):
+    """MX熔断器状态响应"""
+    failure_threshold: int
+    cool_down: float
+    open: int
+    half_open: int
+    hosts: list[MXBreakerInfo]
+
+
+class MXFactsInfo(BaseModel):
+    """单个MX主机的连接特征"""
+    host: str
+    reachable: bool
+    banner: Optional[str] = None
+    esmtp: bool
+    starttls: Optional[bool] = None
+    extensions: list[str]
+    port: Optional[int] = Field(default=None, description="最近连通的端口")
+    address: Optional[str] = Field(default=None, description="最近连通的IP地址")
+    family: Optional[str] = Field(default=None, description="最近连通的地址族 ipv4/ipv6")
+    learned_at: float
+    last_error: Optional[str] = None
+
+
+class MXFactsResponse(BaseModel):
+    """MX主机特征响应"""
+    ttl: float
+    reachable: int
+    unreachable: int
+    hosts: list[MXFactsInfo]
+
+
+class ProviderProfileInfo(BaseModel):
+    """内置提供商配置"""
+    name: str
+    domains: list[str]
+    mx_hosts: list[str]
+    rcpt_verification: bool = Field(description="RCPT TO 响应能否反映邮箱是否存在")
+    catch_all: Optional[bool] = Field(default=None, description="是否 catch-all，null 表示未知")
+
+
+class ProviderListResponse(BaseModel):
+    """提供商配置列表响应"""
+    enabled: bool
+    path: str
+    version: Optional[int] = None
+    providers: list[ProviderProfileInfo]
+
+
 class HealthResponse(BaseModel):
     """健康检查响应"""
     status: str
@@ -0,0 +1,4 @@
+"""
+性能基准测试
+使用本地的模拟DNS/SMTP服务器，结果可复现、可跨版本比较
+"""
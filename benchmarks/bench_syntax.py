@@ -0,0 +1,164 @@
+"""
+语法验证性能基准
+
+比较当前的 SyntaxValidator（预编译快速路径 + validate_many 批量接口）与
+改造前的实现（每个地址重新查找未编译的 INVALID_PATTERNS、逐标签 re.match），
+并核对两者对每个地址的结论和错误信息一致。
+
+用法:
+    python -m benchmarks.bench_syntax
+    python -m benchmarks.bench_syntax --count 1000000 --repeat 3
+"""
+import argparse
+import random
+import re
+import time
+from typing import Optional
+from app.core.syntax import SyntaxValidator
+from app.models.schemas import SyntaxResult
+
+
+class LegacySyntaxValidator:
+    """改造前的语法验证实现（仅用于对比）"""
+
+    SIMPLE_EMAIL_REGEX = SyntaxValidator.SIMPLE_EMAIL_REGEX
+    INVALID_PATTERNS = [
+        (r"\.{2,}", "连续的点号"),
+        (r"^\.|\.$", "以点号开头或结尾"),
+        (r"@.*@", "包含多个@符号"),
+        (r"\s", "包含空格"),
+        (r"[<>()[\]:;,\\]", "包含非法字符"),
+    ]
+    MAX_EMAIL_LENGTH = 254
+    MAX_LOCAL_LENGTH = 64
+    MAX_DOMAIN_LENGTH = 253
+
+    @classmethod
+    def validate(cls, email: str) -> SyntaxResult:
+        if not email or not isinstance(email, str):
+            return SyntaxResult(valid=False, error="邮箱地址不能为空")
+        email = email.strip().lower()
+        if len(email) > cls.MAX_EMAIL_LENGTH:
+            return SyntaxResult(valid=False, error=f"邮箱地址过长，最大{cls.MAX_EMAIL_LENGTH}个字符")
+        if "@" not in email:
+            return SyntaxResult(valid=False, error="缺少@符号")
+        parts = email.rsplit("@", 1)
+        if len(parts) != 2:
+            return SyntaxResult(valid=False, error="邮箱格式无效")
+        local_part, domain = parts
+        if not local_part:
+            return SyntaxResult(valid=False, error="本地部分不能为空")
+        if len(local_part) > cls.MAX_LOCAL_LENGTH:
+            return SyntaxResult(valid=False, error=f"本地部分过长，最大{cls.MAX_LOCAL_LENGTH}个字符")
+        if not domain:
+            return SyntaxResult(valid=False, error="域名不能为空")
+        if len(domain) > cls.MAX_DOMAIN_LENGTH:
+            return SyntaxResult(valid=False, error=f"域名过长，最大{cls.MAX_DOMAIN_LENGTH}个字符")
+        for pattern, message in cls.INVALID_PATTERNS:
+            if re.search(pattern, email):
+                return SyntaxResult(valid=False, error=message)
+        if not cls.SIMPLE_EMAIL_REGEX.match(email):
+            return SyntaxResult(valid=False, error="邮箱格式不符合规范")
+        domain_error = cls._validate_domain(domain)
+        if domain_error:
+            return SyntaxResult(valid=False, error=domain_error)
+        return SyntaxResult(valid=True, local_part=local_part, domain=domain)
+
+    @classmethod
+    def _validate_domain(cls, domain: str) -> Optional[str]:
+        if domain.startswith(".") or domain.endswith("."):
+            return "域名格式无效"
+        if ".." in domain:
+            return "域名包含连续的点号"
+        labels = domain.split(".")
+        if len(labels) < 2:
+            return "域名必须包含至少一个点号"
+        tld = labels[-1]
+        if len(tld) < 2:
+            return "顶级域名至少需要2个字符"
+        if not tld.isalpha():
+            return "顶级域名只能包含字母"
+        for label in labels:
+            if not label:
+                return "域名标签不能为空"
+            if len(label) > 63:
+                return "域名标签过长"
+            if label.startswith("-") or label.endswith("-"):
+                return "域名标签不能以连字符开头或结尾"
+            if not re.match(r"^[a-zA-Z0-9-]+$", label):
+                return "域名包含无效字符"
+        return None
+
+
+def build_workload(count: int, seed: int) -> list[str]:
+    """生成以有效地址为主、混合各类格式错误的地址列表（固定随机种子）"""
+    rng = random.Random(seed)
+    domains = ["gmail.com", "example.co.uk", "mail.example.org", "qq.com", "corp-mail.net"]
+    invalid = [
+        "{i}@@{d}", "user{i}", "user {i}@{d}", ".user{i}@{d}", "user..{i}@{d}",
+        "user{i}@-bad.{d}", "user{i}@{d}.", "user{i}@localhost", "user{i}@{d}.c0m",
+        "user<{i}>@{d}", "u{i}" + "x" * 70 + "@{d}",
+    ]
+    addresses = []
+    for i in range(count):
+        domain = rng.choice(domains)
+        if rng.random() < 0.1:
+            addresses.append(rng.choice(invalid).format(i=i, d=domain))
+        else:
+            local = rng.choice(["user", "First.Last", "john_doe", "sales+tag", "a1"])
+            addresses.append(f"  {local}{i}@{domain.upper() if i % 7 == 0 else domain} ")
+    return addresses
+
+
+def measure(label: str, run, count: int, repeat: int) -> float:
+    """重复运行取最快的一次，返回每秒处理的地址数"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    rate = count / best
+    print(f"{label:<28}{best:>10.3f} s{rate:>16,.0f} addr/s{rate * 60 / 1e6:>10.1f} M/min")
+    return rate
+
+
+def main(args: argparse.Namespace) -> None:
+    addresses = build_workload(args.count, args.seed)
+
+    mismatches = [
+        email for email, legacy, current in zip(
+            addresses,
+            map(LegacySyntaxValidator.validate, addresses),
+            SyntaxValidator.validate_many(addresses)
+        )
+        if legacy.model_dump() != current.model_dump()
+    ]
+    if mismatches:
+        raise SystemExit(f"结果不一致: {mismatches[:5]}")
+
+    print(f"{args.count} 个地址，重复 {args.repeat} 次取最快\n")
+    legacy = measure(
+        "legacy validate", lambda: [LegacySyntaxValidator.validate(a) for a in addresses],
+        args.count, args.repeat
+    )
+    single = measure(
+        "validate", lambda: [SyntaxValidator.validate(a) for a in addresses],
+        args.count, args.repeat
+    )
+    bulk = measure(
+        "validate_many", lambda: list(SyntaxValidator.validate_many(addresses)),
+        args.count, args.repeat
+    )
+    print(f"\nvalidate 加速 {single / legacy:.1f}x，validate_many 加速 {bulk / legacy:.1f}x")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="语法验证性能基准")
+    parser.add_argument("--count", type=int, default=200000, help="地址数量")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,119 @@
+"""
+模拟DNS服务器
+基于 UDP 的最小化权威DNS，实现 MX/A/AAAA 查询，支持可配置的响应延迟
+"""
+import asyncio
+import ipaddress
+from typing import Optional
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+
+class FakeDNSServer:
+    """
+    模拟DNS服务器
+
+    zones 以域名为键，值为 {"MX": [(优先级, 主机)], "A": [地址], "AAAA": [地址]}。
+    形如 IPv4 地址的主机名直接解析为自身，便于将 MX 指向本地模拟SMTP服务器。
+    未配置的域名返回 NXDOMAIN。
+    """
+
+    def __init__(
+        self,
+        zones: dict[str, dict],
+        latency: float = 0.0,
+        ttl: int = 300,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.zones = {name.lower(): records for name, records in zones.items()}
+        self.latency = latency
+        self.ttl = ttl
+        self.host = host
+        self.port = port
+        self.queries = 0
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    async def start(self) -> "FakeDNSServer":
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DNSProtocol(self), local_addr=(self.host, self.port)
+        )
+        self.port = self._transport.get_extra_info("sockname")[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def __aenter__(self) -> "FakeDNSServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    def answer(self, wire: bytes) -> bytes:
+        """根据查询报文构造响应报文"""
+        self.queries += 1
+        query = dns.message.from_wire(wire)
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text().rstrip(".").lower()
+        rdtype = dns.rdatatype.to_text(question.rdtype)
+
+        texts = self._lookup(name, rdtype)
+        if texts is None:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        elif texts:
+            response.answer.append(
+                dns.rrset.from_text(question.name, self.ttl, "IN", rdtype, *texts)
+            )
+        return response.to_wire()
+
+    def _lookup(self, name: str, rdtype: str) -> Optional[list[str]]:
+        """返回记录文本列表；域名不存在时返回 None"""
+        try:
+            address = ipaddress.ip_address(name)
+            if rdtype == "A" and address.version == 4:
+                return [name]
+            return []
+        except ValueError:
+            pass
+
+        records = self.zones.get(name)
+        if records is None:
+            return None
+        if rdtype == "MX":
+            return [
+                f"{preference} {host.rstrip('.')}."
+                for preference, host in records.get("MX", [])
+            ]
+        return list(records.get(rdtype, []))
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: FakeDNSServer):
+        self.server = server
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            wire = self.server.answer(data)
+        except Exception:
+            return
+        if self.server.latency > 0:
+            asyncio.get_running_loop().call_later(
+                self.server.latency, self._send, wire, addr
+            )
+        else:
+            self._send(wire, addr)
+
+    def _send(self, wire: bytes, addr) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(wire, addr)
@@ -0,0 +1,186 @@
+"""
+模拟SMTP服务器
+可脚本化的 SMTP 服务端，供基准测试和单元测试共用：可配置命令延迟、连接上限、
+固定的邮箱列表或按地址前缀决定的 250/450/550 响应、catch-all、灰名单和无响应的收件人
+"""
+import asyncio
+import time
+from typing import Iterable, Optional
+
+
+class FakeSMTPServer:
+    """
+    模拟SMTP服务器
+
+    RCPT TO 的响应规则（依次判断）：
+    - stall 中的地址：不响应，直到服务器关闭
+    - greylist 中的地址：总是 450
+    - 本次事务已接受 max_rcpt_per_transaction 个收件人：452
+    - catch_all 为真或域名在 catch_all_domains 中：250
+    - 指定了 mailboxes 时：其中的地址 250，其余 550
+    - 否则按本地部分前缀：invalid / nonexistent 开头 550，temp 开头 451，
+      grey 开头首次 450、greylist_delay 秒后重试返回 250，其他 250
+    同时连接数超过 max_connections 时返回 421 并断开；greeting 为假时接受连接但从不发送欢迎语；
+    require_auth 为真时模拟未认证的提交端口，MAIL FROM 返回 530。
+    """
+
+    BANNER = "fake.smtp.local ESMTP ready"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        connect_latency: float = 0.0,
+        catch_all_domains: Optional[set[str]] = None,
+        greylist_delay: float = 300.0,
+        max_connections: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        mailboxes: Optional[Iterable[str]] = None,
+        catch_all: bool = False,
+        greylist: Iterable[str] = (),
+        stall: Iterable[str] = (),
+        max_rcpt_per_transaction: Optional[int] = None,
+        greeting: bool = True,
+        require_auth: bool = False
+    ):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.catch_all_domains = {d.lower() for d in (catch_all_domains or set())}
+        self.greylist_delay = greylist_delay
+        self.max_connections = max_connections
+        self.host = host
+        self.port = port
+        self.mailboxes = None if mailboxes is None else {m.lower() for m in mailboxes}
+        self.catch_all = catch_all
+        self.greylist = {a.lower() for a in greylist}
+        self.stall = {a.lower() for a in stall}
+        self.max_rcpt_per_transaction = max_rcpt_per_transaction
+        self.greeting = greeting
+        self.require_auth = require_auth
+
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.rejected_connections = 0
+        self.commands: dict[str, int] = {}
+        self.rcpt_commands: list[str] = []
+        self._greylisted: dict[str, float] = {}
+        self._closing = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "FakeSMTPServer":
+        self._closing.clear()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self._closing.set()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "FakeSMTPServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    @property
+    def transactions(self) -> int:
+        """收到的 MAIL FROM 次数"""
+        return self.commands.get("MAIL", 0)
+
+    def rcpt_reply(self, address: str, accepted: int = 0) -> str:
+        """
+        根据收件人地址决定 RCPT TO 的响应
+
+        Args:
+            address: 收件人地址
+            accepted: 本次事务已接受的收件人数
+        """
+        address = address.lower()
+        local, _, domain = address.partition("@")
+        if address in self.greylist:
+            return "450 4.2.0 Greylisted, try again later"
+        if (self.max_rcpt_per_transaction is not None
+                and accepted >= self.max_rcpt_per_transaction):
+            return "452 4.5.3 Too many recipients"
+        if self.catch_all or domain in self.catch_all_domains:
+            return "250 2.1.5 OK"
+        if self.mailboxes is not None:
+            return "250 2.1.5 OK" if address in self.mailboxes else "550 5.1.1 User unknown"
+        if local.startswith(("invalid", "nonexistent")):
+            return "550 5.1.1 User unknown"
+        if local.startswith("temp"):
+            return "451 4.3.0 Temporary failure"
+        if local.startswith("grey"):
+            first_seen = self._greylisted.setdefault(address, time.monotonic())
+            if time.monotonic() - first_seen < self.greylist_delay:
+                return "450 4.2.0 Greylisted, try again later"
+        return "250 2.1.5 OK"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        if self.max_connections is not None and self.active >= self.max_connections:
+            self.rejected_connections += 1
+            writer.write(b"421 4.7.0 Too many connections\r\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        accepted = 0
+        try:
+            if not self.greeting:
+                await self._closing.wait()
+                return
+            if self.connect_latency:
+                await asyncio.sleep(self.connect_latency)
+            writer.write(f"220 {self.BANNER}\r\n".encode())
+            await writer.drain()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                self.commands[verb] = self.commands.get(verb, 0) + 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                if verb in ("EHLO", "HELO"):
+                    reply = "250-fake.smtp.local\r\n250 PIPELINING"
+                elif verb == "MAIL" and self.require_auth:
+                    reply = "530 5.7.0 Authentication required"
+                elif verb in ("MAIL", "RSET"):
+                    accepted = 0
+                    reply = "250 2.0.0 OK"
+                elif verb == "NOOP":
+                    reply = "250 2.0.0 OK"
+                elif verb == "RCPT":
+                    address = command.partition("<")[2].rstrip(">").lower()
+                    self.rcpt_commands.append(address)
+                    if address in self.stall:
+                        await self._closing.wait()
+                        break
+                    reply = self.rcpt_reply(address, accepted)
+                    if reply.startswith("250"):
+                        accepted += 1
+                elif verb == "QUIT":
+                    writer.write(b"221 2.0.0 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    reply = "502 5.5.2 Command not recognized"
+
+                writer.write(f"{reply}\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
@@ -0,0 +1,269 @@
+"""
+性能基准测试入口
+
+在本地启动模拟DNS和SMTP服务器，测量各验证级别下
+EmailValidator.validate、EmailValidator.validate_batch 以及 HTTP 接口的
+吞吐量（地址/秒）和 p50/p95/p99 延迟，结果写入 JSON 文件以便跨版本比较。
+
+用法:
+    python -m benchmarks.run
+    python -m benchmarks.run --count 2000 --levels dns,full --output bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from typing import Awaitable, Callable
+import httpx
+from app import __version__
+from app.core.dns import DNSValidator
+from app.core.result_cache import ResultCache
+from app.core.retry import retry_scheduler
+from app.core.ratelimit import RateLimiter
+from app.core.smtp import SMTPValidator
+from app.core.validator import EmailValidator
+from app.main import app
+from app.models.schemas import EmailValidationRequest, ValidationLevel
+from benchmarks.fake_dns import FakeDNSServer
+from benchmarks.fake_smtp import FakeSMTPServer
+
+
+BENCH_SUFFIX = "bench.test"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(
+    scenario: str,
+    level: ValidationLevel,
+    addresses: int,
+    seconds: float,
+    latencies: list[float]
+) -> dict:
+    """汇总单个场景的测量结果（延迟单位：毫秒）"""
+    return {
+        "scenario": scenario,
+        "level": level.value,
+        "addresses": addresses,
+        "seconds": round(seconds, 4),
+        "throughput": round(addresses / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def build_workload(count: int, domains: int, seed: int) -> tuple[dict, list[str], set[str]]:
+    """生成DNS区域、地址列表和 catch-all 域名（固定随机种子，结果可复现）"""
+    rng = random.Random(seed)
+    names = [f"d{i}.{BENCH_SUFFIX}" for i in range(domains)]
+    zones = {name: {"MX": [(10, "127.0.0.1")], "A": ["127.0.0.1"]} for name in names}
+    catch_all = set(names[::10])
+
+    prefixes = ["user"] * 14 + ["invalid"] * 3 + ["grey", "temp"]
+    addresses = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            addresses.append(f"broken{i}@@{rng.choice(names)}")
+        elif roll < 0.08:
+            addresses.append(f"user{i}@missing{i}.{BENCH_SUFFIX}")
+        else:
+            addresses.append(f"{rng.choice(prefixes)}{i}@{rng.choice(names)}")
+    return zones, addresses, catch_all
+
+
+async def reset_state() -> None:
+    """清空进程内的缓存和连接池，保证每个场景从冷状态开始"""
+    DNSValidator.clear_cache()
+    SMTPValidator.clear_cache()
+    SMTPValidator.reset_breaker()
+    # 所有模拟域名的MX都是本机，限速会让测得的是配置的速率而不是处理能力
+    await SMTPValidator.configure_pool(rate_limiter=RateLimiter(enabled=False))
+
+
+async def run_concurrently(
+    calls: list[Callable[[], Awaitable]],
+    concurrency: int
+) -> tuple[float, list[float]]:
+    """以有限并发执行调用，返回总耗时和每次调用的延迟"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def timed(call: Callable[[], Awaitable]) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[timed(call) for call in calls])
+    return time.perf_counter() - started, latencies
+
+
+async def bench_validate(addresses: list[str], level: ValidationLevel, concurrency: int) -> dict:
+    """EmailValidator.validate：逐个地址并发调用"""
+    await reset_state()
+    calls = [
+        (lambda a=address: EmailValidator.validate(
+            EmailValidationRequest(email=a, level=level, timeout=5)
+        ))
+        for address in addresses
+    ]
+    seconds, latencies = await run_concurrently(calls, concurrency)
+    return summarize("validate", level, len(addresses), seconds, latencies)
+
+
+async def bench_batch(addresses: list[str], level: ValidationLevel, batch_size: int) -> dict:
+    """EmailValidator.validate_batch：按批次顺序调用，延迟为单个批次的耗时"""
+    await reset_state()
+    batches = [addresses[i:i + batch_size] for i in range(0, len(addresses), batch_size)]
+    calls = [
+        (lambda b=batch: EmailValidator.validate_batch(b, level=level, timeout=5))
+        for batch in batches
+    ]
+    seconds, latencies = await run_concurrently(calls, 1)
+    return summarize("validate_batch", level, len(addresses), seconds, latencies)
+
+
+async def bench_http(
+    client: httpx.AsyncClient,
+    addresses: list[str],
+    level: ValidationLevel,
+    concurrency: int,
+    batch_size: int
+) -> list[dict]:
+    """HTTP 接口：POST /validate 与 POST /validate/batch"""
+    results = []
+
+    await reset_state()
+    calls = [
+        (lambda a=address: client.post(
+            "/api/v1/validate", json={"email": a, "level": level.value, "timeout": 5}
+        ))
+        for address in addresses
+    ]
+    seconds, latencies = await run_concurrently(calls, concurrency)
+    results.append(summarize("http_validate", level, len(addresses), seconds, latencies))
+
+    await reset_state()
+    batches = [addresses[i:i + batch_size] for i in range(0, len(addresses), batch_size)]
+    calls = [
+        (lambda b=batch: client.post(
+            "/api/v1/validate/batch", json={"emails": b, "level": level.value, "timeout": 5}
+        ))
+        for batch in batches
+    ]
+    seconds, latencies = await run_concurrently(calls, 1)
+    results.append(summarize("http_batch", level, len(addresses), seconds, latencies))
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def main(args: argparse.Namespace) -> dict:
+    zones, addresses, catch_all = build_workload(args.count, args.domains, args.seed)
+    levels = [ValidationLevel(level) for level in args.levels.split(",")]
+
+    # 结果缓存会让重复运行直接命中，灰名单地址会排入持久化的重试队列，基准测试中都关闭
+    ResultCache.configure(ResultCache.DB_PATH, enabled=False)
+    retry_scheduler.configure(retry_scheduler.DB_PATH, enabled=False)
+
+    dns_server = FakeDNSServer(zones, latency=args.dns_latency)
+    smtp_server = FakeSMTPServer(
+        latency=args.smtp_latency,
+        connect_latency=args.smtp_connect_latency,
+        catch_all_domains=catch_all,
+        max_connections=args.smtp_max_connections
+    )
+    async with dns_server, smtp_server:
+        DNSValidator.use_nameservers([dns_server.host], port=dns_server.port)
+        SMTPValidator.DEFAULT_PORT = smtp_server.port
+
+        results = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for level in levels:
+                results.append(await bench_validate(addresses, level, args.concurrency))
+                results.append(await bench_batch(addresses, level, args.batch_size))
+                if not args.skip_http:
+                    results.extend(
+                        await bench_http(client, addresses, level, args.concurrency, args.batch_size)
+                    )
+        await SMTPValidator.close_pool()
+
+    return {
+        "version": __version__,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("count", "domains", "seed", "concurrency", "batch_size",
+                        "dns_latency", "smtp_latency", "smtp_connect_latency",
+                        "smtp_max_connections")
+        },
+        "smtp_server": {
+            "connections": smtp_server.connections,
+            "rejected_connections": smtp_server.rejected_connections,
+            "max_active": smtp_server.max_active,
+            "commands": smtp_server.commands,
+        },
+        "dns_queries": dns_server.queries,
+        "results": results,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="邮箱验证性能基准测试")
+    parser.add_argument("--count", type=int, default=500, help="地址数量")
+    parser.add_argument("--domains", type=int, default=50, help="域名数量")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--levels", default="syntax,dns,smtp,full", help="验证级别，逗号分隔")
+    parser.add_argument("--concurrency", type=int, default=50, help="单地址调用的并发数")
+    parser.add_argument("--batch-size", type=int, default=100, help="批量调用的批次大小")
+    parser.add_argument("--dns-latency", type=float, default=0.002, help="DNS响应延迟（秒）")
+    parser.add_argument("--smtp-latency", type=float, default=0.002, help="SMTP命令延迟（秒）")
+    parser.add_argument("--smtp-connect-latency", type=float, default=0.01,
+                        help="SMTP连接建立延迟（秒）")
+    parser.add_argument("--smtp-max-connections", type=int, default=None,
+                        help="SMTP服务器同时连接上限")
+    parser.add_argument("--skip-http", action="store_true", help="跳过HTTP接口测试")
+    parser.add_argument("--output", default="bench_results.json", help="结果输出文件")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = asyncio.run(main(arguments))
+
+    print(f"{'scenario':<16}{'level':<8}{'addr/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in report["results"]:
+        print(
+            f"{row['scenario']:<16}{row['level']:<8}{row['throughput']:>12.1f}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+        )
+
+    with open(arguments.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {arguments.output}")
@@ -0,0 +1,16 @@
+"""
+测试公共配置
+"""
+import pytest
+from app.core.result_cache import ResultCache
+from app.core.retry import retry_scheduler
+
+
+@pytest.fixture(autouse=True)
+def isolated_result_cache(tmp_path):
+    """每个用例使用独立的临时结果缓存和重试队列，避免写入项目目录"""
+    ResultCache.configure(str(tmp_path / "results.db"))
+    retry_scheduler.configure(str(tmp_path / "retries.db"))
+    yield
+    ResultCache.close()
+    retry_scheduler.close()
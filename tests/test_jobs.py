@@ -0,0 +1,207 @@
+"""
+批量验证任务测试用例
+"""
+import asyncio
+import sqlite3
+import time
+import pytest
+import pytest_asyncio
+from app.core.jobs import JobManager
+from app.core.validator import EmailValidator
+from app.models.schemas import (
+    EmailValidationResult,
+    JobStatus,
+    RiskLevel,
+    SyntaxResult,
+    ValidationLevel,
+)
+
+
+async def wait_for_status(manager, job_id, status, timeout=5.0):
+    """轮询直到任务到达指定状态"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await manager.get(job_id)
+        if job.status == status:
+            return job
+        assert asyncio.get_running_loop().time() < deadline, f"job stuck in {job.status}"
+        await asyncio.sleep(0.02)
+
+
+@pytest_asyncio.fixture
+async def manager(tmp_path):
+    """使用临时数据库的任务调度器"""
+    job_manager = JobManager(db_path=str(tmp_path / "jobs.db"))
+    job_manager.CHUNK_SIZE = 2
+    job_manager.POLL_INTERVAL = 0.05
+    yield job_manager
+    await job_manager.stop()
+
+
+class TestJobManager:
+    """批量任务测试"""
+
+    @pytest.mark.asyncio
+    async def test_job_runs_to_completion(self, manager):
+        """测试任务分片执行并可分页获取结果"""
+        await manager.start()
+        emails = ["a@example.com", "invalid-email", "b@example.com", "c@example.com", "bad"]
+        job = await manager.submit(emails, ValidationLevel.SYNTAX, 5)
+        assert job.total == 5
+
+        job = await wait_for_status(manager, job.id, JobStatus.COMPLETED)
+        assert job.processed == 5
+        assert job.valid_count == 3
+        assert job.progress == 1.0
+
+        page = await manager.results(job.id, offset=1, limit=3)
+        assert [item.index for item in page] == [1, 2, 3]
+        assert page[1].result.email == "b@example.com"
+
+    @pytest.mark.asyncio
+    async def test_resume_after_restart(self, manager):
+        """测试进程重启后跳过已完成的分片"""
+        store = manager.store
+        job_id = store.create_job(
+            ["a@example.com", "b@example.com", "c@example.com"], ValidationLevel.SYNTAX, 5
+        )
+        # 模拟上一个进程已完成第一个分片后退出
+        store.claim_job("dead-worker", stale_after=0)
+        marker = EmailValidationResult(
+            email="a@example.com", valid=True, risk_level=RiskLevel.LOW, score=99,
+            syntax=SyntaxResult(valid=True), validation_time_ms=0, message="previous run"
+        )
+        store.save_results(job_id, [(0, marker)])
+        manager.STALE_AFTER = 0
+
+        await manager.start()
+        job = await wait_for_status(manager, job_id, JobStatus.COMPLETED)
+        assert job.processed == 3
+
+        results = await manager.results(job_id, offset=0, limit=10)
+        assert results[0].result.message == "previous run"
+        assert results[2].result.email == "c@example.com"
+
+    @pytest.mark.asyncio
+    async def test_stale_job_reclaimed(self, manager):
+        """测试心跳超过 STALE_AFTER 的运行中任务被其他进程重新认领"""
+        store = manager.store
+        job_id = store.create_job(["a@example.com", "b@example.com"], ValidationLevel.SYNTAX, 5)
+        store.claim_job("dead-worker", stale_after=0)
+        store._connect().execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ?",
+            (time.time() - manager.STALE_AFTER - 1, job_id)
+        )
+
+        await manager.start()
+        job = await wait_for_status(manager, job_id, JobStatus.COMPLETED)
+        assert job.processed == 2
+
+    @pytest.mark.asyncio
+    async def test_live_job_not_reclaimed(self, manager, tmp_path, monkeypatch):
+        """测试运行中任务持续刷新心跳，其他进程不会重新认领"""
+        async def slow_iter_batch(emails, level, timeout):
+            await asyncio.sleep(0.5)
+            for index, email in enumerate(emails):
+                yield index, EmailValidationResult(
+                    email=email, valid=True, risk_level=RiskLevel.LOW, score=90,
+                    syntax=SyntaxResult(valid=True), validation_time_ms=0, message="ok"
+                )
+        monkeypatch.setattr(EmailValidator, "iter_batch", slow_iter_batch)
+
+        manager.STALE_AFTER = 0.2
+        job = await manager.submit(["a@example.com", "b@example.com"], ValidationLevel.SYNTAX, 5)
+        await manager.start()
+        await wait_for_status(manager, job.id, JobStatus.RUNNING)
+
+        other = JobManager(db_path=str(tmp_path / "jobs.db"))
+        other.STALE_AFTER = 0.2
+        other.POLL_INTERVAL = 0.05
+        await other.start()
+        try:
+            job = await wait_for_status(manager, job.id, JobStatus.COMPLETED)
+            assert job.processed == 2
+            assert not other._running
+            owner = manager.store._connect().execute(
+                "SELECT owner FROM jobs WHERE id = ?", (job.id,)
+            ).fetchone()[0]
+            assert owner == manager.owner
+        finally:
+            await other.stop()
+
+    def test_reprocessed_chunk_replaces_results(self, manager):
+        """测试被重新认领的任务再次保存同一分片时替换结果，进度不重复计算"""
+        store = manager.store
+        job_id = store.create_job(["a@example.com", "b@example.com"], ValidationLevel.SYNTAX, 5)
+
+        def result(email, valid):
+            return EmailValidationResult(
+                email=email, valid=valid, risk_level=RiskLevel.LOW, score=90,
+                syntax=SyntaxResult(valid=True), validation_time_ms=0, message="ok"
+            )
+        store.save_results(job_id, [(0, result("a@example.com", False))])
+        store.save_results(job_id, [
+            (0, result("a@example.com", True)), (1, result("b@example.com", True))
+        ])
+        job = store.get_job(job_id)
+        assert job.processed == 2
+        assert job.valid_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cancel_queued_job(self, manager):
+        """测试取消尚未开始的任务"""
+        job = await manager.submit(["a@example.com"], ValidationLevel.SYNTAX, 5)
+        job = await manager.cancel(job.id)
+        assert job.status == JobStatus.CANCELLED
+
+        await manager.start()
+        await asyncio.sleep(0.1)
+        job = await manager.get(job.id)
+        assert job.status == JobStatus.CANCELLED
+        assert job.processed == 0
+
+    @pytest.mark.asyncio
+    async def test_retry_result_updates_job(self, manager):
+        """测试灰名单重试得到结论后更新任务结果和有效数"""
+        job = await manager.submit(["a@example.com", "b@example.com"], ValidationLevel.SYNTAX, 5)
+        manager.store.save_results(job.id, [
+            (0, EmailValidationResult(
+                email="a@example.com", valid=False, risk_level=RiskLevel.HIGH, score=40,
+                syntax=SyntaxResult(valid=True), validation_time_ms=0, message="greylisted"
+            )),
+        ])
+        assert (await manager.get(job.id)).valid_count == 0
+
+        await manager._on_retry_result(job.id, EmailValidationResult(
+            email="a@example.com", valid=True, risk_level=RiskLevel.LOW, score=90,
+            syntax=SyntaxResult(valid=True), validation_time_ms=0, message="retried"
+        ))
+        job = await manager.get(job.id)
+        assert job.valid_count == 1
+        results = await manager.results(job.id, offset=0, limit=10)
+        assert results[0].result.message == "retried"
+
+    @pytest.mark.asyncio
+    async def test_poll_loop_survives_errors(self, manager, monkeypatch):
+        """测试认领任务出错后轮询继续，之后提交的任务仍被认领"""
+        real_claim = manager.store.claim_job
+        calls = []
+
+        def flaky_claim(owner, stale_after):
+            calls.append(owner)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return real_claim(owner, stale_after)
+        monkeypatch.setattr(manager.store, "claim_job", flaky_claim)
+        manager.ERROR_DELAY = 0.01
+
+        await manager.start()
+        job = await manager.submit(["a@example.com"], ValidationLevel.SYNTAX, 5)
+        job = await wait_for_status(manager, job.id, JobStatus.COMPLETED)
+        assert len(calls) > 1
+        assert job.processed == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self, manager):
+        """测试查询不存在的任务"""
+        assert await manager.get("missing") is None
@@ -0,0 +1,774 @@
+"""
+SMTP验证器测试用例
+使用本地的模拟SMTP服务器，不访问外部网络
+"""
+import asyncio
+import socket
+import time
+import aiosmtplib
+import pytest
+from app.core.metrics import SMTP_REPLIES, collect_timings
+from app.core.smtp import (
+    ConnectPath,
+    MXCircuitBreaker,
+    MXConnector,
+    MXFacts,
+    MXLatencyTracker,
+    PoolExhausted,
+    SMTPConnectionPool,
+    SMTPValidator,
+)
+from app.core.ratelimit import RateLimiter, TokenBucket, provider_group
+from benchmarks.fake_smtp import FakeSMTPServer
+
+
+@pytest.fixture(autouse=True)
+def clear_smtp_cache(monkeypatch):
+    """每个用例使用干净的 catch-all 缓存、熔断状态和MX特征，默认不限速"""
+    monkeypatch.setattr(RateLimiter, "ENABLED", False)
+    monkeypatch.setattr(SMTPValidator._pool.rate_limiter, "enabled", False)
+    SMTPValidator._pool.facts.clear()
+    SMTPValidator.clear_cache()
+    SMTPValidator.reset_breaker()
+    yield
+    SMTPValidator.clear_cache()
+    SMTPValidator.reset_breaker()
+
+
+@pytest.fixture
+def smtp_port(monkeypatch):
+    """将SMTP端口指向模拟服务器"""
+    def use(server):
+        monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", server.port)
+    return use
+
+
+class TestSMTPSessionReuse:
+    """SMTP会话复用测试"""
+
+    @pytest.mark.asyncio
+    async def test_single_address(self, smtp_port):
+        """测试单个地址验证"""
+        async with FakeSMTPServer(mailboxes={"alice@example.com"}) as server:
+            smtp_port(server)
+            result = await SMTPValidator.validate("alice@example.com", ["127.0.0.1"], 5)
+        assert result.connectable
+        assert result.accepts_mail
+        assert result.is_catch_all is False
+
+    @pytest.mark.asyncio
+    async def test_many_recipients_share_session(self, smtp_port):
+        """测试多个收件人在同一会话中验证"""
+        emails = [f"user{i}@example.com" for i in range(5)]
+        async with FakeSMTPServer(mailboxes=emails[:3]) as server:
+            smtp_port(server)
+            results = await SMTPValidator.validate_many(emails, ["127.0.0.1"], 5)
+        assert server.connections == 1
+        assert [results[e].accepts_mail for e in emails] == [True, True, True, False, False]
+        assert results[emails[4]].error.startswith("邮箱不存在")
+
+    @pytest.mark.asyncio
+    async def test_max_recipients_per_session(self, smtp_port):
+        """测试超过单会话收件人上限时开启新会话"""
+        emails = [f"user{i}@example.com" for i in range(5)]
+        async with FakeSMTPServer(mailboxes=emails) as server:
+            smtp_port(server)
+            results = await SMTPValidator.validate_many(
+                emails, ["127.0.0.1"], 5, max_recipients_per_session=2
+            )
+        assert server.transactions == 3
+        assert all(r.accepts_mail for r in results.values())
+
+    @pytest.mark.asyncio
+    async def test_new_transaction_after_too_many_recipients(self, smtp_port):
+        """测试 452 收件人过多时 RSET 后开启新事务"""
+        emails = [f"user{i}@example.com" for i in range(3)]
+        async with FakeSMTPServer(mailboxes=emails, max_rcpt_per_transaction=2) as server:
+            smtp_port(server)
+            results = await SMTPValidator.validate_many(emails, ["127.0.0.1"], 5)
+        assert all(r.accepts_mail for r in results.values())
+
+    @pytest.mark.asyncio
+    async def test_reply_codes_counted_per_mx(self, smtp_port):
+        """测试按MX主机统计 RCPT 响应码"""
+        before = SMTP_REPLIES.get(mx="127.0.0.1", command="RCPT", code="550")
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as server:
+            smtp_port(server)
+            await SMTPValidator.validate_many(
+                ["a@example.com", "b@example.com"], ["127.0.0.1"], 5
+            )
+        # b@example.com 与 catch-all 探测各返回一次 550
+        assert SMTP_REPLIES.get(mx="127.0.0.1", command="RCPT", code="550") == before + 2
+
+    @pytest.mark.asyncio
+    async def test_greylisted_reply_is_temporary(self, smtp_port):
+        """测试 450 灰名单响应标记为临时错误，不判定为不存在"""
+        async with FakeSMTPServer(greylist={"bob@example.com"}) as server:
+            smtp_port(server)
+            result = await SMTPValidator.validate("bob@example.com", ["127.0.0.1"], 5)
+        assert result.connectable
+        assert result.temporary_failure
+        assert not result.accepts_mail
+        assert result.error.startswith("临时错误")
+
+    @pytest.mark.asyncio
+    async def test_unreachable_host(self, monkeypatch):
+        """测试无法连接时返回错误"""
+        monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", 1)
+        result = await SMTPValidator.validate("alice@example.com", ["127.0.0.1"], 2)
+        assert not result.connectable
+        assert result.error
+
+
+class TestCatchAllCache:
+    """catch-all 结论缓存测试"""
+
+    @pytest.mark.asyncio
+    async def test_probe_once_per_domain(self, smtp_port):
+        """测试同一域名只发送一次 catch-all 探测"""
+        async with FakeSMTPServer(catch_all=True) as server:
+            smtp_port(server)
+            first = await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+            second = await SMTPValidator.validate("b@example.com", ["127.0.0.1"], 5)
+        assert first.is_catch_all and second.is_catch_all
+        probes = [r for r in server.rcpt_commands
+                  if r.startswith(SMTPValidator.CATCH_ALL_TEST_USER)]
+        assert len(probes) == 1
+        assert SMTPValidator.cache_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_domains_cached_separately(self, smtp_port):
+        """测试不同域名分别探测"""
+        async with FakeSMTPServer(mailboxes={"a@one.com", "a@two.com"}) as server:
+            smtp_port(server)
+            await SMTPValidator.validate("a@one.com", ["127.0.0.1"], 5)
+            await SMTPValidator.validate("a@two.com", ["127.0.0.1"], 5)
+        assert SMTPValidator.cache_stats()["size"] == 2
+
+
+class TestConnectionPool:
+    """SMTP连接池测试"""
+
+    @pytest.mark.asyncio
+    async def test_connection_reused_across_requests(self, smtp_port):
+        """测试连接在多次请求间复用"""
+        async with FakeSMTPServer(mailboxes={"a@example.com", "b@example.com"}) as server:
+            smtp_port(server)
+            await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+            result = await SMTPValidator.validate("b@example.com", ["127.0.0.1"], 5)
+        assert result.accepts_mail
+        assert server.connections == 1
+
+    @pytest.mark.asyncio
+    async def test_per_host_limit(self, smtp_port, monkeypatch):
+        """测试单个主机的并发连接数不超过上限"""
+        monkeypatch.setattr(SMTPValidator, "_pool", SMTPConnectionPool(max_per_host=2))
+        emails = [f"user{i}@example.com" for i in range(6)]
+        async with FakeSMTPServer(mailboxes=emails) as server:
+            smtp_port(server)
+            results = await asyncio.gather(*[
+                SMTPValidator.validate(email, ["127.0.0.1"], 5) for email in emails
+            ])
+        assert all(r.accepts_mail for r in results)
+        assert server.max_active <= 2
+
+    @pytest.mark.asyncio
+    async def test_idle_connections_evicted(self, smtp_port, monkeypatch):
+        """测试空闲超时的连接被淘汰"""
+        pool = SMTPConnectionPool(idle_timeout=0)
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as server:
+            smtp_port(server)
+            await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+            await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+        assert server.connections == 2
+        assert pool.stats()["evicted"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_saturated_pool_wait_is_bounded(self, smtp_port, monkeypatch):
+        """测试连接名额用尽时等待不超过截止时间，且不计入熔断"""
+        pool = SMTPConnectionPool(max_per_host=1)
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as server:
+            smtp_port(server)
+            async with pool.connection("127.0.0.1", server.port, 5):
+                started = time.monotonic()
+                with pytest.raises(PoolExhausted):
+                    async with pool.connection(
+                        "127.0.0.1", server.port, 5, deadline=time.monotonic() + 0.1
+                    ):
+                        pass
+                assert time.monotonic() - started < 1
+                result = await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 0.2)
+                assert not result.connectable
+            assert SMTPValidator.breaker_stats()["hosts"] == []
+        await SMTPValidator.close_pool()
+
+    @pytest.mark.asyncio
+    async def test_keepalive_pings_idle_connections(self, smtp_port, monkeypatch):
+        """测试后台保活向空闲连接发送 NOOP，且不推迟空闲超时淘汰"""
+        pool = SMTPConnectionPool(keepalive_interval=0)
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as server:
+            smtp_port(server)
+            await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+            conn = pool._idle[("127.0.0.1", server.port)][0]
+            last_used = conn.last_used
+
+            await pool.start()
+            await asyncio.sleep(0.05)
+            await SMTPValidator.close_pool()
+        assert server.commands.get("NOOP", 0) >= 1
+        assert conn.last_used == last_used
+        assert pool.stats()["evicted"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_checkout_closes_socket(self, monkeypatch):
+        """测试等待欢迎语时被取消（竞速、对冲落败）或 EHLO 失败都关闭连接"""
+        pool = SMTPConnectionPool()
+
+        async def wait_closed(server):
+            for _ in range(100):
+                if server.active == 0:
+                    return
+                await asyncio.sleep(0.01)
+
+        async with FakeSMTPServer(connect_latency=0.2) as server:
+            task = asyncio.create_task(pool._checkout(("127.0.0.1", server.port), 5, 5))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await wait_closed(server)
+            assert server.active == 0
+
+        # 建立连接时不自动 EHLO（如 SMTPS），由连接池发送的 EHLO 被拒绝
+        async def no_starttls(self):
+            pass
+
+        async def rejected_ehlo(self, *args, **kwargs):
+            raise aiosmtplib.SMTPHeloError(501, "5.5.4 Invalid domain")
+        monkeypatch.setattr(aiosmtplib.SMTP, "_maybe_start_tls_on_connect", no_starttls)
+        monkeypatch.setattr(aiosmtplib.SMTP, "ehlo", rejected_ehlo)
+        async with FakeSMTPServer() as server:
+            with pytest.raises(aiosmtplib.SMTPHeloError):
+                await pool._checkout(("127.0.0.1", server.port), 5, 5)
+            await wait_closed(server)
+            assert server.active == 0
+        assert pool.opened == 0
+
+
+class TestAdaptiveTimeouts:
+    """按MX延迟自适应超时测试"""
+
+    def test_unknown_host_uses_cap(self):
+        """测试没有样本的主机直接使用上限"""
+        tracker = MXLatencyTracker()
+        assert tracker.timeout("mx.example.com", MXLatencyTracker.COMMAND, 10) == 10
+
+    def test_fast_host_fails_fast(self):
+        """测试快速主机的超时收紧到下限"""
+        tracker = MXLatencyTracker(min_timeout=0.5)
+        for _ in range(5):
+            tracker.observe("mx.example.com", MXLatencyTracker.COMMAND, 0.02)
+        assert tracker.timeout("mx.example.com", MXLatencyTracker.COMMAND, 10) == 0.5
+
+    def test_slow_host_gets_more_time(self):
+        """测试慢速主机获得更长的超时，但不超过上限"""
+        tracker = MXLatencyTracker()
+        for seconds in (2.0, 2.5, 3.0, 4.0):
+            tracker.observe("slow.example.com", MXLatencyTracker.COMMAND, seconds)
+        assert tracker.timeout("slow.example.com", MXLatencyTracker.COMMAND, 30) >= 6.0
+        assert tracker.timeout("slow.example.com", MXLatencyTracker.COMMAND, 5) == 5
+
+    def test_unknown_host_shares_budget(self):
+        """测试未知主机只分得剩余预算的一部分"""
+        assert SMTPValidator._host_budget("new.example.com", 9.0, 3) == 3.0
+        assert SMTPValidator._host_budget("new.example.com", 9.0, 1) == 9.0
+
+    @pytest.mark.asyncio
+    async def test_stalled_command_on_fast_host(self, smtp_port, monkeypatch):
+        """测试已知快速的主机卡住时按画像超时，而不是等满请求超时"""
+        pool = SMTPConnectionPool()
+        pool.latency.min_timeout = 0.3
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}, stall={"b@example.com"}) as server:
+            smtp_port(server)
+            for _ in range(3):
+                await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+
+            started = time.monotonic()
+            result = await SMTPValidator.validate("b@example.com", ["127.0.0.1"], 5)
+            elapsed = time.monotonic() - started
+        assert not result.connectable
+        assert elapsed < 2
+
+
+class TestRequestDeadline:
+    """请求截止时间测试"""
+
+    @pytest.mark.asyncio
+    async def test_slow_commands_stop_at_deadline(self, smtp_port):
+        """测试会话中的命令不超过截止时间，未验证的地址标记为超时"""
+        emails = [f"user{i}@example.com" for i in range(10)]
+        async with FakeSMTPServer(mailboxes=emails, latency=0.1) as server:
+            smtp_port(server)
+            started = time.monotonic()
+            results = await SMTPValidator.validate_many(
+                emails, ["127.0.0.1"], 0.5, check_catch_all=False
+            )
+            elapsed = time.monotonic() - started
+        assert elapsed < 0.8
+        assert any(r.accepts_mail for r in results.values())
+        timed_out = [r for r in results.values() if r.error == SMTPValidator.TIMEOUT_ERROR]
+        assert timed_out
+        assert all(not r.connectable for r in timed_out)
+        assert SMTPValidator.breaker_stats()["hosts"] == []
+
+    @pytest.mark.asyncio
+    async def test_throttle_wait_bounded_by_deadline(self, smtp_port, monkeypatch):
+        """测试 RCPT 限速等待超过剩余时间时不再等待"""
+        limiter = RateLimiter(enabled=True)
+        limiter.mx_limits[RateLimiter.RCPT] = (1, 1)
+        limiter.group_limits[RateLimiter.RCPT] = (0, 0)
+        monkeypatch.setattr(SMTPValidator, "_pool", SMTPConnectionPool(rate_limiter=limiter))
+
+        emails = [f"user{i}@example.com" for i in range(4)]
+        async with FakeSMTPServer(mailboxes=emails) as server:
+            smtp_port(server)
+            started = time.monotonic()
+            results = await SMTPValidator.validate_many(
+                emails, ["127.0.0.1"], 1.5, check_catch_all=False
+            )
+            elapsed = time.monotonic() - started
+        await SMTPValidator.close_pool()
+        assert elapsed < 1.5
+        assert results[emails[0]].accepts_mail
+        assert results[emails[-1]].error == SMTPValidator.TIMEOUT_ERROR
+
+
+class TestCircuitBreaker:
+    """MX熔断器测试"""
+
+    def test_opens_after_consecutive_failures(self):
+        """测试连续失败达到阈值后熔断，冷却后只放行一次探测"""
+        clock = [0.0]
+        breaker = MXCircuitBreaker(failure_threshold=2, cool_down=30, timer=lambda: clock[0])
+        breaker.record_failure("mx.example.com")
+        assert breaker.allow("mx.example.com")
+        breaker.record_failure("mx.example.com")
+        assert not breaker.allow("mx.example.com")
+
+        clock[0] = 31
+        assert breaker.allow("mx.example.com")
+        assert breaker.state("mx.example.com") == MXCircuitBreaker.HALF_OPEN
+        assert not breaker.allow("mx.example.com")
+
+        breaker.record_success("mx.example.com")
+        assert breaker.state("mx.example.com") == MXCircuitBreaker.CLOSED
+        assert breaker.allow("mx.example.com")
+
+    def test_failed_probe_reopens(self):
+        """测试探测失败时重新熔断"""
+        clock = [0.0]
+        breaker = MXCircuitBreaker(failure_threshold=1, cool_down=30, timer=lambda: clock[0])
+        breaker.record_failure("mx.example.com")
+        clock[0] = 31
+        assert breaker.allow("mx.example.com")
+        breaker.record_failure("mx.example.com")
+        assert breaker.state("mx.example.com") == MXCircuitBreaker.OPEN
+        assert breaker.stats()["hosts"][0]["retry_in"] == 30
+
+    def test_success_resets_failure_count(self):
+        """测试成功连接清零连续失败次数"""
+        breaker = MXCircuitBreaker(failure_threshold=2)
+        breaker.record_failure("mx.example.com")
+        breaker.record_success("mx.example.com")
+        breaker.record_failure("mx.example.com")
+        assert breaker.state("mx.example.com") == MXCircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_connection(self, monkeypatch):
+        """测试熔断后不再尝试连接，直接返回不可达"""
+        monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", 1)
+        for _ in range(MXCircuitBreaker.FAILURE_THRESHOLD):
+            await SMTPValidator.validate("alice@example.com", ["127.0.0.1"], 2)
+        assert SMTPValidator.breaker_stats()["open"] == 1
+
+        opened = SMTPValidator._pool.opened
+        result = await SMTPValidator.validate("bob@example.com", ["127.0.0.1"], 2)
+        assert not result.connectable
+        assert "熔断" in result.error
+        assert SMTPValidator._pool.opened == opened
+
+    @pytest.mark.asyncio
+    async def test_tarpit_after_connect_not_counted(self, smtp_port, monkeypatch):
+        """测试连接成功后 RCPT 卡住超时不计入熔断"""
+        pool = SMTPConnectionPool()
+        pool.latency.min_timeout = 0.2
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}, stall={"b@example.com"}) as server:
+            smtp_port(server)
+            for _ in range(3):
+                await SMTPValidator.validate("a@example.com", ["127.0.0.1"], 5)
+            for _ in range(MXCircuitBreaker.FAILURE_THRESHOLD):
+                result = await SMTPValidator.validate("b@example.com", ["127.0.0.1"], 5)
+                assert not result.connectable
+                assert "响应超时" in result.error
+        assert SMTPValidator._breaker.state("127.0.0.1") == MXCircuitBreaker.CLOSED
+        assert SMTPValidator.breaker_stats()["hosts"] == []
+
+
+class TestHedgedProbing:
+    """多个MX对冲探测测试"""
+
+    @pytest.mark.asyncio
+    async def test_hedges_past_silent_primary(self, smtp_port, monkeypatch):
+        """测试主MX不响应时在对冲延迟后并行尝试备用MX"""
+        monkeypatch.setattr(SMTPValidator, "HEDGE_DELAY", 0.1)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as backup:
+            async with FakeSMTPServer(greeting=False, host="127.0.0.2", port=backup.port):
+                smtp_port(backup)
+                started = time.monotonic()
+                result = await SMTPValidator.validate(
+                    "a@example.com", ["127.0.0.2", "127.0.0.1"], 5
+                )
+                elapsed = time.monotonic() - started
+        assert result.accepts_mail
+        assert elapsed < 1.5
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_when_primary_connects(self, smtp_port, monkeypatch):
+        """测试主MX及时连上时不启动备用MX"""
+        monkeypatch.setattr(SMTPValidator, "HEDGE_DELAY", 0.5)
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as primary:
+            async with FakeSMTPServer(host="127.0.0.2", port=primary.port) as backup:
+                smtp_port(primary)
+                result = await SMTPValidator.validate(
+                    "a@example.com", ["127.0.0.1", "127.0.0.2"], 5
+                )
+        assert result.accepts_mail
+        assert backup.connections == 0
+
+    @pytest.mark.asyncio
+    async def test_losing_attempt_cancelled_before_rcpt(self, smtp_port, monkeypatch):
+        """测试对冲时最先连上的MX胜出，另一个尝试不发送 RCPT"""
+        monkeypatch.setattr(SMTPValidator, "HEDGE_DELAY", 0.1)
+        async with FakeSMTPServer(
+            mailboxes={"a@example.com"}, connect_latency=0.2, latency=0.2
+        ) as primary:
+            async with FakeSMTPServer(
+                mailboxes={"a@example.com"}, connect_latency=0.2, latency=0.2,
+                host="127.0.0.2", port=primary.port
+            ) as backup:
+                smtp_port(primary)
+                result = await SMTPValidator.validate(
+                    "a@example.com", ["127.0.0.1", "127.0.0.2"], 5
+                )
+        assert result.accepts_mail
+        assert result.mx_host == "127.0.0.1"
+        assert backup.connections == 1
+        assert backup.rcpt_commands == []
+        assert backup.transactions == 0
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_primary_refuses(self, smtp_port):
+        """测试主MX拒绝连接时立即转到备用MX"""
+        async with FakeSMTPServer(mailboxes={"a@example.com"}) as backup:
+            smtp_port(backup)
+            result = await SMTPValidator.validate(
+                "a@example.com", ["127.0.0.2", "127.0.0.1"], 5
+            )
+        assert result.accepts_mail
+        assert backup.connections == 1
+
+
+class TestRateLimiting:
+    """出站限速测试"""
+
+    def test_provider_group(self):
+        """测试同一提供商的MX主机归入同一分组"""
+        assert provider_group("gmail-smtp-in.l.google.com") == "google.com"
+        assert provider_group("alt1.gmail-smtp-in.l.google.com.") == "google.com"
+        assert provider_group("example-com.mail.protection.outlook.com") == "outlook.com"
+        assert provider_group("mx.example.co.uk") == "example.co.uk"
+        assert provider_group("127.0.0.1") == "127.0.0.1"
+
+    def test_token_bucket_reservations(self):
+        """测试令牌用完后按速率排队"""
+        bucket = TokenBucket(rate=10, burst=2)
+        now = bucket.updated_at
+        assert bucket.reserve(now) == 0
+        assert bucket.reserve(now) == 0
+        assert bucket.reserve(now) == pytest.approx(0.1)
+        assert bucket.reserve(now) == pytest.approx(0.2)
+        assert bucket.reserve(now + 0.2) == pytest.approx(0.1)
+
+    @pytest.mark.asyncio
+    async def test_group_limit_shared_across_hosts(self):
+        """测试同一分组的不同MX共享配额，取消等待时归还预约"""
+        limiter = RateLimiter(enabled=True)
+        limiter.mx_limits[RateLimiter.RCPT] = (0, 0)
+        limiter.group_limits[RateLimiter.RCPT] = (10, 1)
+
+        assert await limiter.acquire(RateLimiter.RCPT, "a.google.com") == 0
+        assert await limiter.acquire(RateLimiter.RCPT, "b.google.com") >= 0.05
+        assert await limiter.acquire(RateLimiter.RCPT, "mx.example.com") == 0
+
+        task = asyncio.create_task(limiter.acquire(RateLimiter.RCPT, "a.google.com"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        bucket = limiter._buckets[("group", "google.com", RateLimiter.RCPT)]
+        assert bucket.tokens > -1
+        assert limiter.stats()["throttled"] == 2
+
+    @pytest.mark.asyncio
+    async def test_rcpt_waits_for_tokens(self, smtp_port, monkeypatch):
+        """测试 RCPT 超出速率时等待而不是失败，等待时间计入阶段耗时"""
+        limiter = RateLimiter(enabled=True)
+        limiter.mx_limits[RateLimiter.RCPT] = (20, 2)
+        limiter.group_limits[RateLimiter.RCPT] = (0, 0)
+        monkeypatch.setattr(SMTPValidator, "_pool", SMTPConnectionPool(rate_limiter=limiter))
+
+        emails = [f"user{i}@example.com" for i in range(5)]
+        async with FakeSMTPServer(mailboxes=emails) as server:
+            smtp_port(server)
+            with collect_timings() as timings:
+                results = await SMTPValidator.validate_many(
+                    emails, ["127.0.0.1"], 5, check_catch_all=False
+                )
+        await SMTPValidator.close_pool()
+        assert all(r.accepts_mail for r in results.values())
+        assert limiter.throttled == 3
+        assert timings["smtp_rcpt_throttle"] >= 100
+
+
+class TestMXFacts:
+    """MX主机特征测试"""
+
+    @pytest.mark.asyncio
+    async def test_facts_learned_once_per_host(self, smtp_port):
+        """测试同一MX上不同域名的地址共享一次连接得到的特征"""
+        emails = ["a@one.example", "b@two.example", "c@three.example"]
+        async with FakeSMTPServer(mailboxes=emails) as server:
+            smtp_port(server)
+            results = await SMTPValidator.validate_many(
+                emails, ["127.0.0.1"], 5, check_catch_all=False
+            )
+        assert server.connections == 1
+        assert all(r.mx_host == "127.0.0.1" and r.starttls is False for r in results.values())
+
+        stats = SMTPValidator.mx_facts_stats()
+        assert stats["reachable"] == 1
+        facts = stats["hosts"][0]
+        assert facts["host"] == "127.0.0.1"
+        assert facts["banner"] == FakeSMTPServer.BANNER
+        assert facts["starttls"] is False
+
+    @pytest.mark.asyncio
+    async def test_unreachable_host_recorded(self, monkeypatch):
+        """测试连接失败时记录主机不可达"""
+        monkeypatch.setattr(SMTPValidator, "_pool", SMTPConnectionPool())
+        monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", 1)
+        await SMTPValidator.validate("alice@example.com", ["127.0.0.1"], 2)
+        facts = SMTPValidator._pool.facts.get("127.0.0.1")
+        assert facts is not None
+        assert not facts.reachable
+        assert facts.last_error
+
+
+def unused_port():
+    """取得一个当前没有监听的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestPortRacing:
+    """端口和地址族竞速测试"""
+
+    def test_plan_order(self):
+        """测试每个端口一轮，主端口在前；上次在主端口上连通的路径单独作为第一轮"""
+        connector = MXConnector()
+        addresses = [(socket.AF_INET6, "::1"), (socket.AF_INET, "127.0.0.1")]
+        rounds = connector.plan(addresses, [25, 587])
+        assert [[(p.address, p.port) for p in paths] for paths in rounds] == [
+            [("::1", 25), ("127.0.0.1", 25)], [("::1", 587), ("127.0.0.1", 587)]
+        ]
+        preferred = MXFacts(reachable=True, port=25, address="127.0.0.1", family="ipv4")
+        rounds = connector.plan(addresses, [25, 587], preferred)
+        assert rounds == [
+            [ConnectPath(socket.AF_INET, "127.0.0.1", 25)],
+            [ConnectPath(socket.AF_INET6, "::1", 25)],
+            [ConnectPath(socket.AF_INET, "127.0.0.1", 587), ConnectPath(socket.AF_INET6, "::1", 587)],
+        ]
+        # 上次经备用端口连通时仍先尝试主端口
+        preferred = MXFacts(reachable=True, port=587, address="127.0.0.1", family="ipv4")
+        rounds = connector.plan(addresses, [25, 587], preferred)
+        assert [paths[0].port for paths in rounds] == [25, 587]
+
+    @pytest.mark.asyncio
+    async def test_stalled_path_does_not_block(self, monkeypatch):
+        """测试第一条路径无响应时，同一端口的下一条路径在尝试间隔后并行启动并胜出"""
+        async with FakeSMTPServer() as server:
+            connector = MXConnector(attempt_delay=0.05)
+            real_open = connector._open
+
+            async def fake_open(path):
+                if path.address == "::1":
+                    await asyncio.sleep(10)
+                return await real_open(path)
+            monkeypatch.setattr(connector, "_open", fake_open)
+
+            started = time.monotonic()
+            sock, path = await connector.connect(
+                "localhost", [server.port], addresses=["::1", "127.0.0.1"]
+            )
+            sock.close()
+        assert path.address == "127.0.0.1"
+        assert time.monotonic() - started < 1
+
+    @pytest.mark.asyncio
+    async def test_slow_primary_beats_backup(self, monkeypatch):
+        """测试主端口较慢但可用时不连接备用端口"""
+        async with FakeSMTPServer() as primary, FakeSMTPServer() as backup:
+            connector = MXConnector(attempt_delay=0.05)
+            real_open = connector._open
+            opened = []
+
+            async def fake_open(path):
+                opened.append(path.port)
+                if path.port == primary.port:
+                    await asyncio.sleep(0.5)
+                return await real_open(path)
+            monkeypatch.setattr(connector, "_open", fake_open)
+
+            sock, path = await connector.connect(
+                "127.0.0.1", [primary.port, backup.port], addresses=["127.0.0.1"], round_timeout=2
+            )
+            sock.close()
+        assert path.port == primary.port
+        assert opened == [primary.port]
+
+    @pytest.mark.asyncio
+    async def test_blackholed_primary_falls_back(self, monkeypatch):
+        """测试主端口无响应时，超过每轮的超时时间后转到备用端口"""
+        async with FakeSMTPServer() as backup:
+            connector = MXConnector()
+            blackholed = unused_port()
+            real_open = connector._open
+
+            async def fake_open(path):
+                if path.port == blackholed:
+                    await asyncio.sleep(10)
+                return await real_open(path)
+            monkeypatch.setattr(connector, "_open", fake_open)
+
+            started = time.monotonic()
+            sock, path = await connector.connect(
+                "127.0.0.1", [blackholed, backup.port], addresses=["127.0.0.1"], round_timeout=0.2
+            )
+            sock.close()
+        assert path.port == backup.port
+        assert time.monotonic() - started < 1
+
+    @pytest.mark.asyncio
+    async def test_backup_port_when_primary_blocked(self, monkeypatch):
+        """测试主端口不通时经备用端口验证，之后的连接仍先尝试主端口"""
+        pool = SMTPConnectionPool()
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        async with FakeSMTPServer(mailboxes={"alice@example.com"}) as server:
+            monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", unused_port())
+            monkeypatch.setattr(SMTPValidator, "BACKUP_PORTS", [server.port])
+            result = await SMTPValidator.validate("alice@example.com", ["127.0.0.1"], 5)
+            assert result.accepts_mail
+            assert pool.facts.get("127.0.0.1").port == server.port
+
+            await SMTPValidator.close_pool()
+            attempts = pool.connector.attempts
+            result = await SMTPValidator.validate(
+                "alice@example.com", ["127.0.0.1"], 5, check_catch_all=False
+            )
+            assert result.accepts_mail
+            assert pool.connector.attempts == attempts + 2
+        await SMTPValidator.close_pool()
+
+    @pytest.mark.asyncio
+    async def test_backup_session_pooled_by_port(self, monkeypatch):
+        """测试经备用端口建立的连接按实际端口放回连接池，只借给允许备用端口的调用方"""
+        pool = SMTPConnectionPool()
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        primary = unused_port()
+        async with FakeSMTPServer(mailboxes={"alice@example.com"}) as server:
+            monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", primary)
+            monkeypatch.setattr(SMTPValidator, "BACKUP_PORTS", [server.port])
+            await SMTPValidator.validate("alice@example.com", ["127.0.0.1"], 5)
+            assert list(pool._idle) == [("127.0.0.1", server.port)]
+            assert pool.stats()["hosts"] == 1
+
+            # 只接受主端口的调用方不会拿到备用端口上的会话
+            with pytest.raises(aiosmtplib.SMTPConnectError):
+                async with pool.connection("127.0.0.1", primary, 5):
+                    pass
+            result = await SMTPValidator.validate(
+                "alice@example.com", ["127.0.0.1"], 5, check_catch_all=False
+            )
+            assert result.accepts_mail
+            assert server.connections == 1
+            assert pool.reused == 1
+        await SMTPValidator.close_pool()
+
+    @pytest.mark.asyncio
+    async def test_submission_auth_tries_next_mx(self, monkeypatch):
+        """测试提交端口要求认证时不下结论，转到下一个MX"""
+        pool = SMTPConnectionPool()
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+        primary_port = unused_port()
+        monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", primary_port)
+        async with FakeSMTPServer(require_auth=True) as submission, \
+                FakeSMTPServer(host="127.0.0.2", port=primary_port,
+                               mailboxes={"alice@example.com"}) as secondary:
+            monkeypatch.setattr(SMTPValidator, "BACKUP_PORTS", [submission.port])
+            result = await SMTPValidator.validate(
+                "alice@example.com", ["127.0.0.1", "127.0.0.2"], 5, check_catch_all=False
+            )
+        assert submission.commands.get("MAIL") == 1
+        assert submission.rcpt_commands == []
+        assert secondary.rcpt_commands == ["alice@example.com"]
+        assert result.accepts_mail
+        assert result.mx_host == "127.0.0.2"
+        await SMTPValidator.close_pool()
+
+    def test_submission_refusal(self):
+        """测试提交端口上的认证和中继拒绝视为没有结论，收件人不存在的响应照常处理"""
+        assert SMTPValidator._submission_refusal(530, "5.7.0 Authentication required")
+        assert SMTPValidator._submission_refusal(550, "5.7.1 Relaying denied")
+        assert SMTPValidator._submission_refusal(554, "Relay access denied")
+        assert not SMTPValidator._submission_refusal(550, "5.1.1 User unknown")
+        assert not SMTPValidator._submission_refusal(450, "4.7.1 Try again later")
+
+    @pytest.mark.asyncio
+    async def test_cached_addresses_skip_lookup(self, monkeypatch):
+        """测试给出预先解析的MX地址时直接连接，不再解析主机名"""
+        ordered = MXConnector.interleave(["192.0.2.1", "2001:db8::1", "192.0.2.2", "mx", "192.0.2.1"])
+        assert ordered == [
+            (socket.AF_INET, "192.0.2.1"),
+            (socket.AF_INET6, "2001:db8::1"),
+            (socket.AF_INET, "192.0.2.2"),
+        ]
+        pool = SMTPConnectionPool()
+        monkeypatch.setattr(SMTPValidator, "_pool", pool)
+
+        async def fail_resolve(host):
+            raise AssertionError(f"不应解析 {host}")
+        monkeypatch.setattr(pool.connector, "resolve", fail_resolve)
+        async with FakeSMTPServer(mailboxes={"alice@example.com"}) as server:
+            monkeypatch.setattr(SMTPValidator, "DEFAULT_PORT", server.port)
+            result = await SMTPValidator.validate(
+                "alice@example.com", ["mx.example.test"], 5,
+                mx_addresses={"mx.example.test": ["127.0.0.1"]}
+            )
+        assert result.accepts_mail
+        assert pool.facts.get("mx.example.test").address == "127.0.0.1"
+        await SMTPValidator.close_pool()
@@ -1,12 +1,108 @@
 """
 邮箱验证器测试用例
 """
+import json
+import os
+import random
+import sqlite3
+import time
 import pytest
 import asyncio
+import dns.resolver
+import dns.rrset
+from fastapi.testclient import TestClient
+from app.core.blocklist import Blocklist, BlocklistManager, CompiledBlocklist, blocklists
+from app.core.cache import SingleFlight, TTLCache
+from app.core.dns import DNSValidator
+from app.core.metrics import Counter, Histogram, STAGE_SECONDS
 from app.core.syntax import SyntaxValidator
 from app.core.disposable import DisposableDetector
-from app.core.validator import EmailValidator
-from app.models.schemas import EmailValidationRequest, ValidationLevel
+from app.core.matchers import DomainSuffixTrie, KeywordMatcher, RoleMatcher
+from app.core.providers import ProviderRegistry
+from app.core.result_cache import ResultCache
+from app.core.retry import retry_scheduler
+from app.core.smtp import SMTPValidator
+from app.core.validator import EmailValidator, MXClusters
+from app.main import app
+from app.models.schemas import (
+    DNSResult,
+    DeepAnalysisResult,
+    EmailValidationRequest,
+    EmailValidationResult,
+    RiskLevel,
+    SMTPResult,
+    SyntaxResult,
+    ValidationLevel,
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAnswers(list):
+    """模拟 dns.resolver.Answer"""
+
+    def __init__(self, records, ttl=300):
+        super().__init__(records)
+        self.rrset = type("RRset", (), {"ttl": ttl})()
+
+
+class FakeMX:
+    def __init__(self, preference, exchange):
+        self.preference = preference
+        self.exchange = exchange
+
+
+class FakeA:
+    def __init__(self, address):
+        self.address = address
+
+    def to_text(self):
+        return self.address
+
+
+class FakeResolver:
+    """按 (domain, rdtype) 返回预设结果并记录查询次数的解析器"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    async def resolve(self, domain, rdtype, lifetime=None):
+        self.calls.append((domain, rdtype))
+        answer = self.answers.get((domain, rdtype))
+        if isinstance(answer, Exception):
+            raise answer
+        if answer is None:
+            raise dns.resolver.NoAnswer()
+        return answer
+
+
+@pytest.fixture
+def fake_resolver(monkeypatch):
+    """替换DNS解析器并清空缓存"""
+    resolver = FakeResolver({
+        ("gmail.com", "MX"): FakeAnswers([
+            FakeMX(20, "alt1.gmail-smtp-in.l.google.com."),
+            FakeMX(5, "gmail-smtp-in.l.google.com."),
+        ]),
+        ("gmail.com", "A"): FakeAnswers([FakeA("142.250.1.1")]),
+        ("nxdomain.test", "MX"): dns.resolver.NXDOMAIN(),
+        ("nxdomain.test", "A"): dns.resolver.NXDOMAIN(),
+    })
+    DNSValidator.clear_cache()
+    monkeypatch.setattr(DNSValidator, "_resolver", resolver)
+    # 关闭内置提供商配置，让 gmail.com 走真实的DNS查询路径
+    monkeypatch.setattr(ProviderRegistry, "ENABLED", False)
+    yield resolver
+    DNSValidator.clear_cache()
 
 
 class TestSyntaxValidator:
@@ -45,6 +141,24 @@ class TestSyntaxValidator:
             result = SyntaxValidator.validate(email)
             assert not result.valid, f"Expected {email} to be invalid"
 
+    def test_fast_path_matches_full_check(self):
+        """测试快速路径与完整检查的结论一致，批量接口与逐个验证一致"""
+        emails = [
+            "user@example.com", " User.Name+tag@Mail.Example.ORG ", "a.@example.com",
+            "user@-example.com", "user@example-.com", "user@exa_mple.com", "user@example.c0m",
+            "user@123.example.com", "x" * 64 + "@example.com", "x" * 65 + "@example.com",
+            "user@" + "a" * 63 + ".com", "user@" + "a" * 64 + ".com",
+            "u@" + ".".join(["a" * 60] * 4) + ".com", "user@example.com\n", "", None,
+        ]
+        for email in emails:
+            result = SyntaxValidator.validate(email)
+            if isinstance(email, str) and email:
+                full = SyntaxValidator._validate_full(SyntaxValidator.normalize(email))
+                assert result == full, email
+        assert list(SyntaxValidator.validate_many(emails)) == [
+            SyntaxValidator.validate(email) for email in emails
+        ]
+
     def test_email_normalization(self):
         """测试邮箱地址标准化"""
         assert SyntaxValidator.normalize("  User@Example.COM  ") == "user@example.com"
@@ -73,6 +187,12 @@ class TestDisposableDetector:
             result = DisposableDetector.analyze(email)
             assert result.is_disposable, f"Expected {email} to be disposable"
 
+    def test_subdomains_and_keywords(self):
+        """测试上级域名和关键词匹配"""
+        assert DisposableDetector.is_disposable_domain("inbox.mailinator.com")
+        assert DisposableDetector.is_disposable_domain("MY-TEMPBOX.example.org")
+        assert not DisposableDetector.is_disposable_domain("example.com")
+
     def test_legitimate_domains(self):
         """测试正常邮箱域名"""
         legitimate_emails = [
@@ -91,6 +211,10 @@ class TestDisposableDetector:
             "info@example.com",
             "support@example.com",
             "noreply@example.com",
+            "support2@example.com",
+            "support-team@example.com",
+            "info.cn@example.com",
+            "sales_2@example.com",
         ]
         for email in role_emails:
             result = DisposableDetector.analyze(email)
@@ -102,6 +226,9 @@ class TestDisposableDetector:
             "john.doe@example.com",
             "jane123@example.com",
             "zhang.san@example.com",
+            "hi.there@example.com",
+            "allen@example.com",
+            "support-@example.com",
         ]
         for email in personal_emails:
             result = DisposableDetector.analyze(email)
@@ -170,6 +297,96 @@ class TestEmailValidator:
         assert result.valid_count == 2
         assert result.invalid_count == 1
 
+    @pytest.mark.asyncio
+    async def test_iter_batch_yields_every_index(self):
+        """测试流式批量验证产出每个地址的结果"""
+        emails = ["a@gmail.com", "invalid-email", "b@example.com", "c@gmail.com"]
+        seen = {}
+        async for index, result in EmailValidator.iter_batch(
+            emails, level=ValidationLevel.SYNTAX
+        ):
+            seen[index] = result
+        assert sorted(seen) == [0, 1, 2, 3]
+        assert seen[2].email == "b@example.com"
+        assert not seen[1].valid
+
+    @pytest.mark.asyncio
+    async def test_batch_dedupes_and_resolves_domain_once(self, fake_resolver):
+        """测试批量验证去重并且每个域名只解析一次"""
+        emails = [
+            "a@gmail.com",
+            " A@Gmail.com ",
+            "b@gmail.com",
+            "a@gmail.com",
+            "x@nxdomain.test",
+        ]
+        result = await EmailValidator.validate_batch(emails, level=ValidationLevel.DNS)
+        assert result.total == 5
+        assert [r.email for r in result.results] == [
+            "a@gmail.com", "a@gmail.com", "b@gmail.com", "a@gmail.com", "x@nxdomain.test"
+        ]
+        assert result.valid_count == 4
+        # gmail.com 和 nxdomain.test 各查询一次 MX 和 A
+        assert len(fake_resolver.calls) == 4
+
+    @pytest.mark.asyncio
+    async def test_batch_clusters_domains_by_mx(self, fake_resolver, monkeypatch):
+        """测试托管在同一组MX上的不同域名在同一个会话批次中验证"""
+        workspace = [FakeMX(1, "aspmx.l.google.com."), FakeMX(5, "alt1.aspmx.l.google.com.")]
+        for domain in ("corp-a.com", "corp-b.com"):
+            fake_resolver.answers[(domain, "MX")] = FakeAnswers(workspace)
+        fake_resolver.answers[("corp-c.com", "MX")] = FakeAnswers([FakeMX(10, "mx.corp-c.com.")])
+
+        calls = []
+
+        async def fake_validate_many(
+            emails, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            calls.append((sorted(emails), mx_hosts))
+            return {email: SMTPResult(connectable=True, accepts_mail=True) for email in emails}
+        monkeypatch.setattr(SMTPValidator, "validate_many", fake_validate_many)
+
+        emails = ["a@corp-a.com", "b@corp-b.com", "c@corp-c.com", "d@corp-a.com"]
+        result = await EmailValidator.validate_batch(
+            emails, level=ValidationLevel.SMTP, include_timings=True
+        )
+        assert sorted(calls) == [
+            (["a@corp-a.com", "b@corp-b.com", "d@corp-a.com"],
+             ["aspmx.l.google.com", "alt1.aspmx.l.google.com"]),
+            (["c@corp-c.com"], ["mx.corp-c.com"]),
+        ]
+        assert result.valid_count == 4
+        assert all("dns" in r.timings and "smtp" in r.timings for r in result.results)
+
+    @pytest.mark.asyncio
+    async def test_slow_domain_does_not_hold_clusters(self, fake_resolver, monkeypatch):
+        """测试个别域名解析缓慢时，其他域名的簇在合并窗口后即发出"""
+        fake_resolver.answers[("fast.com", "MX")] = FakeAnswers([FakeMX(10, "mx.fast.com.")])
+        fake_resolver.answers[("slow.com", "MX")] = FakeAnswers([FakeMX(10, "mx.slow.com.")])
+        resolve = fake_resolver.resolve
+
+        async def slow_resolve(domain, rdtype, lifetime=None):
+            if domain == "slow.com":
+                await asyncio.sleep(1)
+            return await resolve(domain, rdtype, lifetime)
+        monkeypatch.setattr(fake_resolver, "resolve", slow_resolve)
+        monkeypatch.setattr(MXClusters, "COALESCE_WINDOW", 0.05)
+
+        async def fake_validate_many(
+            emails, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return {email: SMTPResult(connectable=True, accepts_mail=True) for email in emails}
+        monkeypatch.setattr(SMTPValidator, "validate_many", fake_validate_many)
+
+        started = time.monotonic()
+        finished = {}
+        async for index, result in EmailValidator.iter_batch(
+            ["a@fast.com", "b@slow.com"], level=ValidationLevel.SMTP
+        ):
+            finished[result.email] = time.monotonic() - started
+        assert finished["a@fast.com"] < 0.5
+        assert finished["b@slow.com"] >= 1
+
     @pytest.mark.asyncio
     async def test_disposable_email_detection(self):
         """测试一次性邮箱检测"""
@@ -191,6 +408,864 @@ class TestEmailValidator:
         assert result.validation_time_ms >= 0
 
 
+class TestPipelinePolicy:
+    """本地分类优先、按策略跳过网络阶段测试"""
+
+    @pytest.mark.asyncio
+    async def test_disposable_skips_network(self, fake_resolver):
+        """测试一次性邮箱不进行DNS和SMTP验证"""
+        request = EmailValidationRequest(email="test@mailinator.com", level=ValidationLevel.FULL)
+        result = await EmailValidator.validate(request)
+        assert result.skipped_stages == ["dns", "smtp"]
+        assert result.dns is None and result.smtp is None
+        assert result.deep_analysis.is_disposable
+        assert fake_resolver.calls == []
+        # 语法30 + 深度分析(5+5) - 一次性邮箱扣分20，没有执行的网络阶段不折算
+        assert result.score == 20
+        assert not result.valid
+
+    @pytest.mark.asyncio
+    async def test_role_policy_skips_smtp(self, fake_resolver, monkeypatch):
+        """测试角色账户策略只跳过SMTP"""
+        monkeypatch.setattr(EmailValidator, "ROLE_ACTION", "skip_smtp")
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("SMTP should be skipped")
+        monkeypatch.setattr(SMTPValidator, "validate", fail)
+
+        request = EmailValidationRequest(email="admin@gmail.com", level=ValidationLevel.FULL)
+        result = await EmailValidator.validate(request)
+        assert result.skipped_stages == ["smtp"]
+        assert result.dns.has_mx
+        assert result.smtp is None
+
+    @pytest.mark.asyncio
+    async def test_known_provider_skips_catch_all(self, fake_resolver, monkeypatch):
+        """测试已知提供商不做 catch-all 探测"""
+        calls = []
+
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            calls.append(check_catch_all)
+            return SMTPResult(connectable=True, accepts_mail=True)
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+
+        request = EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.FULL)
+        result = await EmailValidator.validate(request)
+        assert calls == [False]
+        assert result.skipped_stages == ["catch_all"]
+        assert result.valid
+
+    @staticmethod
+    def _score(deep, skipped, smtp=None, dns=True):
+        """按给定的阶段结果计算评分，返回 (分数, 风险等级)"""
+        result = EmailValidationResult(
+            email="someone@example.com", valid=False, risk_level=RiskLevel.INVALID, score=0,
+            syntax=SyntaxResult(valid=True), validation_time_ms=0, message="",
+            skipped_stages=skipped
+        )
+        dns_result = DNSResult(has_mx=True) if dns else None
+        result = EmailValidator._calculate_result(
+            result, result.syntax, dns_result, smtp, deep
+        )
+        return result.score, result.risk_level
+
+    def test_scores_at_each_skip_level(self):
+        """测试各跳过策略下的评分：只折算已执行网络阶段的得分，扣分不折算"""
+        accepted = SMTPResult(connectable=True, accepts_mail=True)
+        role = DeepAnalysisResult(is_role_account=True)
+        disposable = DeepAnalysisResult(is_disposable=True)
+        free = DeepAnalysisResult(is_free_provider=True, provider_name="Gmail")
+
+        # 角色账户：完整验证 / 跳过SMTP（DNS得分20折算为50，未确认邮箱存在，最高 MEDIUM）
+        assert self._score(role, [], accepted) == (90, RiskLevel.LOW)
+        assert self._score(role, ["smtp"]) == (90, RiskLevel.MEDIUM)
+
+        # 一次性邮箱：不跳过 / 跳过SMTP / 跳过全部网络阶段
+        assert self._score(disposable, [], accepted) == (70, RiskLevel.MEDIUM)
+        assert self._score(disposable, ["smtp"]) == (70, RiskLevel.MEDIUM)
+        assert self._score(disposable, ["dns", "smtp"], dns=False) == (20, RiskLevel.INVALID)
+
+        # 免费邮箱：跳过 catch-all 探测不影响评分 / 提供商不支持 RCPT 验证时跳过SMTP
+        assert self._score(free, ["catch_all"], accepted) == (100, RiskLevel.LOW)
+        assert self._score(free, ["smtp"]) == (100, RiskLevel.MEDIUM)
+
+        # catch-all 扣分同样不参与折算
+        catch_all = SMTPResult(connectable=True, accepts_mail=True, is_catch_all=True)
+        assert self._score(free, [], catch_all) == (90, RiskLevel.LOW)
+
+    @pytest.mark.asyncio
+    async def test_batch_analyzes_each_address_once(self, fake_resolver, monkeypatch):
+        """测试批量验证中每个地址只做一次本地分类"""
+        calls = []
+        analyze = DisposableDetector.analyze
+
+        def counting_analyze(email):
+            calls.append(email)
+            return analyze(email)
+        monkeypatch.setattr(DisposableDetector, "analyze", counting_analyze)
+
+        result = await EmailValidator.validate_batch(
+            ["a@mailinator.com", "b@mailinator.com"], level=ValidationLevel.FULL
+        )
+        assert sorted(calls) == ["a@mailinator.com", "b@mailinator.com"]
+        assert all(r.deep_analysis.is_disposable for r in result.results)
+
+    @pytest.mark.asyncio
+    async def test_batch_skips_disposable_domain(self, fake_resolver):
+        """测试批量验证中一次性邮箱域名不解析DNS"""
+        result = await EmailValidator.validate_batch(
+            ["a@mailinator.com", "b@mailinator.com"], level=ValidationLevel.FULL
+        )
+        assert fake_resolver.calls == []
+        assert all(r.skipped_stages == ["dns", "smtp"] for r in result.results)
+
+    @pytest.mark.asyncio
+    async def test_policy_only_applies_to_full_level(self, fake_resolver):
+        """测试DNS级别不受策略影响"""
+        request = EmailValidationRequest(email="test@mailinator.com", level=ValidationLevel.DNS)
+        result = await EmailValidator.validate(request)
+        assert result.skipped_stages == []
+        assert fake_resolver.calls
+
+
+class TestProviderProfiles:
+    """内置提供商配置测试"""
+
+    @pytest.fixture
+    def profiles(self, fake_resolver, monkeypatch, tmp_path):
+        """启用提供商配置并从临时数据文件加载"""
+        path = tmp_path / "providers.json"
+        path.write_text(json.dumps({
+            "version": 3,
+            "providers": [
+                {"name": "Gmail", "domains": ["gmail.com"], "mx_hosts": ["mx.gmail.test."],
+                 "rcpt_verification": True, "catch_all": False},
+                {"name": "Blackhole", "domains": ["blackhole.test"], "mx_hosts": ["mx.blackhole.test"],
+                 "rcpt_verification": False, "catch_all": None},
+            ]
+        }), encoding="utf-8")
+        monkeypatch.setattr(ProviderRegistry, "ENABLED", True)
+        monkeypatch.setattr(ProviderRegistry, "_profiles", None)
+        monkeypatch.setattr(ProviderRegistry, "_version", None)
+        monkeypatch.setattr(ProviderRegistry, "PATH", str(path))
+        return path
+
+    def test_bundled_data_file_loads(self, monkeypatch):
+        """测试内置数据文件有效"""
+        monkeypatch.setattr(ProviderRegistry, "_profiles", None)
+        monkeypatch.setattr(ProviderRegistry, "_version", None)
+        assert ProviderRegistry.reload() > 0
+        profile = ProviderRegistry.get("GMAIL.com")
+        assert profile.mx_hosts and profile.catch_all is False
+
+    @pytest.mark.asyncio
+    async def test_dns_level_skips_network(self, profiles, fake_resolver):
+        """测试已知提供商的DNS级别验证（单个和批量）不查询DNS，直接的DNS验证仍查询"""
+        request = EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.DNS)
+        result = await EmailValidator.validate(request)
+        assert result.valid
+        assert result.dns.from_profile
+        assert result.dns.mx_records == ["mx.gmail.test"]
+
+        batch = await EmailValidator.validate_batch(
+            ["a@gmail.com", "b@gmail.com"], level=ValidationLevel.DNS
+        )
+        assert all(r.dns.from_profile for r in batch.results)
+        assert fake_resolver.calls == []
+
+        direct = await DNSValidator.validate("gmail.com")
+        assert not direct.from_profile
+        assert ("gmail.com", "MX") in fake_resolver.calls
+
+    @pytest.mark.asyncio
+    async def test_smtp_level_uses_static_mx(self, profiles, fake_resolver, monkeypatch):
+        """测试SMTP级别使用提供商的静态MX表，不查询MX记录"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return SMTPResult(connectable=True, accepts_mail=True)
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+
+        request = EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        result = await EmailValidator.validate(request)
+        assert result.dns.from_profile
+        assert result.dns.mx_records == ["mx.gmail.test"]
+        assert ("gmail.com", "MX") not in fake_resolver.calls
+
+    @pytest.mark.asyncio
+    async def test_known_catch_all_behaviour_applied(self, profiles, monkeypatch):
+        """测试 catch-all 行为已知时不探测并直接填入结果"""
+        calls = []
+
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            calls.append((mx_hosts, check_catch_all))
+            return SMTPResult(connectable=True, accepts_mail=True)
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+
+        request = EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        result = await EmailValidator.validate(request)
+        assert calls == [(["mx.gmail.test"], False)]
+        assert result.skipped_stages == ["catch_all"]
+        assert result.smtp.is_catch_all is False
+
+    @pytest.mark.asyncio
+    async def test_rcpt_unverifiable_provider_skips_smtp(self, profiles, monkeypatch):
+        """测试 RCPT 验证无意义的提供商不做SMTP探测"""
+        async def fail(*args, **kwargs):
+            raise AssertionError("SMTP should be skipped")
+        monkeypatch.setattr(SMTPValidator, "validate", fail)
+        monkeypatch.setattr(SMTPValidator, "validate_many", fail)
+
+        request = EmailValidationRequest(email="someone@blackhole.test", level=ValidationLevel.FULL)
+        result = await EmailValidator.validate(request)
+        assert result.skipped_stages == ["smtp"]
+        assert result.smtp is None
+
+        batch = await EmailValidator.validate_batch(
+            ["a@blackhole.test", "b@blackhole.test"], level=ValidationLevel.SMTP
+        )
+        assert all(r.skipped_stages == ["smtp"] for r in batch.results)
+
+    def test_reload_keeps_profiles_on_invalid_file(self, profiles, tmp_path):
+        """测试数据文件无效时保留当前配置"""
+        assert ProviderRegistry.reload() == 2
+        assert ProviderRegistry.stats()["version"] == 3
+
+        broken = tmp_path / "broken.json"
+        broken.write_text(json.dumps({"providers": [{"name": "x"}]}), encoding="utf-8")
+        with pytest.raises(ValueError):
+            ProviderRegistry.reload(str(broken))
+        with pytest.raises(ValueError):
+            ProviderRegistry.reload(str(tmp_path / "missing.json"))
+        assert ProviderRegistry.get("blackhole.test").name == "Blackhole"
+        assert ProviderRegistry.PATH == str(profiles)
+
+
+class TestBlocklists:
+    """外部名单测试"""
+
+    @pytest.fixture
+    def sources(self, monkeypatch, tmp_path):
+        """使用临时目录中的外部名单，用例结束后恢复内置索引"""
+        paths = {
+            "disposable": tmp_path / "disposable.txt",
+            "providers": tmp_path / "providers.csv",
+            "roles": tmp_path / "roles.txt",
+        }
+        paths["disposable"].write_text("# public list\nburner.example\nMAIL.Drop.test  # trailing\n\n")
+        paths["providers"].write_text("corpmail.example,Corp Mail\nnoname.example\n")
+        paths["roles"].write_text("ops\n")
+        monkeypatch.setattr(BlocklistManager, "DIRECTORY", str(tmp_path / "compiled"))
+        monkeypatch.setattr(DisposableDetector, "BLOCKLIST_PATH", str(paths["disposable"]))
+        monkeypatch.setattr(DisposableDetector, "FREE_PROVIDERS_PATH", str(paths["providers"]))
+        monkeypatch.setattr(DisposableDetector, "ROLE_PREFIXES_PATH", str(paths["roles"]))
+        DisposableDetector.build_index()
+        yield paths
+        monkeypatch.undo()
+        DisposableDetector.build_index()
+
+    def test_external_lists_extend_builtin(self, sources):
+        """测试外部名单与内置名单同时生效"""
+        assert DisposableDetector.is_disposable_domain("x.burner.example")
+        assert DisposableDetector.is_disposable_domain("mail.drop.test")
+        assert not DisposableDetector.is_disposable_domain("drop.test")
+        assert DisposableDetector.is_disposable_domain("mailinator.com")
+
+        assert DisposableDetector.get_provider_name("corpmail.example") == "Corp Mail"
+        assert DisposableDetector.get_provider_name("noname.example") == "noname.example"
+        assert DisposableDetector.get_provider_name("gmail.com") == "Gmail"
+
+        assert DisposableDetector.analyze("ops2@example.com").is_role_account
+
+        stats = DisposableDetector.index_stats()
+        assert {b["name"]: b["entries"] for b in stats["blocklists"]} == {
+            "disposable_domains": 2, "free_providers": 2, "role_prefixes": 1,
+        }
+        assert all(b["size_bytes"] > 0 and b["error"] is None for b in stats["blocklists"])
+
+    def test_hot_reload_on_source_change(self, sources):
+        """测试源文件变化后重新编译并替换索引"""
+        sources["disposable"].write_text("fresh.example\n")
+        assert "disposable_domains" in blocklists.refresh()
+        assert DisposableDetector.is_disposable_domain("fresh.example")
+        assert not DisposableDetector.is_disposable_domain("burner.example")
+        # 源文件未变化时不重新加载
+        assert blocklists.refresh() == []
+
+    def test_invalid_source_keeps_current_index(self, sources):
+        """测试源文件不可读时保留当前索引"""
+        sources["disposable"].unlink()
+        assert blocklists.refresh() == []
+        assert DisposableDetector.is_disposable_domain("burner.example")
+        stats = blocklists.get("disposable_domains").stats()
+        assert stats["error"] and stats["entries"] == 2
+
+    def test_compiled_index_shared_between_workers(self, sources):
+        """测试其他进程编译好的索引直接复用"""
+        first = blocklists.get("disposable_domains")
+        other = Blocklist("disposable_domains", first.source, first.compiled)
+        mtime = os.stat(first.compiled).st_mtime_ns
+        assert other.refresh()
+        assert os.stat(first.compiled).st_mtime_ns == mtime
+        assert "burner.example" in other
+
+    def test_truncated_index_recompiled(self, sources):
+        """测试截断的索引文件按需重新编译，不影响启动"""
+        compiled = blocklists.get("disposable_domains").compiled
+        with open(compiled, "wb") as f:
+            f.write(b"EVBL")
+        DisposableDetector.build_index()
+        assert DisposableDetector.is_disposable_domain("burner.example")
+        assert blocklists.get("disposable_domains").stats()["error"] is None
+
+    @pytest.mark.asyncio
+    async def test_watch_loop_survives_errors(self, monkeypatch):
+        """测试后台检查出错时记录日志并继续检查"""
+        manager = BlocklistManager()
+        monkeypatch.setattr(BlocklistManager, "RELOAD_INTERVAL", 0.01)
+        calls = []
+
+        def flaky_refresh():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            return []
+        monkeypatch.setattr(manager, "refresh", flaky_refresh)
+        await manager.start()
+        try:
+            for _ in range(100):
+                if len(calls) >= 2:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await manager.stop()
+        assert len(calls) >= 2
+
+    def test_compiled_format(self, tmp_path):
+        """测试编译后的索引查找"""
+        path = str(tmp_path / "list.bin")
+        assert CompiledBlocklist.build([("a.example", ""), ("b.example", "B"), ("a.example", "x")], path) == 2
+        index = CompiledBlocklist(path)
+        assert index.get("a.example") == ""
+        assert index.get("b.example") == "B"
+        assert index.get("c.example") is None
+        (tmp_path / "bad.bin").write_bytes(b"garbage" * 10)
+        with pytest.raises(ValueError):
+            CompiledBlocklist(str(tmp_path / "bad.bin"))
+
+
+class TestMatchers:
+    """后缀树与关键词自动机测试"""
+
+    def test_suffix_trie(self):
+        """测试域名本身及上级域名匹配"""
+        trie = DomainSuffixTrie(["mailinator.com", "b.example.com", "example.com", "mailinator.com"])
+        assert len(trie) == 3
+        assert trie.match("x.y.mailinator.com") == "mailinator.com"
+        assert trie.match("a.b.example.com") == "example.com"
+        assert trie.match("com") is None
+        assert "other.com" not in trie
+        assert trie.stats()["memory_bytes"] > 0
+
+    def test_role_matcher(self):
+        """测试角色前缀的精确、数字后缀和分隔符变体匹配"""
+        matcher = RoleMatcher(["info", "information", "sales", "team", "hr"])
+        assert len(matcher) == 5
+        assert matcher.match("information") == "information"
+        assert matcher.match("info42") == "info"
+        assert matcher.match("sales.team") == "sales"
+        assert matcher.match("hr-de") == "hr"
+        assert matcher.match("sales_team_2") == "sales"
+        assert matcher.match("informal") is None
+        assert matcher.match("sales.person") is None
+        assert matcher.match("info.") is None
+        assert matcher.match("info.cn") == "info"
+        assert matcher.match("sales_us") == "sales"
+
+    def test_role_matcher_ignores_first_names(self):
+        """测试分隔符后的短名字不被当作地区代码"""
+        matcher = RoleMatcher(["sales", "info", "admin", "hr", "team", "news"])
+        for local_part in ("sales.amy", "info.bob", "admin.joe", "hr.ann", "team.kim", "news.eve"):
+            assert matcher.match(local_part) is None, local_part
+        for email in ("sales.amy@example.com", "info.bob@example.com", "admin.joe@example.com"):
+            assert not DisposableDetector.analyze(email).is_role_account, email
+
+    def test_keyword_matcher_agrees_with_substring_scan(self):
+        """测试自动机与逐个子串查找结果一致"""
+        keywords = ["he", "she", "his", "hers", "temp", "tmp", "10minute", "minute"]
+        matcher = KeywordMatcher(keywords)
+        rng = random.Random(7)
+        for _ in range(2000):
+            text = "".join(rng.choice("hersitmp10nue.") for _ in range(rng.randint(0, 20)))
+            found = matcher.search(text)
+            assert (found is not None) == any(k in text for k in keywords), text
+            assert found is None or found in text
+
+
+class TestGreylistRetry:
+    """灰名单重试测试"""
+
+    @staticmethod
+    def greylisted():
+        return SMTPResult(connectable=True, error="临时错误: 450 Greylisted", temporary_failure=True)
+
+    @pytest.mark.asyncio
+    async def test_temporary_failure_schedules_retry(self, fake_resolver, monkeypatch):
+        """测试临时错误的地址进入重试队列"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return self.greylisted()
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+
+        request = EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        result = await EmailValidator.validate(request)
+        assert result.smtp.temporary_failure
+        assert result.smtp.retry_at is not None
+        assert "已安排稍后重试" in result.message
+        assert retry_scheduler.pending_count() == 1
+
+        # 重复验证不会重复排队
+        await EmailValidator.validate(request.model_copy(update={"email": "SomeOne@gmail.com"}))
+        assert retry_scheduler.pending_count() == 1
+
+    @pytest.mark.asyncio
+    async def test_due_retries_share_session(self, fake_resolver, monkeypatch):
+        """测试同一MX上到期的地址在一个会话中重试，结论写回结果缓存"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return self.greylisted()
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+        for email in ("a@gmail.com", "b@gmail.com"):
+            await EmailValidator.validate(
+                EmailValidationRequest(email=email, level=ValidationLevel.SMTP)
+            )
+
+        calls = []
+
+        async def fake_validate_many(
+            emails, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            calls.append(sorted(emails))
+            return {email: SMTPResult(connectable=True, accepts_mail=True) for email in emails}
+        monkeypatch.setattr(SMTPValidator, "validate_many", fake_validate_many)
+
+        assert await retry_scheduler.run_due(time.time()) == 0
+        assert await retry_scheduler.run_due(time.time() + max(retry_scheduler.DELAYS)) == 2
+        assert calls == [["a@gmail.com", "b@gmail.com"]]
+        assert retry_scheduler.pending_count() == 0
+
+        cached = ResultCache.get("a@gmail.com", ValidationLevel.SMTP)
+        assert cached.valid
+        assert not cached.smtp.temporary_failure
+
+    @pytest.mark.asyncio
+    async def test_still_greylisted_backs_off(self, fake_resolver, monkeypatch):
+        """测试仍是临时错误时按MX退避后再次重试，次数用完后给出结论"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return self.greylisted()
+
+        async def fake_validate_many(
+            emails, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return {email: self.greylisted() for email in emails}
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+        monkeypatch.setattr(SMTPValidator, "validate_many", fake_validate_many)
+        monkeypatch.setattr(retry_scheduler, "DELAYS", [10.0, 100.0])
+
+        await EmailValidator.validate(
+            EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        )
+        assert await retry_scheduler.run_due(time.time() + 10) == 1
+        assert retry_scheduler.pending_count() == 1
+        assert retry_scheduler.stats()["backoff_mx_hosts"] == 1
+        assert retry_scheduler.stats()["next_retry_at"] > time.time() + 50
+
+        assert await retry_scheduler.run_due(time.time() + 100) == 1
+        assert retry_scheduler.pending_count() == 0
+        cached = ResultCache.get("someone@gmail.com", ValidationLevel.SMTP)
+        assert cached.smtp.temporary_failure
+        assert cached.smtp.retry_at is None
+        assert "已安排稍后重试" not in cached.message
+
+    @pytest.mark.asyncio
+    async def test_failed_finish_keeps_entry(self, fake_resolver, monkeypatch):
+        """测试更新结果失败时条目保留在数据库中，租期过后再次重试"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return self.greylisted()
+
+        async def fake_validate_many(
+            emails, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return {email: SMTPResult(connectable=True, accepts_mail=True) for email in emails}
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+        monkeypatch.setattr(SMTPValidator, "validate_many", fake_validate_many)
+        await EmailValidator.validate(
+            EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        )
+
+        finish = retry_scheduler._finish
+        failures = []
+
+        async def failing_finish(entry, result):
+            if not failures:
+                failures.append(entry.email)
+                raise RuntimeError("boom")
+            await finish(entry, result)
+        monkeypatch.setattr(retry_scheduler, "_finish", failing_finish)
+
+        now = time.time() + max(retry_scheduler.DELAYS)
+        assert await retry_scheduler.run_due(now) == 1
+        assert failures == ["someone@gmail.com"]
+        assert retry_scheduler.pending_count() == 1
+        rows = retry_scheduler._read_rows()
+        assert len(rows) == 1 and rows[0][6] == 0
+
+        assert await retry_scheduler.run_due(now + retry_scheduler.LEASE) == 1
+        assert retry_scheduler.pending_count() == 0
+        assert retry_scheduler._read_rows() == []
+
+    @pytest.mark.asyncio
+    async def test_run_loop_survives_errors(self, monkeypatch):
+        """测试后台重试出错时记录日志并继续运行"""
+        monkeypatch.setattr(retry_scheduler, "ERROR_DELAY", 0.01)
+        calls = []
+
+        async def flaky_reload():
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+        monkeypatch.setattr(retry_scheduler, "_reload", flaky_reload)
+        monkeypatch.setattr(retry_scheduler, "RELOAD_INTERVAL", 0.01)
+        await retry_scheduler.start()
+        try:
+            for _ in range(100):
+                if len(calls) >= 4:
+                    break
+                await asyncio.sleep(0.01)
+            assert not retry_scheduler._task.done()
+        finally:
+            await retry_scheduler.stop()
+        assert len(calls) >= 4
+
+    @pytest.mark.asyncio
+    async def test_locked_claim_backs_off(self, fake_resolver, monkeypatch):
+        """测试认领时数据库被锁，后台任务等待 ERROR_DELAY 后再试，不空转"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return self.greylisted()
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+        monkeypatch.setattr(retry_scheduler, "DELAYS", [0.0])
+        monkeypatch.setattr(retry_scheduler, "ERROR_DELAY", 0.1)
+        await EmailValidator.validate(
+            EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        )
+
+        execute = retry_scheduler._execute
+        claims = []
+
+        def locked_execute(sql, params=()):
+            if sql.startswith("UPDATE retries SET due_at"):
+                claims.append(params)
+                raise sqlite3.OperationalError("database is locked")
+            return execute(sql, params)
+        monkeypatch.setattr(retry_scheduler, "_execute", locked_execute)
+
+        with pytest.raises(sqlite3.OperationalError):
+            await retry_scheduler.run_due()
+        claims.clear()
+        await retry_scheduler.start()
+        try:
+            await asyncio.sleep(0.25)
+            assert not retry_scheduler._task.done()
+        finally:
+            await retry_scheduler.stop()
+        assert 1 <= len(claims) <= 4
+        assert retry_scheduler.pending_count() == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_survives_restart(self, fake_resolver, monkeypatch, tmp_path):
+        """测试重试队列持久化，重启后恢复"""
+        async def fake_validate(
+            email, mx_hosts, timeout, check_catch_all=True, mx_addresses=None
+        ):
+            return self.greylisted()
+        monkeypatch.setattr(SMTPValidator, "validate", fake_validate)
+        await EmailValidator.validate(
+            EmailValidationRequest(email="someone@gmail.com", level=ValidationLevel.SMTP)
+        )
+
+        # 模拟进程重启：内存中的队列清空后从数据库恢复
+        retry_scheduler.configure(str(tmp_path / "retries.db"))
+        assert retry_scheduler.pending_count() == 1
+        assert retry_scheduler.stats()["next_retry_at"] is not None
+
+
+class TestTTLCache:
+    """TTL缓存测试"""
+
+    def test_expiry(self):
+        """测试条目过期"""
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, timer=clock)
+        cache.set("a", 1, ttl=10)
+        assert cache.get("a") == 1
+        clock.now += 11
+        assert cache.get("a") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "a" in cache
+        assert "b" not in cache
+        assert cache.evictions == 1
+
+
+class TestSingleFlight:
+    """请求合并测试"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_result(self):
+        """测试并发的同键调用只执行一次"""
+        flight = SingleFlight()
+        executions = 0
+
+        async def work():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0.01)
+            return "done"
+
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+        assert results == ["done"] * 5
+        assert executions == 1
+        assert flight.shared == 4
+        assert len(flight) == 0
+
+    @pytest.mark.asyncio
+    async def test_exception_propagates_to_all(self):
+        """测试异常传播给所有等待者"""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.do("key", fail), flight.do("key", fail),
+            return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+
+class TestDNSCache:
+    """DNS缓存测试"""
+
+    @pytest.mark.asyncio
+    async def test_positive_results_cached(self, fake_resolver):
+        """测试重复查询命中缓存"""
+        first = await DNSValidator.validate("gmail.com")
+        second = await DNSValidator.validate("gmail.com")
+        assert first.mx_records == [
+            "gmail-smtp-in.l.google.com",
+            "alt1.gmail-smtp-in.l.google.com",
+        ]
+        assert second == first
+        assert len(fake_resolver.calls) == 2
+        assert DNSValidator.cache_stats()["hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_negative_results_cached(self, fake_resolver):
+        """测试NXDOMAIN被负缓存"""
+        await DNSValidator.validate("nxdomain.test")
+        result = await DNSValidator.validate("nxdomain.test")
+        assert not result.has_mx
+        assert not result.has_a_record
+        assert len(fake_resolver.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_coalesced(self, fake_resolver):
+        """测试同一域名的并发验证只查询一次"""
+        results = await asyncio.gather(
+            *[DNSValidator.validate("gmail.com") for _ in range(10)]
+        )
+        assert all(r.has_mx for r in results)
+        assert len(fake_resolver.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_different_timeouts_not_coalesced(self, fake_resolver):
+        """测试超时时间不同的并发验证不共享结果"""
+        shared = DNSValidator.coalescing_stats()["shared"]
+        await asyncio.gather(
+            DNSValidator.validate("gmail.com", timeout=1),
+            DNSValidator.validate("gmail.com", timeout=5),
+        )
+        assert DNSValidator.coalescing_stats()["shared"] == shared
+
+    @pytest.mark.asyncio
+    async def test_mx_addresses_resolved_and_cached(self, fake_resolver):
+        """测试需要SMTP验证时并行解析MX主机地址，重复验证命中缓存"""
+        fake_resolver.answers.update({
+            ("gmail-smtp-in.l.google.com", "AAAA"): FakeAnswers([FakeA("2607:f8b0::1b")]),
+            ("gmail-smtp-in.l.google.com", "A"): FakeAnswers([FakeA("142.250.1.26")]),
+            ("alt1.gmail-smtp-in.l.google.com", "A"): FakeAnswers([FakeA("142.250.2.26")]),
+        })
+        plain = await DNSValidator.validate("gmail.com")
+        assert plain.mx_addresses == {}
+
+        result = await DNSValidator.validate("gmail.com", resolve_mx_addresses=True)
+        assert result.mx_addresses == {
+            "gmail-smtp-in.l.google.com": ["2607:f8b0::1b", "142.250.1.26"],
+            "alt1.gmail-smtp-in.l.google.com": ["142.250.2.26"],
+        }
+        calls = len(fake_resolver.calls)
+        again = await DNSValidator.validate("gmail.com", resolve_mx_addresses=True)
+        assert again.mx_addresses == result.mx_addresses
+        assert len(fake_resolver.calls) == calls
+
+    @pytest.mark.asyncio
+    async def test_additional_section_addresses_cached(self, fake_resolver):
+        """测试MX应答附加段中的地址直接写入缓存，不再单独查询"""
+        answers = FakeAnswers([FakeMX(10, "mx.corp.test.")])
+        answers.response = type("Message", (), {"additional": [
+            dns.rrset.from_text("mx.corp.test.", 300, "IN", "A", "192.0.2.10"),
+            dns.rrset.from_text("mx.corp.test.", 300, "IN", "AAAA", "2001:db8::10"),
+            dns.rrset.from_text("other.test.", 300, "IN", "A", "192.0.2.99"),
+        ]})()
+        fake_resolver.answers[("corp.test", "MX")] = answers
+
+        result = await DNSValidator.validate("corp.test", resolve_mx_addresses=True)
+        assert result.mx_addresses == {"mx.corp.test": ["2001:db8::10", "192.0.2.10"]}
+        assert ("mx.corp.test", "A") not in fake_resolver.calls
+        assert ("mx.corp.test", "AAAA") not in fake_resolver.calls
+        assert ("other.test", "A") not in DNSValidator._cache
+
+
+class TestResultCache:
+    """持久化结果缓存测试"""
+
+    @pytest.mark.asyncio
+    async def test_repeat_validation_served_from_cache(self, fake_resolver):
+        """测试重复验证直接返回缓存结果，且重启后仍然有效"""
+        request = EmailValidationRequest(email="User@Gmail.com", level=ValidationLevel.DNS)
+        first = await EmailValidator.validate(request)
+        assert not first.cached
+
+        # 模拟进程重启：关闭连接并清空内存中的DNS缓存
+        ResultCache.close()
+        DNSValidator.clear_cache()
+
+        second = await EmailValidator.validate(request)
+        assert second.cached
+        assert second.score == first.score
+        assert len(fake_resolver.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_levels_cached_separately(self, fake_resolver):
+        """测试不同验证级别分别缓存，语法级别不缓存"""
+        await EmailValidator.validate(
+            EmailValidationRequest(email="a@gmail.com", level=ValidationLevel.DNS)
+        )
+        assert ResultCache.get("a@gmail.com", ValidationLevel.DNS) is not None
+        assert ResultCache.get("a@gmail.com", ValidationLevel.FULL) is None
+
+        await EmailValidator.validate(
+            EmailValidationRequest(email="b@gmail.com", level=ValidationLevel.SYNTAX)
+        )
+        assert ResultCache.get("b@gmail.com", ValidationLevel.SYNTAX) is None
+
+    @pytest.mark.asyncio
+    async def test_batch_counts_each_miss_once(self, fake_resolver):
+        """测试批量验证只批量查询一次缓存，每个未命中的地址只计一次"""
+        before = ResultCache.stats()
+        await EmailValidator.validate_batch(
+            ["a@gmail.com", "b@gmail.com", "A@gmail.com"], ValidationLevel.DNS
+        )
+        after = ResultCache.stats()
+        assert after["misses"] - before["misses"] == 2
+        assert after["entries"] == 2
+
+        await EmailValidator.validate_batch(["a@gmail.com", "b@gmail.com"], ValidationLevel.DNS)
+        assert ResultCache.stats()["hits"] - after["hits"] == 2
+
+    def test_inconclusive_results_short_ttl(self):
+        """测试结论不确定的结果只短暂缓存"""
+        result = EmailValidationResult(
+            email="a@example.com", valid=False, risk_level=RiskLevel.HIGH, score=40,
+            syntax=SyntaxResult(valid=True), smtp=SMTPResult(error="连接超时"),
+            validation_time_ms=0, message=""
+        )
+        assert ResultCache._ttl_for(ValidationLevel.FULL, result) == ResultCache.INCONCLUSIVE_TTL
+
+
+class TestMetrics:
+    """运行指标测试"""
+
+    def test_histogram_render(self):
+        """测试直方图按 Prometheus 文本格式导出累积分桶"""
+        histogram = Histogram("test_seconds", "测试", ("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage="dns")
+        histogram.observe(0.5, stage="dns")
+        lines = histogram.render()
+        assert "# TYPE test_seconds histogram" in lines
+        assert 'test_seconds_bucket{stage="dns",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{stage="dns",le="+Inf"} 2' in lines
+        assert 'test_seconds_count{stage="dns"} 2' in lines
+
+    def test_counter_requires_declared_labels(self):
+        """测试计数器标签必须与声明一致"""
+        counter = Counter("test_total", "测试", ("code",))
+        counter.inc(code="250")
+        counter.inc(2, code="250")
+        assert counter.get(code="250") == 3
+        with pytest.raises(ValueError):
+            counter.inc(mx="a")
+
+    @pytest.mark.asyncio
+    async def test_stage_timings_in_result(self, fake_resolver):
+        """测试请求 include_timings 时返回各阶段耗时，且耗时不写入结果缓存"""
+        observed = STAGE_SECONDS.count(stage="dns_mx")
+        request = EmailValidationRequest(
+            email="a@gmail.com", level=ValidationLevel.DNS, include_timings=True
+        )
+        result = await EmailValidator.validate(request)
+        assert {"syntax", "dns", "dns_mx", "dns_a"} <= set(result.timings)
+        assert STAGE_SECONDS.count(stage="dns_mx") == observed + 1
+
+        cached = await EmailValidator.validate(request)
+        assert cached.cached
+        assert set(cached.timings) == {"result_cache"}
+
+        plain = await EmailValidator.validate(
+            EmailValidationRequest(email="b@gmail.com", level=ValidationLevel.DNS)
+        )
+        assert plain.timings is None
+
+    @pytest.mark.asyncio
+    async def test_batch_shares_domain_timings(self, fake_resolver):
+        """测试批量验证中同一域名的DNS耗时计入每个地址"""
+        result = await EmailValidator.validate_batch(
+            ["a@gmail.com", "b@gmail.com"], level=ValidationLevel.DNS, include_timings=True
+        )
+        assert all("dns" in r.timings for r in result.results)
+
+
 class TestAPIModels:
     """API模型测试"""
 
@@ -211,5 +1286,73 @@ class TestAPIModels:
         assert request.timeout == 5
 
 
+
+class TestBatchStreamRoute:
+    """流式批量验证接口测试"""
+
+    def test_one_line_per_position(self):
+        """测试每个请求位置（包括重复地址）各输出一行，最后一行为汇总"""
+        emails = ["a@example.com", "bad", "A@Example.com ", "b@example.com"]
+        response = TestClient(app).post(
+            "/api/v1/validate/batch/stream", json={"emails": emails, "level": "syntax"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert response.text.endswith("\n")
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        items, summary = lines[:-1], lines[-1]
+        assert all(item["type"] == "result" for item in items)
+        assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+        by_index = {item["index"]: item["result"] for item in items}
+        assert by_index[0]["email"] == by_index[2]["email"] == "a@example.com"
+        assert not by_index[1]["valid"]
+        assert summary == {"type": "summary", "total": 4, "valid_count": 3, "invalid_count": 1}
+
+    @pytest.mark.asyncio
+    async def test_client_disconnect_cancels_pending(self, monkeypatch):
+        """测试客户端提前断开时停止输出并取消未完成的验证"""
+        original = EmailValidator.validate
+        cancelled = asyncio.Event()
+
+        async def slow_validate(request, **kwargs):
+            if request.email.endswith("@slow.test"):
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            return await original(request, **kwargs)
+        monkeypatch.setattr(EmailValidator, "validate", slow_validate)
+
+        body = json.dumps({"emails": ["a@example.com", "b@slow.test"], "level": "syntax"}).encode()
+        first_line = asyncio.Event()
+        chunks = []
+
+        async def receive():
+            if not chunks:
+                chunks.append(b"")
+                return {"type": "http.request", "body": body, "more_body": False}
+            await first_line.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                chunks.append(message["body"])
+                first_line.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/api/v1/validate/batch/stream",
+            "raw_path": b"/api/v1/validate/batch/stream", "query_string": b"",
+            "headers": [(b"content-type", b"application/json")],
+            "client": ("127.0.0.1", 1234), "server": ("testserver", 80), "root_path": "",
+        }
+        await asyncio.wait_for(app(scope, receive, send), timeout=2)
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        lines = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        assert [line["index"] for line in lines] == [0]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])